@@ -0,0 +1,214 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+
+// State shared by the workers in cluster mode. The master process holds the
+// sessions and the memory datasource with the users and access tokens, and the
+// workers reach them over the cluster IPC channel, so a login on one worker is
+// recognized by every other worker. The master also gathers the metrics of every
+// worker, so /metrics on any worker reports the totals for the whole server.
+
+var session = require('express-session');
+
+// Number of data arguments, after the model name, of the memory connector methods
+// that are forwarded to the master. They are followed by options and a callback.
+var CONNECTOR_METHODS = {
+  create: 1, save: 1, updateOrCreate: 1, replaceOrCreate: 1, findOrCreate: 2,
+  exists: 1, find: 1, all: 1, destroy: 1, destroyAll: 1, count: 1,
+  update: 2, updateAll: 2, updateAttributes: 2, replaceById: 2
+};
+
+// Milliseconds the master waits for the workers to send their metrics.
+var METRICS_TIMEOUT = 5000;
+
+var pending = new Map();
+var nextRequestId = 0;
+
+var toError = function(error){
+  var err = new Error(error.message);
+  err.name = error.name;
+  if (error.code !== undefined) err.code = error.code;
+  if (error.statusCode !== undefined) err.statusCode = error.statusCode;
+  return err;
+};
+
+/**
+ * Send a request to the master, calling callback(err, ...results) with its reply.
+ */
+var callMaster = function(op, args, callback) {
+  var id = nextRequestId++;
+  pending.set(id, callback);
+  try {
+    process.send({ clusterStore: { id: id, op: op, args: args } });
+  } catch (err) {
+    // The IPC channel is closed, the worker is shutting down.
+    pending.delete(id);
+    process.nextTick(function() { callback(err); });
+  }
+};
+
+process.on('message', function(message) {
+  var reply = message && message.clusterStoreReply;
+  if (!reply) return;
+  var callback = pending.get(reply.id);
+  if (callback === undefined) return;
+  pending.delete(reply.id);
+  callback.apply(null, [reply.error ? toError(reply.error) : null].concat(reply.results || []));
+});
+
+/**
+ * An express-session store, for use in workers, holding sessions in the master.
+ */
+class SessionStore extends session.Store {
+
+  get(sid, callback) {
+    callMaster('sessionGet', [sid], function(err, sess) {
+      callback(err, sess || null);
+    });
+  }
+
+  set(sid, sess, callback) {
+    callMaster('sessionSet', [sid, sess], function(err) {
+      if (callback) callback(err);
+    });
+  }
+
+  touch(sid, sess, callback) {
+    this.set(sid, sess, callback);
+  }
+
+  destroy(sid, callback) {
+    callMaster('sessionDestroy', [sid], function(err) {
+      if (callback) callback(err);
+    });
+  }
+}
+exports.SessionStore = SessionStore;
+
+/**
+ * Get the metrics of every worker, in a worker, calling callback(err, snapshots) with
+ * the result of Metrics.snapshot() from each worker that answered in time.
+ */
+exports.collectMetrics = function(callback) {
+  callMaster('metrics', [], callback);
+};
+
+/**
+ * Answer the master's requests for this worker's metrics.
+ *
+ * @param {Metrics} metrics The metrics of the worker's Fabric connector
+ */
+exports.serveMetrics = function(metrics) {
+  process.on('message', function(message) {
+    var request = message && message.clusterMetrics;
+    if (!request) return;
+    try {
+      process.send({ clusterMetricsReply: { id: request.id, snapshot: metrics.snapshot() } });
+    } catch (err) {
+      // The IPC channel is closed, the worker is shutting down.
+    }
+  });
+};
+
+/**
+ * Ask every connected worker for its metrics, in the master.
+ */
+var gatherMetrics = function(cluster, callback) {
+  var id = nextRequestId++;
+  var snapshots = [];
+  var waiting = new Set();
+  var timer;
+
+  var done = function() {
+    cluster.removeListener('message', onReply);
+    clearTimeout(timer);
+    callback(null, snapshots);
+  };
+  var onReply = function(worker, message) {
+    var reply = message && message.clusterMetricsReply;
+    if (!reply || reply.id !== id || !waiting.has(worker.id)) return;
+    waiting.delete(worker.id);
+    snapshots.push(reply.snapshot);
+    if (waiting.size == 0) done();
+  };
+
+  cluster.on('message', onReply);
+  Object.keys(cluster.workers).forEach(function(workerId) {
+    var worker = cluster.workers[workerId];
+    if (!worker.isConnected()) return;
+    waiting.add(worker.id);
+    worker.send({ clusterMetrics: { id: id } });
+  });
+  if (waiting.size == 0) return done();
+  // A worker that is busy or exiting is left out rather than holding up the scrape.
+  timer = setTimeout(done, METRICS_TIMEOUT);
+};
+
+/**
+ * Forward the data methods of a worker's memory connector to the master's.
+ *
+ * @param {Memory} connector The memory connector of a datasource in a worker
+ */
+exports.useMasterConnector = function(connector) {
+  Object.keys(CONNECTOR_METHODS).forEach(function(method) {
+    if (typeof connector[method] !== 'function') return;
+    connector[method] = function() {
+      var args = Array.prototype.slice.call(arguments);
+      var callback = args.pop();
+      // Options may hold objects that can't be sent to the master, such as a transaction.
+      callMaster(method, args.slice(0, CONNECTOR_METHODS[method] + 1), callback);
+    };
+  });
+};
+
+/**
+ * Serve the shared state to the workers, in the master.
+ *
+ * @param {Cluster} cluster The cluster module
+ * @param {Memory} connector The memory connector holding the master's copy of the data
+ */
+exports.serve = function(cluster, connector) {
+  var sessions = new Map();
+
+  var getSession = function(sid) {
+    var sess = sessions.get(sid);
+    if (sess === undefined) return null;
+    var expires = sess.cookie && sess.cookie.expires;
+    if (expires && new Date(expires) <= new Date()) {
+      sessions.delete(sid);
+      return null;
+    }
+    return sess;
+  };
+
+  cluster.on('message', function(worker, message) {
+    var request = message && message.clusterStore;
+    if (!request) return;
+    var reply = function(err) {
+      if (!worker.isConnected()) return;
+      var error = err && { message: err.message, name: err.name, code: err.code, statusCode: err.statusCode };
+      worker.send({ clusterStoreReply: {
+        id: request.id, error: error, results: Array.prototype.slice.call(arguments, 1)
+      }});
+    };
+
+    if (request.op === 'sessionGet') {
+      reply(null, getSession(request.args[0]));
+    } else if (request.op === 'sessionSet') {
+      sessions.set(request.args[0], request.args[1]);
+      reply(null);
+    } else if (request.op === 'sessionDestroy') {
+      sessions.delete(request.args[0]);
+      reply(null);
+    } else if (request.op === 'metrics') {
+      gatherMetrics(cluster, reply);
+    } else if (CONNECTOR_METHODS.hasOwnProperty(request.op)) {
+      connector[request.op].apply(connector, request.args.concat([{}, reply]));
+    } else {
+      reply(new Error('Unknown cluster store request ' + request.op));
+    }
+  });
+};
@@ -5,20 +5,31 @@
 //
 module.exports = function(SwaggerApi) {
 
+/**
+ * Get the connector to handle a request with, signing as the Fabric identity of the
+ * REST user the request is from if one is configured in fabricUsers.
+ * @param {object} options Options from the request
+ */
+var connectorFor = function(options) {
+  var connector = SwaggerApi.app.datasources.fabricDataSource.connector;
+  return connector.forUser(options ? options.fabricUsername : undefined);
+};
+
 /**
  * Endorse and commit a transaction using configured peers
  * @param {string} channelName Name of the channel
+ * @param {boolean} waitForCommit Wait for the transaction to be committed before responding
  * @param {transaction} transaction The transaction to endorse and commit
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {any} result Result object
  */
-SwaggerApi.postChannelsChannelNameTransactions = function(channelName, transaction, callback) {
+SwaggerApi.postChannelsChannelNameTransactions = function(channelName, waitForCommit, transaction, options, callback) {
 
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
-    connector.postChannelsChannelNameTransactions(channelName, transaction, connector).then(
+    var connector = connectorFor(options);
+    connector.postChannelsChannelNameTransactions(channelName, waitForCommit, transaction, connector).then(
       function(response){
         callback(null,response);
       },
@@ -35,13 +46,13 @@ SwaggerApi.postChannelsChannelNameTransactions = function(channelName, transacti
  * @param {string} channelName Name of the channel
  * @param {integer[]} peers Peers to send proposal to
  * @param {proposal} transaction The proposal.
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
- * @param {proposalResult} result Result object
+ * @param {endorseResult} result Result object
  */
-SwaggerApi.postChannelsChannelNameEndorse = function(channelName, peers, transaction, callback) {
-  var datasource = SwaggerApi.app.datasources.fabricDataSource;
-  var connector = datasource.connector;
+SwaggerApi.postChannelsChannelNameEndorse = function(channelName, peers, transaction, options, callback) {
+  var connector = connectorFor(options);
   connector.postChannelsChannelNameEndorse(channelName, peers, transaction, connector).then(
     function(response){
       callback(null,response);
@@ -54,17 +65,37 @@ SwaggerApi.postChannelsChannelNameEndorse = function(channelName, peers, transac
 }
 
 /**
- * Install chaincode onto the named peers
+ * Install chaincode onto the named peers. The chaincode package is either base64 in
+ * a JSON request body, or the whole request body when the Content-Type is
+ * application/octet-stream, with the other install data as query parameters.
  * @param {integer[]} peers Optional Peers array to install chaincode on
+ * @param {string} chaincodeId Chaincode ID, for an application/octet-stream request
+ * @param {string} chaincodePath Chaincode path, for an application/octet-stream request
+ * @param {string} chaincodeVersion Chaincode version, for an application/octet-stream request
+ * @param {string} chaincodeType Optional chaincode type, for an application/octet-stream request
  * @param {ChaincodeInstallRequest} chaincode The chaincode install data.
+ * @param {object} req The HTTP request
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {any} result Result object
  */
-SwaggerApi.postChaincodes = function(peers, chaincode, callback) {
-  var datasource = SwaggerApi.app.datasources.fabricDataSource;
-  var connector = datasource.connector;
-  connector.postChaincodes(peers, chaincode, connector).then(
+SwaggerApi.postChaincodes = function(peers, chaincodeId, chaincodePath, chaincodeVersion, chaincodeType, chaincode, req, options, callback) {
+  var connector = connectorFor(options);
+  var installPromise;
+  if (req.is('application/octet-stream')) {
+    var installRequest = {
+      chaincodeId: chaincodeId,
+      chaincodePath: chaincodePath,
+      chaincodeVersion: chaincodeVersion
+    };
+    if (chaincodeType) installRequest.chaincodeType = chaincodeType;
+    var length = (req.headers['content-length'] !== undefined ? parseInt(req.headers['content-length'], 10) : undefined);
+    installPromise = connector.postChaincodesPackage(peers, installRequest, req, length, connector);
+  } else {
+    installPromise = connector.postChaincodes(peers, chaincode || {}, connector);
+  }
+  installPromise.then(
     function(response){
       callback(null,response);
     },
@@ -80,15 +111,15 @@ SwaggerApi.postChaincodes = function(peers, chaincode, callback) {
  * @param {string} channelName Name of the channel
  * @param {integer[]} peers Peers to instantiate chaincode on
  * @param {chaincodeInstantiate} chaincode The chaincode instantiate data.
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {ordererResponse} result Result object
  */
-SwaggerApi.postChannelsChannelNameChaincodes = function(channelName, peers, chaincode, callback) {
+SwaggerApi.postChannelsChannelNameChaincodes = function(channelName, peers, chaincode, options, callback) {
 
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.postChannelsChannelNameChaincodes(channelName, peers, chaincode, connector).then(
       function(response){
         callback(null,response);
@@ -106,15 +137,15 @@ SwaggerApi.postChannelsChannelNameChaincodes = function(channelName, peers, chai
  * @param {string} channelName Name of the channel
  * @param {integer[]} peers Peers to instantiate chaincode on
  * @param {chaincodeInstantiate} chaincode The chaincode instantiate data.
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {ordererResponse} result Result object
  */
-SwaggerApi.putChannelsChannelNameChaincodes = function(channelName, peers, chaincode, callback) {
+SwaggerApi.putChannelsChannelNameChaincodes = function(channelName, peers, chaincode, options, callback) {
 
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.putChannelsChannelNameChaincodes(channelName, peers, chaincode, connector).then(
       function(response){
         callback(null,response);
@@ -130,15 +161,15 @@ SwaggerApi.putChannelsChannelNameChaincodes = function(channelName, peers, chain
 /**
  * Query all chaincode instantiated on the channel
  * @param {string} channelName Name of the channel
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {TODO} result Result object
  */
-SwaggerApi.getChannelsChannelNameChaincodes = function(channelName, callback) {
+SwaggerApi.getChannelsChannelNameChaincodes = function(channelName, options, callback) {
 
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.getChannelsChannelNameChaincodes(channelName, connector).then(
       function(response){
         callback(null,response);
@@ -154,14 +185,14 @@ SwaggerApi.getChannelsChannelNameChaincodes = function(channelName, callback) {
 /**
  * Get all known channels from the primary peer
 
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {ChannelQueryResponse} result Result object
  */
-SwaggerApi.getChannels = function(callback) {
+SwaggerApi.getChannels = function(options, callback) {
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
 
     connector.getChannels(connector).then(
       function(response){
@@ -178,14 +209,14 @@ SwaggerApi.getChannels = function(callback) {
 /**
  * Get information about the named channel
  * @param {string} channelName Name of the channel
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {channelInfo} result Result object
  */
-SwaggerApi.getChannelsChannelName = function(channelName, callback) {
+SwaggerApi.getChannelsChannelName = function(channelName, options, callback) {
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.getChannelsChannelName(channelName, connector).then(
       function(response){
         callback(null,response);
@@ -202,14 +233,14 @@ SwaggerApi.getChannelsChannelName = function(channelName, callback) {
  * Create the named channel
  * @param {string} channelName Name of the channel to create
  * @param {channelRequest} channelRequest The channel with values to use
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {any} result Result object
  */
-SwaggerApi.postChannelsChannelName = function(channelName, channelRequest, callback) {
+SwaggerApi.postChannelsChannelName = function(channelName, channelRequest, options, callback) {
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.postChannelsChannelName(channelName, channelRequest, connector).then(
       function(response){
         callback(null,response);
@@ -226,14 +257,14 @@ SwaggerApi.postChannelsChannelName = function(channelName, channelRequest, callb
  * Update the named channel
  * @param {string} channelName Name of the channel to update
  * @param {channelRequest} channelRequest The channel with values to use
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {any} result Result object
  */
-SwaggerApi.putChannelsChannelName = function(channelName, channelRequest, callback) {
+SwaggerApi.putChannelsChannelName = function(channelName, channelRequest, options, callback) {
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.putChannelsChannelName(channelName, channelRequest, connector).then(
       function(response){
         callback(null,response);
@@ -250,13 +281,13 @@ SwaggerApi.putChannelsChannelName = function(channelName, channelRequest, callba
  * Join a Peer to the channel
  * @param {string} channelName Name of the channel to join the peer to
  * @param {peer} peer The peer information
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {any} result Result object
  */
-SwaggerApi.postChannelsChannelNamePeers = function(channelName, peer, callback) {
-  var datasource = SwaggerApi.app.datasources.fabricDataSource;
-  var connector = datasource.connector;
+SwaggerApi.postChannelsChannelNamePeers = function(channelName, peer, options, callback) {
+  var connector = connectorFor(options);
   connector.postChannelsChannelNamePeers(channelName, peer, connector).then(
     function(response){
       callback(null,response);
@@ -272,13 +303,13 @@ SwaggerApi.postChannelsChannelNamePeers = function(channelName, peer, callback)
  * Query a transaction on a channel by ID
  * @param {string} channelName Name of the channel
  * @param {string} transactionID The transaction ID to query
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {TODO} result Result object
  */
-SwaggerApi.getChannelsChannelNameTransactionsTransactionID = function(channelName, transactionID, callback) {
-  var datasource = SwaggerApi.app.datasources.fabricDataSource;
-  var connector = datasource.connector;
+SwaggerApi.getChannelsChannelNameTransactionsTransactionID = function(channelName, transactionID, options, callback) {
+  var connector = connectorFor(options);
   connector.getChannelsChannelNameTransactionsTransactionID(channelName, transactionID, connector).then(
     function(response){
       callback(null,response);
@@ -295,15 +326,42 @@ SwaggerApi.getChannelsChannelNameTransactionsTransactionID = function(channelNam
  * @param {string} channelName Name of the channel
  * @param {string} blockId Query data
  * @param {string} blockHash Query data
+ * @param {string} fields Parts of the block to return
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {block} result Result object
  */
-SwaggerApi.getChannelsChannelNameBlocks = function(channelName, blockId, blockHash, callback) {
+SwaggerApi.getChannelsChannelNameBlocks = function(channelName, blockId, blockHash, fields, options, callback) {
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
-    connector.getChannelsChannelNameBlocks(channelName, blockId, blockHash, connector).then(
+    var connector = connectorFor(options);
+    connector.getChannelsChannelNameBlocks(channelName, blockId, blockHash, fields, connector).then(
+      function(response){
+        callback(null,response);
+      },
+      function(err){
+        callback(err);
+      }
+    );
+  });
+
+}
+
+/**
+ * Query a range of blocks on a channel
+ * @param {string} channelName Name of the channel
+ * @param {integer} start Number of the first block
+ * @param {integer} end Number of the last block
+ * @param {string} fields Parts of each block to return
+ * @param {object} options Options from the request, with the REST user it is from
+ * @callback {Function} callback Callback function
+ * @param {Error|string} err Error object
+ * @param {object} result Result object
+ */
+SwaggerApi.getChannelsChannelNameBlocksRange = function(channelName, start, end, fields, options, callback) {
+  process.nextTick(function() {
+    var connector = connectorFor(options);
+    connector.getChannelsChannelNameBlocksRange(channelName, start, end, fields, connector).then(
       function(response){
         callback(null,response);
       },
@@ -319,14 +377,14 @@ SwaggerApi.getChannelsChannelNameBlocks = function(channelName, blockId, blockHa
  * Query chaincode instantiated on a channel by ID
  * @param {string} channelName Name of the channel
  * @param {string} id Chaincode ID
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {TODO} result Result object
  */
-SwaggerApi.getChannelsChannelNameChaincodesId = function(channelName, id, callback) {
+SwaggerApi.getChannelsChannelNameChaincodesId = function(channelName, id, options, callback) {
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.getChannelsChannelNameChaincodesId(channelName, id, connector).then(
       function(response){
         callback(null,response);
@@ -343,15 +401,15 @@ SwaggerApi.getChannelsChannelNameChaincodesId = function(channelName, id, callba
  * Query chaincode installed on a peer by ID
  * @param {string} id Chaincode ID
  * @param {integer[]} peers Peers to query for installed chaincode
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {TODO} result Result object
  */
-SwaggerApi.getChaincodesId = function(id, peers, callback) {
+SwaggerApi.getChaincodesId = function(id, peers, options, callback) {
 
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
     connector.getChaincodesId(id, peers, connector).then(
       function(response){
         callback(null,response);
@@ -372,14 +430,14 @@ SwaggerApi.getChaincodesId = function(id, peers, callback) {
  * @param {string} blockHash Block Hash to look for
  * @param {string} txnId Transaction ID to look for
  * @param {args} args Optional args for query by chaincode
+ * @param {object} options Options from the request, with the REST user it is from
  * @callback {Function} callback Callback function
  * @param {Error|string} err Error object
  * @param {TODO} result Result object
  */
-SwaggerApi.postChannelsChannelNameLedger = function(channelName, chaincodeId, blockId, blockHash, txnId, args, callback)  {
+SwaggerApi.postChannelsChannelNameLedger = function(channelName, chaincodeId, blockId, blockHash, txnId, args, options, callback)  {
   process.nextTick(function() {
-    var datasource = SwaggerApi.app.datasources.fabricDataSource;
-    var connector = datasource.connector;
+    var connector = connectorFor(options);
 
     // console.log(channelName);
     // console.log(chaincodeId);
@@ -400,6 +458,61 @@ SwaggerApi.postChannelsChannelNameLedger = function(channelName, chaincodeId, bl
 
 }
 
+/**
+ * Run many queries of the channel's ledger in one request
+ * @param {string} channelName Name of the channel
+ * @param {Array} queries The queries to run
+ * @param {object} options Options from the request, with the REST user it is from
+ * @callback {Function} callback Callback function
+ * @param {Error|string} err Error object
+ * @param {Array} result The status and result of each query, in order
+ */
+SwaggerApi.postChannelsChannelNameLedgerBatch = function(channelName, queries, options, callback)  {
+  process.nextTick(function() {
+    var connector = connectorFor(options);
+
+    connector.postChannelsChannelNameLedgerBatch(channelName, queries, connector).then(
+      function(response){
+        callback(null,response);
+      },
+      function(err){
+        callback(err);
+      }
+    );
+  });
+
+}
+
+/**
+ * Query the channel's ledger by chaincode, streaming the records as NDJSON
+ * @param {string} channelName Name of the channel
+ * @param {string} chaincodeId Chaincode ID to query
+ * @param {integer} pageSize Maximum number of records to return
+ * @param {string} bookmark Bookmark returned with the previous page
+ * @param {args} args Args for query by chaincode
+ * @param {object} options Options from the request, with the REST user it is from
+ * @callback {Function} callback Callback function
+ * @param {Error|string} err Error object
+ * @param {stream.Readable} body The records, one JSON value per line
+ * @param {string} contentType The response content type
+ * @param {string} bookmark The bookmark for the next page, empty on the last page
+ */
+SwaggerApi.postChannelsChannelNameLedgerStream = function(channelName, chaincodeId, pageSize, bookmark, args, options, callback)  {
+  process.nextTick(function() {
+    var connector = connectorFor(options);
+
+    connector.postChannelsChannelNameLedgerStream(channelName, chaincodeId, pageSize, bookmark, args, connector).then(
+      function(response){
+        callback(null, response.stream, 'application/x-ndjson', response.bookmark);
+      },
+      function(err){
+        callback(err);
+      }
+    );
+  });
+
+}
+
 SwaggerApi.remoteMethod('postChannelsChannelNameTransactions',
   { isStatic: true,
   accepts:
@@ -408,11 +521,19 @@ SwaggerApi.remoteMethod('postChannelsChannelNameTransactions',
        description: 'Name of the channel',
        required: true,
        http: { source: 'path' } },
+     { arg: 'waitForCommit',
+       type: 'boolean',
+       description: 'Wait for the transaction to be committed by a peer, and return its commit status and block number',
+       required: false,
+       http: { source: 'query' } },
      { arg: 'transaction',
        type: 'transaction',
        description: 'The transaction to endorse and commit.',
        required: true,
-       http: { source: 'body' } } ],
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns: [{ description: 'Successful response or array of proposal responses',
       type: 'ordererResponse',
       arg: 'data',
@@ -421,32 +542,35 @@ SwaggerApi.remoteMethod('postChannelsChannelNameTransactions',
   description: 'Endorse and commit a transaction using configured peers.' }
 );
 
-// SwaggerApi.remoteMethod('postChannelsChannelNameEndorse',
-//   { isStatic: true,
-//   accepts:
-//    [ { arg: 'channelName',
-//        type: 'string',
-//        description: 'Name of the channel',
-//        required: true,
-//        http: { source: 'path' } },
-//      { arg: 'peers',
-//        type: [ 'integer' ],
-//        description: 'Peers to send proposal to',
-//        required: false,
-//        http: { source: 'query' } },
-//      { arg: 'transaction',
-//        type: 'transaction',
-//        description: 'The proposal.',
-//        required: true,
-//        http: { source: 'body' } } ],
-//   returns:
-//    [ { description: 'Successful response',
-//        type: 'proposalResult',
-//        arg: 'data',
-//        root: true } ],
-//   http: { verb: 'post', path: '/channels/:channelName/endorse', status: 202 },
-//   description: 'Send a proposal to the channel\'s peers. This could be for either chaincode or a transaction.' }
-// );
+SwaggerApi.remoteMethod('postChannelsChannelNameEndorse',
+  { isStatic: true,
+  accepts:
+   [ { arg: 'channelName',
+       type: 'string',
+       description: 'Name of the channel',
+       required: true,
+       http: { source: 'path' } },
+     { arg: 'peers',
+       type: [ 'integer' ],
+       description: 'Peers to send proposal to',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'transaction',
+       type: 'transaction',
+       description: 'The proposal.',
+       required: true,
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
+  returns:
+   [ { description: 'Successful response',
+       type: 'endorseResult',
+       arg: 'data',
+       root: true } ],
+  http: { verb: 'post', path: '/channels/:channelName/endorse', status: 202 },
+  description: 'Send a proposal to the channel\'s peers. The proposal and its responses are kept for a time, and the handle returned commits them when passed to /channels/{channelName}/transactions.' }
+);
 
 SwaggerApi.remoteMethod('postChaincodes',
   { isStatic: true,
@@ -456,11 +580,37 @@ SwaggerApi.remoteMethod('postChaincodes',
        description: 'Peers to install chaincode on',
        required: true,
        http: { source: 'query' } },
+     { arg: 'chaincodeId',
+       type: 'string',
+       description: 'Chaincode ID, when the body is an application/octet-stream chaincode package',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'chaincodePath',
+       type: 'string',
+       description: 'Chaincode path, when the body is an application/octet-stream chaincode package',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'chaincodeVersion',
+       type: 'string',
+       description: 'Chaincode version, when the body is an application/octet-stream chaincode package',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'chaincodeType',
+       type: 'string',
+       description: 'Optional chaincode type, when the body is an application/octet-stream chaincode package',
+       required: false,
+       http: { source: 'query' } },
      { arg: 'chaincode',
        type: 'ChaincodeInstallRequest',
-       description: 'The chaincode install data.',
-       required: true,
-       http: { source: 'body' } } ],
+       description: 'The chaincode install data, with the chaincode package base64 encoded. Not used when the body is an application/octet-stream chaincode package.',
+       required: false,
+       http: { source: 'body' } },
+     { arg: 'req',
+       type: 'object',
+       http: { source: 'req' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns: [ { description: 'Array of responses from the peers',
       type: 'installResult',
       arg: 'data',
@@ -486,7 +636,10 @@ SwaggerApi.remoteMethod('postChannelsChannelNameChaincodes',
        type: 'chaincodeInstantiate',
        description: 'The chaincode instantiate data.',
        required: true,
-       http: { source: 'body' } } ],
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response from orderer',
        type: 'ordererResponse',
@@ -513,7 +666,10 @@ SwaggerApi.remoteMethod('putChannelsChannelNameChaincodes',
        type: 'chaincodeInstantiate',
        description: 'The chaincode instantiate data.',
        required: true,
-       http: { source: 'body' } } ],
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response from orderer',
        type: 'ordererResponse',
@@ -530,7 +686,10 @@ SwaggerApi.remoteMethod('getChannelsChannelNameChaincodes',
        type: 'string',
        description: 'Name of the channel',
        required: true,
-       http: { source: 'path' } } ],
+       http: { source: 'path' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response',
        type: 'ChaincodeQueryResponse',
@@ -542,7 +701,10 @@ SwaggerApi.remoteMethod('getChannelsChannelNameChaincodes',
 
 SwaggerApi.remoteMethod('getChannels',
   { isStatic: true,
-  accepts: [],
+  accepts:
+   [ { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response',
        type: 'ChannelQueryResponse',
@@ -559,7 +721,10 @@ SwaggerApi.remoteMethod('getChannelsChannelName',
        type: 'string',
        description: 'Name of the channel',
        required: true,
-       http: { source: 'path' } } ],
+       http: { source: 'path' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response',
        type: 'channelInfo',
@@ -581,7 +746,10 @@ SwaggerApi.remoteMethod('postChannelsChannelName',
        type: 'channel',
        description: 'The contents of a generated channel configuration file encoded in base64',
        required: true,
-       http: { source: 'body' } } ],
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns: [ { description: 'Successful response',
       type: 'channelResponse',
       arg: 'data',
@@ -602,7 +770,10 @@ SwaggerApi.remoteMethod('putChannelsChannelName',
        type: 'channel',
        description: 'The contents of a generated channel configuration file encoded in base64',
        required: true,
-       http: { source: 'body' } } ],
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns: [ { description: 'Successful response',
       type: 'channelResponse',
       arg: 'data',
@@ -623,7 +794,10 @@ SwaggerApi.remoteMethod('postChannelsChannelNamePeers',
        type: 'peer',
        description: 'The peer information',
        required: true,
-       http: { source: 'body' } } ],
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns: [{ description: 'Successful response from the peer',
       type: 'installResult',
       arg: 'data',
@@ -644,7 +818,10 @@ SwaggerApi.remoteMethod('getChannelsChannelNameTransactionsTransactionID',
        type: 'string',
        description: 'The transaction ID to query',
        required: true,
-       http: { source: 'path' } } ],
+       http: { source: 'path' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response',
        type: 'ProcessedTransaction',
@@ -673,7 +850,15 @@ SwaggerApi.remoteMethod('getChannelsChannelNameBlocks',
        type: 'string',
        description: 'Query data',
        required: false,
-       http: { source: 'query' } } ],
+       http: { source: 'query' } },
+     { arg: 'fields',
+       type: 'string',
+       description: 'Comma separated parts of the block to return, of header, txids, data and metadata. txids summarizes each transaction. Defaults to the whole block',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'The data contained in a Block, ref https://fabric-sdk-node.github.io/global.html#Block',
        type: 'block',
@@ -683,6 +868,41 @@ SwaggerApi.remoteMethod('getChannelsChannelNameBlocks',
   description: 'Query a block on a channel by ID or Hash' }
 );
 
+SwaggerApi.remoteMethod('getChannelsChannelNameBlocksRange',
+  { isStatic: true,
+  accepts:
+   [ { arg: 'channelName',
+       type: 'string',
+       description: 'Name of the channel',
+       required: true,
+       http: { source: 'path' } },
+     { arg: 'start',
+       type: 'integer',
+       description: 'Number of the first block',
+       required: true,
+       http: { source: 'query' } },
+     { arg: 'end',
+       type: 'integer',
+       description: 'Number of the last block, blocks beyond the end of the chain are not returned',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'fields',
+       type: 'string',
+       description: 'Comma separated parts of each block to return, of header, txids, data and metadata. Defaults to the whole block',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
+  returns:
+   [ { description: 'The blocks in the range, and the height of the chain',
+       type: 'object',
+       arg: 'data',
+       root: true } ],
+  http: { verb: 'get', path: '/channels/:channelName/blocks/range' },
+  description: 'Query a range of blocks on a channel' }
+);
+
 SwaggerApi.remoteMethod('getChannelsChannelNameChaincodesId',
   { isStatic: true,
   accepts:
@@ -695,7 +915,10 @@ SwaggerApi.remoteMethod('getChannelsChannelNameChaincodesId',
        type: 'string',
        description: 'Chaincode ID',
        required: true,
-       http: { source: 'path' } } ],
+       http: { source: 'path' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response',
        type: 'ChaincodeInfo',
@@ -717,7 +940,10 @@ SwaggerApi.remoteMethod('getChaincodesId',
        type: [ 'integer' ],
        description: 'Peers to query for installed chaincode',
        required: true,
-       http: { source: 'query' } } ],
+       http: { source: 'query' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response',
        type: 'ChaincodeInfo',
@@ -759,7 +985,10 @@ SwaggerApi.remoteMethod('postChannelsChannelNameLedger',
        type: 'args',
        description: 'Optional args for query by chaincode',
        required: false,
-       http: { source: 'body' } } ],
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
   returns:
    [ { description: 'Successful response with data specific to the query',
        type: 'object',
@@ -769,4 +998,163 @@ SwaggerApi.remoteMethod('postChannelsChannelNameLedger',
   description: 'Query the channel\'s ledger' }
 );
 
+SwaggerApi.remoteMethod('postChannelsChannelNameLedgerBatch',
+  { isStatic: true,
+  accepts:
+   [ { arg: 'channelName',
+       type: 'string',
+       description: 'Name of the channel',
+       required: true,
+       http: { source: 'path' } },
+     { arg: 'queries',
+       type: 'array',
+       description: 'Queries, each an object with one of "chaincodeId" (with "fcn" and "args"), "blockId", "blockHash" or "txnId"',
+       required: true,
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
+  returns:
+   [ { description: 'For each query in order, its "status" and either its "data" or an "error" message',
+       type: 'array',
+       arg: 'data',
+       root: true } ],
+  http: { verb: 'post', path: '/channels/:channelName/ledger/batch' },
+  description: 'Run many queries of the channel\'s ledger in one request' }
+);
+
+SwaggerApi.remoteMethod('postChannelsChannelNameLedgerStream',
+  { isStatic: true,
+  accepts:
+   [ { arg: 'channelName',
+       type: 'string',
+       description: 'Name of the channel',
+       required: true,
+       http: { source: 'path' } },
+     { arg: 'chaincodeId',
+       type: 'string',
+       description: 'Chaincode ID to query',
+       required: true,
+       http: { source: 'query' } },
+     { arg: 'pageSize',
+       type: 'integer',
+       description: 'Maximum number of records to return',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'bookmark',
+       type: 'string',
+       description: 'Bookmark from the X-Fabric-Bookmark header of the previous page',
+       required: false,
+       http: { source: 'query' } },
+     { arg: 'args',
+       type: 'args',
+       description: 'Args for query by chaincode',
+       required: true,
+       http: { source: 'body' } },
+     { arg: 'options',
+       type: 'object',
+       http: 'optionsFromRequest' } ],
+  returns:
+   [ { description: 'Successful response with one record of the query result per line',
+       type: 'file',
+       arg: 'body',
+       root: true },
+     { arg: 'Content-Type',
+       type: 'string',
+       http: { target: 'header' } },
+     { arg: 'X-Fabric-Bookmark',
+       type: 'string',
+       description: 'Bookmark for the next page, empty if there are no more records',
+       http: { target: 'header' } } ],
+  http: { verb: 'post', path: '/channels/:channelName/ledger/stream' },
+  description: 'Query the channel\'s ledger by chaincode, streaming the result as newline delimited JSON' }
+);
+
+/**
+ * Set ETag and Cache-Control headers on responses for blocks and transactions.
+ * They never change once committed, so HTTP clients can cache them and revalidate
+ * with If-None-Match, which is answered with a 304 Not Modified.
+ */
+var setLedgerCacheHeaders = function(ctx, unused, next) {
+  var connector = SwaggerApi.app.datasources.fabricDataSource.connector;
+  var etag = connector.ledgerCache.getETag(ctx.result);
+  if (etag !== undefined) {
+    ctx.res.set('ETag', etag);
+    ctx.res.set('Cache-Control', 'private, max-age=31536000, immutable');
+  }
+  next();
+};
+
+/**
+ * Time every request in the connector's request duration histogram.
+ */
+SwaggerApi.beforeRemote('**', function(ctx, unused, next) {
+  var connector = SwaggerApi.app.datasources.fabricDataSource.connector;
+  ctx.req.endRequestTimer = connector.metrics.startTimer('fabric_rest_request_duration_seconds', { method: ctx.method.name });
+  next();
+});
+
+/**
+ * Add the username of the logged in REST user to the options of a request, so it
+ * signs as their Fabric identity if one is configured in fabricUsers. Usernames
+ * are looked up once per user.
+ */
+var usernames = new Map();
+
+SwaggerApi.beforeRemote('**', function(ctx, unused, next) {
+  var connector = SwaggerApi.app.datasources.fabricDataSource.connector;
+  var accessToken = ctx.req.accessToken;
+  if (!connector.settings.fabricUsers || !accessToken || !ctx.args.options) return next();
+  var userId = String(accessToken.userId);
+  if (usernames.has(userId)) {
+    ctx.args.options.fabricUsername = usernames.get(userId);
+    return next();
+  }
+  SwaggerApi.app.models.user.findById(accessToken.userId, function(err, user) {
+    if (err) return next(err);
+    if (user) {
+      usernames.set(userId, user.username);
+      ctx.args.options.fabricUsername = user.username;
+    }
+    next();
+  });
+});
+
+/**
+ * Admit requests within the concurrency limit for their class, "read" for ledger
+ * queries and "write" for the rest, which endorse, commit or change configuration.
+ * Requests beyond the limit wait, and once too many are waiting are rejected with
+ * a 429 Too Many Requests.
+ */
+var readMethods = ['postChannelsChannelNameLedger', 'postChannelsChannelNameLedgerBatch',
+  'postChannelsChannelNameLedgerStream'];
+
+SwaggerApi.beforeRemote('**', function(ctx, unused, next) {
+  var connector = SwaggerApi.app.datasources.fabricDataSource.connector;
+  var name = ctx.method.name;
+  var endpointClass = (name.startsWith('get') || readMethods.indexOf(name) !== -1) ? 'read' : 'write';
+  connector.admission.limiter(endpointClass).acquire().then(function(release) {
+    // Hold the turn until the response, which may be streamed, has been sent.
+    ctx.res.once('finish', release);
+    ctx.res.once('close', release);
+    next();
+  }, next);
+});
+
+SwaggerApi.afterRemote('**', function(ctx, unused, next) {
+  if (ctx.req.endRequestTimer) ctx.req.endRequestTimer({ status: String(ctx.res.statusCode) });
+  next();
+});
+
+SwaggerApi.afterRemoteError('**', function(ctx, next) {
+  var status = (ctx.error && (ctx.error.statusCode || ctx.error.status)) || 500;
+  if (ctx.error && ctx.error.retryAfter !== undefined) ctx.res.set('Retry-After', String(ctx.error.retryAfter));
+  if (ctx.req.endRequestTimer) ctx.req.endRequestTimer({ status: String(status) });
+  next();
+});
+
+SwaggerApi.afterRemote('getChannelsChannelNameBlocks', setLedgerCacheHeaders);
+SwaggerApi.afterRemote('getChannelsChannelNameTransactionsTransactionID', setLedgerCacheHeaders);
+SwaggerApi.afterRemote('postChannelsChannelNameLedger', setLedgerCacheHeaders);
+
 }
@@ -13,6 +13,8 @@ var path = require("path");
 
 var http = require('http');
 var https = require('https');
+var cluster = require('cluster');
+var clusterStore = require('./cluster-store');
 const argv = require('yargs')
             .usage('Usage: [options]')
             .config({extends:'./server/config.json'})
@@ -52,6 +54,29 @@ const argv = require('yargs')
               default: path.join(__dirname, './private/privatekey.pem'),
               type: 'string'
             })
+            .option('m', {
+              alias: 'metrics',
+              default: true,
+              describe: 'Serve request, peer and orderer latency metrics at /metrics in Prometheus format',
+              type: 'boolean'
+            })
+            .option('r', {
+              alias: 'reload',
+              default: true,
+              describe: 'Reload the connection profile when it changes, without restarting the server',
+              type: 'boolean'
+            })
+            .option('w', {
+              alias: 'workers',
+              default: 0,
+              describe: 'Number of worker processes to serve the REST API with, 0 to serve it from this process',
+              type: 'number'
+            })
+            .option('shutdown-timeout', {
+              default: 30000,
+              describe: 'Milliseconds to wait for workers to finish requests when shutting down',
+              type: 'number'
+            })
             .option('hfc-logging', {
               describe: 'Set logging options, e.g. {"debug":"console"}',
               type: 'string'
@@ -89,7 +114,9 @@ app.start = function() {
   app.middleware('session', session({
     secret: 'kitty',
     saveUninitialized: true,
-    resave: true
+    resave: true,
+    // Workers share the sessions held by the master, so a login works on any worker.
+    store: (cluster.isWorker ? new clusterStore.SessionStore() : undefined)
   }));
   passportConfigurator.init();
 
@@ -124,6 +151,30 @@ app.start = function() {
     res.redirect('/explorer');
   });
 
+  if (argv.reload) {
+    watchConnectionProfile();
+  }
+
+  if (argv.metrics) {
+    app.get('/metrics', function(req, res, next) {
+      var connector = app.datasources.fabricDataSource.connector;
+      if (!cluster.isWorker) {
+        res.set('Content-Type', 'text/plain; version=0.0.4');
+        res.send(connector.metrics.render());
+        return;
+      }
+      // Report the totals of every worker, whichever worker the scrape reaches.
+      clusterStore.collectMetrics(function(err, snapshots) {
+        if (err) {
+          err.statusCode = 503;
+          return next(err);
+        }
+        res.set('Content-Type', 'text/plain; version=0.0.4');
+        res.send(connector.metrics.render(snapshots));
+      });
+    });
+  }
+
   app.get('/auth/logout', function (req, res, next) {
     return Promise.resolve()
       .then(() => {
@@ -178,6 +229,34 @@ app.start = function() {
     server = http.createServer(app);
   }
 
+  // Track whether each connection is handling a request, so a worker that is
+  // shutting down can close its idle keep-alive connections rather than wait for
+  // clients to close them.
+  var connections = new Set();
+  var draining = false;
+  server.on(argv.tls ? 'secureConnection' : 'connection', function(socket) {
+    socket.idle = true;
+    connections.add(socket);
+    socket.on('close', function() {
+      connections.delete(socket);
+    });
+  });
+  server.on('request', function(req, res) {
+    var socket = req.socket;
+    socket.idle = false;
+    if (draining) res.setHeader('Connection', 'close');
+    res.on('finish', function() {
+      socket.idle = true;
+      if (draining) socket.end();
+    });
+  });
+  app.closeIdleConnections = function() {
+    draining = true;
+    connections.forEach(function(socket) {
+      if (socket.idle) socket.destroy();
+    });
+  };
+
   return server.listen(port, function() {
     var baseUrl = (argv.tls ? 'https://' : 'http://') + app.get('host') + ':' + port;
     app.emit('started', baseUrl);
@@ -189,6 +268,109 @@ app.start = function() {
   });
 };
 
+/**
+ * Reload the Fabric connector's settings when the connection profile file changes.
+ * A profile that cannot be read or is not valid is logged and the server carries on
+ * with the settings it has.
+ */
+var watchConnectionProfile = function() {
+  var file = require.resolve(argv.connectionProfile);
+  fs.watchFile(file, { persistent: false, interval: 2000 }, function(current, previous) {
+    if (current.mtime.getTime() === previous.mtime.getTime()) return;
+    fs.readFile(file, 'utf-8', function(err, data) {
+      var settings;
+      try {
+        if (err) throw err;
+        settings = JSON.parse(data).fabricDataSource;
+        if (!settings) throw new Error("no fabricDataSource");
+      } catch (err) {
+        console.error("Cannot reload connection profile '%s': %s", file, err.message);
+        return;
+      }
+      if (app.datasources.fabricDataSource.connector.reload(settings)) {
+        console.log("Reloaded connection profile '%s'", file);
+      } else {
+        console.error("Connection profile '%s' is not valid, see the log", file);
+      }
+    });
+  });
+};
+
+/**
+ * Run the REST API in worker processes, each with its own connections to Fabric.
+ * The master holds the sessions and logged in users for the workers, restarts
+ * any worker that exits, and stops the workers gracefully on SIGTERM or SIGINT.
+ */
+app.startCluster = function() {
+  var shuttingDown = false;
+  clusterStore.serve(cluster, app.dataSources.db.connector);
+
+  var fork = function() {
+    var worker = cluster.fork();
+    worker.startTime = Date.now();
+  };
+
+  cluster.on('exit', function(worker, code, signal) {
+    if (shuttingDown || worker.exitedAfterDisconnect) return;
+    console.log('Worker %d exited with %s, restarting it', worker.process.pid, signal || code);
+    // Wait before restarting a worker that failed as it started, rather than looping.
+    setTimeout(fork, Date.now() - worker.startTime < 5000 ? 1000 : 0);
+  });
+
+  var shutdown = function() {
+    if (shuttingDown) return;
+    shuttingDown = true;
+    console.log('Stopping workers');
+    // Sent before the disconnect, so workers close idle connections as they stop listening.
+    Object.keys(cluster.workers).forEach(function(id) {
+      cluster.workers[id].send({ clusterShutdown: true });
+    });
+    cluster.disconnect(function() {
+      process.exit(0);
+    });
+    setTimeout(function() {
+      console.log('Workers still busy after %dms, exiting', argv.shutdownTimeout);
+      process.exit(1);
+    }, argv.shutdownTimeout).unref();
+  };
+  process.on('SIGTERM', shutdown);
+  process.on('SIGINT', shutdown);
+
+  for (var i = 0; i < argv.workers; i++) {
+    fork();
+  }
+  console.log('Hyperledger Fabric SDK REST server started %d workers', argv.workers);
+};
+
+/**
+ * Set up a worker process. Users and access tokens are read from the master, and
+ * the worker exits once the master has disconnected it and its requests are done.
+ */
+var startWorker = function() {
+  clusterStore.useMasterConnector(app.dataSources.db.connector);
+  // Endorsed proposals are SDK objects held by the worker that endorsed them, and a
+  // commit may reach any worker, so handles only work with a single worker.
+  if (argv.workers > 1) {
+    app.dataSources.fabricDataSource.connector.proposals.disable(
+      "when the server runs more than one worker, commit the proposal in a single transactions request instead");
+  }
+  // The master stops workers gracefully, so ignore signals sent to the whole process group.
+  process.on('SIGINT', function() {});
+  process.on('SIGTERM', function() {});
+  if (argv.metrics) {
+    clusterStore.serveMetrics(app.dataSources.fabricDataSource.connector.metrics);
+  }
+  process.on('message', function(message) {
+    if (message && message.clusterShutdown && app.closeIdleConnections) app.closeIdleConnections();
+  });
+  process.on('disconnect', function() {
+    app.dataSources.fabricDataSource.disconnect(function() {
+      process.exit(0);
+    });
+  });
+  app.start();
+};
+
 // Allow environment variable overrides for the datasources.json file
 let dataSources = require(argv.connectionProfile);
 let models = require('./model-config.json');
@@ -203,6 +385,12 @@ boot(app, __dirname, function(err) {
 
   // start the server if `$ node server.js`
   if (require.main === module) {
-    app.start();
+    if (cluster.isWorker) {
+      startWorker();
+    } else if (argv.workers > 0) {
+      app.startCluster();
+    } else {
+      app.start();
+    }
   }
 });
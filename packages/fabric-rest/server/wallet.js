@@ -6,15 +6,19 @@
 'use strict';
 var walletContents = require('./private/wallet');
 
+// Wallet records by username, built once rather than scanning the records on every login.
+var recordsByUsername = new Map();
+walletContents.records.forEach(function(record) {
+  // Keep the first record for a username, as the scan did.
+  if (!recordsByUsername.has(record.username)) {
+    recordsByUsername.set(record.username, record);
+  }
+});
+
 var findByUsername = function(username, cb) {
   process.nextTick(function() {
-    for (var i = 0, len = walletContents.records.length; i < len; i++) {
-      var record = walletContents.records[i];
-      if (record.username === username) {
-        return cb(null, record);
-      }
-    }
-    return cb(null, null);
+    var record = recordsByUsername.get(username);
+    return cb(null, record === undefined ? null : record);
   });
 };
 
@@ -0,0 +1,171 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/Admission.js');
+
+// Weight of the newest sample in the moving average of how long work is held.
+var ALPHA = 0.2;
+
+/**
+* Limits how much work runs at once. Work beyond the limit waits in a queue of
+* bounded size, and is rejected straight away when the queue is full.
+*/
+class Limiter {
+
+  /**
+  * @param {string} name Describes what is limited, for errors and logs
+  * @param {integer} limit Most work running at once, 0 for no limit
+  * @param {integer} queueSize Most work waiting to run
+  */
+  constructor(name, limit, queueSize){
+    this.name = name;
+    this.limit = limit;
+    this.queueSize = queueSize;
+    this.running = 0;
+    this.queue = [];
+    // Moving average, in seconds, of how long work runs for.
+    this.holdTime = 0.1;
+  };
+
+  /**
+  * Seconds a client should wait before retrying rejected work, from how long the
+  * work already queued is expected to take.
+  */
+  retryAfter(){
+    var limit = Math.max(this.limit, 1);
+    return Math.max(1, Math.ceil((this.queue.length + 1) * this.holdTime / limit));
+  };
+
+  /**
+  * Wait for a turn to run.
+  *
+  * @returns {Promise} Resolving to a function to call once the work is done, or
+  *                    rejecting with an Error with a statusCode of 429 and the
+  *                    retryAfter seconds if the queue is full.
+  */
+  acquire(){
+    if(this.limit <= 0) return Promise.resolve(function(){});
+    if(this.running < this.limit){
+      this.running++;
+      return Promise.resolve(this._release());
+    }
+    if(this.queue.length >= this.queueSize){
+      logger.debug("acquire() - rejecting, " + this.name + " is busy");
+      var err = new Error("Too many requests for " + this.name + ", retry later");
+      err.statusCode = 429;
+      err.retryAfter = this.retryAfter();
+      return Promise.reject(err);
+    }
+    return new Promise((resolve)=>this.queue.push(resolve));
+  };
+
+  /**
+  * A function that ends a turn once, handing it on to the first work waiting.
+  */
+  _release(){
+    var start = process.hrtime();
+    var released = false;
+    return ()=>{
+      if(released) return;
+      released = true;
+      var diff = process.hrtime(start);
+      this.holdTime = ALPHA * (diff[0] + diff[1] / 1e9) + (1 - ALPHA) * this.holdTime;
+      var waiting = this.queue.shift();
+      if(waiting !== undefined){
+        waiting(this._release());
+      } else {
+        this.running--;
+      }
+    };
+  };
+
+  /**
+  * Run work once there is a turn for it.
+  *
+  * @param {function} work Called with no arguments, returning a Promise
+  * @returns {Promise} Settling the same way as the work
+  */
+  run(work){
+    return this.acquire().then((release)=>{
+      return Promise.resolve().then(work).then((result)=>{
+        release();
+        return result;
+      }, (err)=>{
+        release();
+        return Promise.reject(err);
+      });
+    });
+  };
+};
+exports.Limiter = Limiter;
+
+/**
+* The {Limiter}s for the connector: one for each class of REST endpoint, and one
+* for each peer and each orderer.
+*/
+class Admission {
+
+  /**
+  * @param {object} limits Most work running at once by kind, e.g. "read", "write",
+  *                        "peer" and "orderer". Kinds not given are not limited.
+  * @param {integer} queueSize Most work waiting for each {Limiter}
+  */
+  constructor(limits, queueSize){
+    this.limits = limits || {};
+    this.queueSize = queueSize;
+    this.limiters = new Map();
+  };
+
+  /**
+  * Get the {Limiter} for a kind of work, e.g. for the peer with a given URL.
+  *
+  * @param {string} kind The kind of work
+  * @param {string} name Optional name of what is limited within the kind
+  * @returns {Limiter} The limiter
+  */
+  limiter(kind, name){
+    var key = (name === undefined ? kind : kind + " " + name);
+    var limiter = this.limiters.get(key);
+    if(limiter === undefined){
+      limiter = new Limiter(key, this.limits[kind] || 0, this.queueSize);
+      this.limiters.set(key, limiter);
+    }
+    return limiter;
+  };
+
+  /**
+  * Limit the methods of a {Peer} or {Orderer}, so no more than the limit for its
+  * kind are in progress at once.
+  *
+  * @param {Peer|Orderer} remote The remote to limit
+  * @param {string} kind "peer" or "orderer"
+  * @param {string[]} calls Names of the methods, each returning a Promise
+  */
+  limit(remote, kind, calls){
+    var limiter = this.limiter(kind, remote.getUrl());
+    if(limiter.limit <= 0) return;
+    calls.forEach((call)=>{
+      var original = remote[call];
+      if(typeof original !== 'function') return;
+      remote[call] = (...args)=>limiter.run(()=>original.apply(remote, args));
+    });
+  };
+
+  /**
+  * @returns {object} The work running and waiting for each {Limiter} in use.
+  */
+  stats(){
+    var result = {};
+    this.limiters.forEach((limiter, key)=>{
+      result[key] = { running: limiter.running, waiting: limiter.queue.length, limit: limiter.limit };
+    });
+    return result;
+  };
+};
+exports.Admission = Admission;
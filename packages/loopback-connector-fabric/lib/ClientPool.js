@@ -0,0 +1,291 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+var Common = require('./Common.js');
+var IdentityCache = require('./IdentityCache.js');
+var Topology = require('./Topology.js');
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/ClientPool.js');
+
+/**
+* Close a {Peer}, {Orderer} or {EventHub} if the SDK version supports it.
+*/
+var closeRemote = function(remote){
+  try {
+    if(remote && typeof remote.close === 'function') remote.close();
+    else if(remote && typeof remote.disconnect === 'function') remote.disconnect();
+  } catch(err){
+    logger.debug("closeRemote() - " + err);
+  }
+};
+
+/**
+* A pool of configured {Client}, {Peer} and {Orderer} instances shared across
+* requests, so the key value store, user context, PEM files and gRPC connections
+* are set up once rather than on every request.
+*
+* Entries are keyed by the connector settings; a change in configuration builds a
+* new entry and the least recently used entries are closed. An entry is evicted
+* if building it fails or a request using it fails with a connection error, so
+* the next request starts again with new connections.
+*
+* A request may sign as a Fabric identity other than the configured fabricUser.
+* The {Client} and Channels for each such identity are held in an {IdentityCache}
+* and share the entry's {Peer}s and {Orderer}s.
+*/
+class ClientPool {
+
+  /**
+  * @param {integer} maxEntries Optional number of configurations to keep, default 4.
+  * @param {Metrics} metrics Optional metrics to record the latency of peer and orderer calls in.
+  * @param {IdentityCache} identities Optional cache for the state of other identities,
+  *                                   default 100 identities kept for an hour.
+  * @param {Admission} admission Optional limits on the calls in progress to each peer and orderer.
+  */
+  constructor(maxEntries, metrics, identities, admission){
+    this.maxEntries = maxEntries || 4;
+    this.metrics = metrics;
+    this.identities = identities || new IdentityCache(100, 3600000);
+    this.admission = admission;
+    this.entries = new Map();
+  };
+
+  /**
+  * Get the pool entry for the settings, creating an empty one if needed.
+  */
+  _entry(settings){
+    var key = Topology.key(settings);
+    var entry = this.entries.get(key);
+    if(entry !== undefined){
+      // Re-insert to keep the Map in least recently used order.
+      this.entries.delete(key);
+      this.entries.set(key, entry);
+      return entry;
+    }
+    logger.debug("_entry() - new pool entry for settings");
+    entry = { key: key, client: null, channels: null, peers: null, orderers: null, initialized: new Map() };
+    this.entries.set(key, entry);
+    while(this.entries.size > this.maxEntries){
+      this._evict(this.entries.values().next().value);
+    }
+    return entry;
+  };
+
+  /**
+  * Get the entry holding the {Client} and Channels for identity, the pool entry
+  * for the settings itself if no identity is given.
+  */
+  _identityEntry(settings, identity){
+    var entry = this._entry(settings);
+    if(identity === undefined || identity === null){
+      return entry;
+    }
+    var key = entry.key + '\n' + JSON.stringify(identity);
+    return this.identities.get(key, ()=>{
+      logger.debug("_identityEntry() - new entry for identity " + identity.username);
+      return { key: key, settingsKey: entry.key, client: null, channels: null, initialized: new Map() };
+    });
+  };
+
+  /**
+  * Return the cached Promise in entry[name], or build it with factory. If the
+  * Promise rejects the whole entry is evicted, or for an identity's entry just
+  * that identity.
+  */
+  _cached(entry, name, factory){
+    if(entry[name] === null){
+      entry[name] = factory().catch((err)=>{
+        this._evict(entry);
+        return Promise.reject(err);
+      });
+    }
+    return entry[name];
+  };
+
+  /**
+  * Record the latency of calls to new {Peer}s or {Orderer}s if there are metrics,
+  * and limit the calls in progress at once if there are limits. Time spent waiting
+  * for the limit isn't counted as the remote's latency.
+  */
+  _instrument(remotes, kind, calls){
+    if(this.metrics !== undefined){
+      remotes.forEach((remote)=>this.metrics.instrument(remote, kind, calls));
+    }
+    if(this.admission !== undefined){
+      remotes.forEach((remote)=>this.admission.limit(remote, kind, calls));
+    }
+    return remotes;
+  };
+
+  /**
+  * Remove an entry from the pool and close its connections.
+  */
+  _evict(entry){
+    if(entry.settingsKey !== undefined){
+      // An identity's entry, the connections belong to the pool entry.
+      this.identities.delete(entry.key, entry);
+      return;
+    }
+    if(this.entries.get(entry.key) !== entry) return;
+    logger.debug("_evict() - closing pool entry");
+    this.entries.delete(entry.key);
+    // Identities' Channels use the connections being closed.
+    this.identities.deletePrefix(entry.key + '\n');
+    var closeAll = function(remotes){ remotes.forEach(closeRemote); };
+    if(entry.peers) entry.peers.then(closeAll, ()=>{});
+    if(entry.orderers) entry.orderers.then(closeAll, ()=>{});
+  };
+
+  /**
+  * Get the shared {Client} configured with a user context.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @param {Object} identity Optional identity to sign as instead of settings.fabricUser,
+  *                          in the same form: username, mspid and cryptoContent.
+  * @returns {Promise} Resolving to the shared {Client}
+  */
+  getClient(settings, identity){
+    var entry = this._identityEntry(settings, identity);
+    return this._cached(entry, 'client', ()=>Common.getClient(settings, identity));
+  };
+
+  /**
+  * Get the shared {Client} with the configured Channels added to it.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @param {Object} identity Optional identity to sign as instead of settings.fabricUser
+  * @returns {Promise} Resolving to the shared {Client}
+  */
+  getClientWithChannels(settings, identity){
+    var entry = this._identityEntry(settings, identity);
+    return this._cached(entry, 'channels', ()=>{
+      return Promise.all([this.getClient(settings, identity), this.getPeers(settings), this.getOrderers(settings)]).then((data)=>{
+        logger.debug("getClientWithChannels() - adding Channels to shared client");
+        return Common.addChannelsToClient(data[0], settings, data[1], data[2]);
+      });
+    });
+  };
+
+  /**
+  * Get the shared {Peer}s.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @param {integer[]} peersIndex Optional array of indexes into the peer configuration.
+  * @returns {Promise} Resolving to an array of {Peer}s
+  */
+  getPeers(settings, peersIndex){
+    var entry = this._entry(settings);
+    return this._cached(entry, 'peers', ()=>{
+      return Common.getPeers(settings).then((peers)=>this._instrument(peers, 'peer', ['sendProposal']));
+    }).then((peers)=>{
+      if(peersIndex === undefined || peersIndex.length == 0){
+        return peers;
+      }
+      return peers.filter((aPeer, index)=>peersIndex.indexOf(index) !== -1);
+    });
+  };
+
+  /**
+  * Get the shared {Peer} for the first configured peer.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @returns {Promise} Resolving to the {Peer}
+  */
+  getPeer(settings){
+    return this.getPeers(settings).then((peers)=>peers[0]);
+  };
+
+  /**
+  * Get the shared {Orderer}s.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @returns {Promise} Resolving to an array of {Orderer}s
+  */
+  getOrderers(settings){
+    var entry = this._entry(settings);
+    return this._cached(entry, 'orderers', ()=>{
+      return Common.getOrderers(settings).then((orderers)=>this._instrument(orderers, 'orderer', ['sendBroadcast', 'sendDeliver']));
+    });
+  };
+
+  /**
+  * Get the shared {Orderer} for the first configured orderer.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @returns {Promise} Resolving to the {Orderer}
+  */
+  getOrderer(settings){
+    return this.getOrderers(settings).then((orderers)=>orderers[0]);
+  };
+
+  /**
+  * Initialize a shared {Channel} once. Failed initializations are not kept so
+  * they are retried by the next request.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @param {Channel} channel The channel from the shared {Client}
+  * @param {Object} identity Optional identity the {Client} was got for
+  * @returns {Promise} Resolving when the Channel has been initialized
+  */
+  initializeChannel(settings, channel, identity){
+    var initialized = this._identityEntry(settings, identity).initialized;
+    var name = channel.getName();
+    if(!initialized.has(name)){
+      initialized.set(name, channel.initialize().catch((err)=>{
+        initialized.delete(name);
+        return Promise.reject(err);
+      }));
+    }
+    return initialized.get(name);
+  };
+
+  /**
+  * Forget that a Channel has been initialized, e.g. after its configuration is updated.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @param {string} channelName Name of the channel
+  */
+  resetChannel(settings, channelName){
+    var entry = this._entry(settings);
+    entry.initialized.delete(channelName);
+    this.identities.values(entry.key + '\n').forEach((identityEntry)=>identityEntry.initialized.delete(channelName));
+  };
+
+  /**
+  * Evict the entry for the settings if err shows a connection to a peer or
+  * orderer has failed.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @param {Error} err The error a request failed with
+  */
+  evictIfBroken(settings, err){
+    if(Common.isConnectionError(err)){
+      logger.info("Evicting pooled connections after error: " + err);
+      this.evict(settings);
+    }
+  };
+
+  /**
+  * Close the pooled connections for the settings, e.g. once they have been replaced.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  */
+  evict(settings){
+    var entry = this.entries.get(Topology.key(settings));
+    if(entry !== undefined) this._evict(entry);
+  };
+
+  /**
+  * Close all pooled connections.
+  */
+  close(){
+    Array.from(this.entries.values()).forEach((entry)=>this._evict(entry));
+  };
+};
+
+module.exports = ClientPool;
@@ -10,7 +10,8 @@
  const User = require('fabric-client/lib/User');
  const EventHub = require('fabric-client/lib/EventHub');
 
- const fs = require('fs');
+ const Readable = require('stream').Readable;
+ const Topology = require('./Topology.js');
 
  //This module requires fabric-client so safe to use the same logger as set for sdk.
  const sdkutils = require('fabric-client/lib/utils');
@@ -27,46 +28,21 @@ var logEntry = function(aLogger,aFunction){
 exports.logEntry = logEntry
 
 /**
-* Get a promise that will resolve when the {eh} has successfully processed
-* the {txId} named or rejects when !VALID or the connection timed out/failed.
+* Get a new {EventHub} for a configured peer's eventURL. The caller must connect it.
 *
-* @param {EventHub} eh The EventHub to listen to events from.
-* @param {transactionID} transactionID The transaction ID to listen to an event from.
-* @returns {Promise} A promise that will resolve if a VALID response from the
-*  peer when successful or reject if it times out or rejects it.
+* @param {Client} aClient A {Client} with a user context to sign event registrations
+* @param {Object} settings The settings passed to the loopback connector
+* @param {integer} peerIndex Index into the peer configuration.
+* @returns {EventHub} The new EventHub
 */
-// var getTxEventPromise = function(eh,transactionID){
-//   return txPromise = new Promise((resolve, reject) => {
-//     // Connect to the eh
-//     eh.connect();
-//
-//     //TODO Set a time out?
-//
-//     // Call registerTxEvent
-//     eh.registerTxEvent(transactionID, (tx, code) => {
-//         //On successful event response
-//         eh.unregisterTxEvent(transactionID);
-//         eh.disconnect();
-//
-//         if (code !== 'VALID') {
-//           logger.error('Transaction ' + transactionID + ' was invalid, code = ' + code);
-//           reject(code);
-//         } else {
-//           logger.info('Transaction ' + transactionID + ' has been committed on peer ' +
-//                       eh.getPeerAddr());
-//           resolve();
-//         }
-//       }, (err) => {
-//         //On error with EventHub
-//         eh.unregisterTxEvent(transactionId);
-//         logger.error('Transaction listener for '+ transactionID +' has been ' +
-//                   'deregistered with ' + err + ' for peer ' + eh.getPeerAddr());
-//         reject(err);
-//       }
-//     );
-//   });
-// }
-// exports.getTxEventPromise = getTxEventPromise
+exports.getEventHub = function(aClient, settings, peerIndex){
+  var topology = Topology.of(settings);
+  var eventUrl = topology.peers[peerIndex].eventUrl;
+  logger.debug("EventHub found: " + eventUrl);
+  var eh = aClient.newEventHub();
+  eh.setPeerAddr(eventUrl, topology.peerOpts(peerIndex));
+  return eh;
+}
 
 /**
 * Check proposalResponses and return number that failed.
@@ -111,22 +87,85 @@ exports.countFailedProposalResponses = function(proposalResponses){
   return failedCount;
 }
 
+/**
+* Check whether an error shows that a connection to a peer or orderer has failed,
+* meaning any connections kept for reuse should be discarded.
+*
+* @param {Error} err The error to check
+* @returns {boolean} true if the error is a connection failure
+*/
+exports.isConnectionError = function(err){
+  if(err === undefined || err === null) return false;
+  // grpc status 14 is UNAVAILABLE
+  if(err.code === 14 || err.status === 14) return true;
+  var message = (err instanceof Error ? err.message : String(err));
+  return /Connect Failed|UNAVAILABLE|REQUEST_TIMEOUT|Channel closed|ECONNREFUSED/i.test(message);
+}
+
 exports.isBase64 = function(aString){
   // Pattern: Start of string, 0 or more valid quartets with last possibly padded, End of String
   var base64Pattern = new RegExp("^([A-Za-z0-9\+\/]{4})*(([A-Za-z0-9\+\/]{3}\=)?|([A-Za-z0-9+\/]{2}\=\=))?$");
   return base64Pattern.test(aString);
 }
 
+/**
+* Read a binary stream, such as an HTTP request body, into a single Buffer. When the
+* length is known in advance the Buffer is allocated once and each chunk copied
+* straight into it.
+*
+* @param {stream.Readable} aStream The stream to read
+* @param {integer} length Optional expected number of bytes, e.g. from Content-Length
+* @param {integer} maxLength Maximum number of bytes to accept
+* @returns {Promise} Resolving to a Buffer of the stream contents, or rejecting with
+*                    a 413 error if the stream is longer than maxLength.
+*/
+exports.readStream = function(aStream, length, maxLength){
+  return new Promise(function(resolve, reject){
+    var tooLarge = function(){
+      var err = new Error("Payload Too Large - limit is " + maxLength + " bytes");
+      err.statusCode = 413;
+      return err;
+    };
+    if(length > maxLength) return reject(tooLarge());
+
+    var known = (length !== undefined && length !== null && !isNaN(length));
+    var buffer = (known ? Buffer.allocUnsafe(length) : null);
+    var chunks = [];
+    var received = 0;
+    aStream.on('data', function(chunk){
+      if(received + chunk.length > (known ? length : maxLength)){
+        aStream.removeAllListeners('data');
+        aStream.pause();
+        return reject(tooLarge());
+      }
+      if(known) chunk.copy(buffer, received);
+      else chunks.push(chunk);
+      received += chunk.length;
+    });
+    aStream.on('end', function(){
+      if(!known) return resolve(Buffer.concat(chunks, received));
+      if(received < length){
+        var err = new Error("Bad request - expected " + length + " bytes, received " + received);
+        err.statusCode = 400;
+        return reject(err);
+      }
+      resolve(buffer);
+    });
+    aStream.on('error', reject);
+  });
+}
+
 /**
 * Get a new {Client} that has been configured.
 *
 * @param {Object} settings The settings passed to the loopback connector
+* @param {Object} user Optional identity to use instead of settings.fabricUser, in the
+*                      same form: username, mspid and cryptoContent.
 * @returns {Promise} A Promise containing the new {Client} that has been configured with a
 *                    default User context that is created here using the settings, and the
 *                    Orderer is set.
 */
-var getClient = function(settings){
-  //TODO change from using 1 configured User from datasources.json
+var getClient = function(settings, user){
 
   // Options for a file key store
   var keyStoreOpts = {
@@ -140,9 +179,9 @@ var getClient = function(settings){
   return Client.newDefaultKeyValueStore(keyStoreOpts).then(
     (store) => {
       aClient.setStateStore(store);
-      // Set the user context for the {Client} from the information in datasources.json
-      // and return the Promise that does that work.
-      return aClient.createUser(settings.fabricUser);
+      // Set the user context for the {Client} from the information in datasources.json,
+      // or the identity given, and return the Promise that does that work.
+      return aClient.createUser(user || settings.fabricUser);
     }
   ).then(
     (userData)=>{
@@ -184,37 +223,7 @@ exports.getClientWithChannels = function(settings){
 * @returns {Promise} Containing the new Peer
 */
 exports.getPeer = function(settings){
-  if(settings.peers !== undefined && settings.peers !== null){
-    //Get org from datasources.json
-    //logger.debug("getPeer() - entry");
-    var orgIndex = settings.peers[0].orgIndex;
-    let opts = {};
-    if(settings.peers[0].tls_cacerts){
-      // If tls cert for peer set use that
-      //logger.debug("getPeer() - Using pem file: "+settings.peers[0].tls_cacerts);
-      opts.pem = fs.readFileSync(settings.peers[0].tls_cacerts,'utf-8');
-    } else {
-      // Set the PEM to be the org's CACertFile
-      //logger.debug("getPeer() - Using pem file: "+settings.orgs[orgIndex].CACertFile);
-      opts.pem = fs.readFileSync(settings.orgs[orgIndex].CACertFile,'utf-8');
-    }
-    //console.log(opts.pem);
-    //TODO Do the following better!
-    if(settings.peers[0].hostname!== undefined && settings.peers[0].hostname !== null){
-      //Set ssl-target-name-override to let tls work in test environment
-      opts['ssl-target-name-override'] = settings.peers[0].hostname;
-    }
-    var peerUrl = settings.peers[0].requestURL;
-    if(!peerUrl.startsWith("grpc://") && !peerUrl.startsWith("grpcs://") ){
-      logger.debug("Adding grpc:// prefix to "+ peerUrl);
-      peerUrl = "grpc://"+peerUrl;
-    }
-    logger.debug("Connecting to Peer: "+peerUrl);
-    return Promise.resolve(new Peer(peerUrl,opts));
-  } else {
-    return Promise.reject("peers[0] not configured in datasources.json");
-  }
-
+  return getPeers(settings, [0]).then((peers)=>peers[0]);
 }
 
 /**
@@ -226,53 +235,22 @@ exports.getPeer = function(settings){
 * @returns {Promise} Resolving to an array of {Peer}s
 */
 var getPeers = function(settings,peersIndex){
-  var subset = false;
-  var resultLength = 0;
+  var topology;
+  try {
+    topology = Topology.of(settings);
+  } catch(err) {
+    return Promise.reject(err);
+  }
+  var configured = topology.peers;
   if(peersIndex !== undefined && peersIndex.length > 0){
-    subset = true;
-    resultLength = peersIndex.length;
     logger.debug("getPeers() peersIndex: "+peersIndex.toString());
+    // Skip the peers not requested, keeping the configured order.
+    configured = configured.filter((aPeer)=>peersIndex.indexOf(aPeer.index) !== -1);
   }
-
-  if(settings.peers !== undefined && settings.peers !== null){
-    if(resultLength == 0){
-      resultLength = settings.peers.length;
-    }
-    var resultArray = new Array(resultLength);
-    var outputIndex = 0;
-    settings.peers.forEach( function(aPeer,index){
-      // Skip this if a subset of peers specified and this element not requested.
-      if(subset && peersIndex.indexOf(index) === -1) {
-        return;
-      };
-      //Get org from datasources.json
-      var orgIndex = aPeer.orgIndex;
-      let opts = {};
-      if(aPeer.tls_cacerts){
-        // If tls cert for peer set use that
-        opts.pem = fs.readFileSync(aPeer.tls_cacerts,'utf-8');
-      } else {
-        // Set the PEM to be the org's CACertFile
-        opts.pem = fs.readFileSync(settings.orgs[orgIndex].CACertFile,'utf-8');
-      }
-
-      if(aPeer.hostname!== undefined && aPeer.hostname !== null){
-        //Set ssl-target-name-override to let tls work in test environment
-        opts['ssl-target-name-override'] = aPeer.hostname;
-      }
-      var peerUrl = settings.peers[index].requestURL;
-      if(!peerUrl.startsWith("grpc://") && !peerUrl.startsWith("grpcs://") ){
-        logger.debug("Adding grpc:// prefix to "+ peerUrl);
-        peerUrl = "grpc://"+peerUrl;
-      }
-      logger.debug("Peer found: " + peerUrl);
-      resultArray[outputIndex] = new Peer(peerUrl,opts);
-      outputIndex++; //Safe as forEach processes one element at a time.
-    });
-    return Promise.resolve(resultArray);
-  } else {
-    return Promise.reject("peers[0] not configured in datasources.json");
-  }
+  return Promise.resolve(configured.map((aPeer)=>{
+    logger.debug("Peer found: " + aPeer.url);
+    return new Peer(aPeer.url, topology.peerOpts(aPeer.index));
+  }));
 }
 exports.getPeers = getPeers;
 
@@ -286,34 +264,31 @@ exports.getPeers = getPeers;
 * Read Channel configuration from settings and add them to the Client.
 *
 * @param Object settings The settings passed to the loopback connector
+* @param {Peer[]} peers Optional array of all configured {Peer}s to use instead of new ones
+* @param {Orderer[]} orderers Optional array of all configured {Orderer}s to use instead of new ones
 * @returns {Promise} Resolving to the configured {Client}
 */
-var addChannelsToClient = function(aClient, settings){
+var addChannelsToClient = function(aClient, settings, peers, orderers){
 
-  var orderersPromise = getOrderers(settings);
-  var peersPromise = getPeers(settings);
+  var orderersPromise = (orderers !== undefined ? Promise.resolve(orderers) : getOrderers(settings));
+  var peersPromise = (peers !== undefined ? Promise.resolve(peers) : getPeers(settings));
 
   //1. Get configured Peers
   return Promise.all([peersPromise,orderersPromise]).then( (data)=>{
       var pArray = data[0];
       var oArray = data[1];
 
-      //2. Loop through configured Channels and add them to the Client.
-      settings.channels.forEach( function(channelConfig,cIndex){
+      //2. Loop through configured Channels and add them to the Client. Their peer and
+      //   orderer indexes were checked when the settings were first used.
+      Topology.of(settings).channels.forEach( function(channelConfig,cIndex){
           //2.1 Create a new channel in the client.
           var newChannel = aClient.newChannel(channelConfig.name);
           //2.2 Loop through the peers defined for the channel and add them.
           channelConfig.peersIndex.forEach(function(peerArrayIndex,pIndex){
-            if(peerArrayIndex >= pArray.length){
-              throw new Error("Channel "+channelConfig.name+" references peer with index "+peerArrayIndex);
-            };
             newChannel.addPeer(pArray[peerArrayIndex]);
           });
           //2.3 Loop through the orderers defined for the channel and add them.
           channelConfig.orderersIndex.forEach(function(ordererArrayIndex,oIndex){
-            if(ordererArrayIndex >= oArray.length){
-              throw new Error("Channel "+channelConfig.name+" references orderer with index "+ordererArrayIndex);
-            };
             newChannel.addOrderer(oArray[ordererArrayIndex]);
           });
           //TODO Consider whether to initialize the channel too.
@@ -329,25 +304,11 @@ var addChannelsToClient = function(aClient, settings){
 exports.addChannelsToClient = addChannelsToClient;
 
 /*
-* A Basic validation routine to check that the main configuration settings are there.
+* A Basic validation routine to check that the main configuration settings are there,
+* and that the peers, orderers and channels can be resolved into a {Topology}.
 */
 exports.validateSettings = function(settings){
   var errorCount = 0;
-  if(settings.channels === undefined || settings.channels === null
-    || settings.channels.length == 0){
-    logger.error("No channels defined in datasources.json.");
-    errorCount++;
-  };
-  if(settings.peers === undefined || settings.peers === null
-    || settings.peers.length == 0){
-    logger.error("No peers defined in datasources.json.");
-    errorCount++;
-  };
-  if(settings.orderers === undefined || settings.orderers === null
-    || settings.orderers.length == 0){
-    logger.error("No orderers defined in datasources.json.");
-    errorCount++;
-  };
   if(settings.orgs === undefined || settings.orgs === null
     || settings.orgs.length == 0){
     logger.error("No orgs defined in datasources.json.");
@@ -361,6 +322,21 @@ exports.validateSettings = function(settings){
     logger.error("No fabricUser defined in datasources.json.");
     errorCount++;
   };
+  if(settings.fabricUsers !== undefined && settings.fabricUsers !== null){
+    Object.keys(settings.fabricUsers).forEach((restUser)=>{
+      var identity = settings.fabricUsers[restUser];
+      if(identity === null || typeof identity !== 'object' || !identity.username){
+        logger.error("fabricUsers." + restUser + " in datasources.json has no username.");
+        errorCount++;
+      }
+    });
+  };
+  try {
+    Topology.of(settings);
+  } catch(err) {
+    logger.error(err.message);
+    errorCount++;
+  }
   if(errorCount>0){
     logger.debug("Settings:\n"+JSON.stringify(settings));
   }
@@ -374,32 +350,7 @@ exports.validateSettings = function(settings){
 * @returns {Promise} Resolving to the new Orderer
 */
 exports.getOrderer = function(settings){
-  if(settings.orderers !== undefined && settings.orderers !== null){
-    logger.debug("Orderer is " + settings.orderers[0].url);
-    let opts = {};
-    if(settings.orderers[0].tls_cacerts){
-      // If tls cert for orderer set use that
-      opts.pem = fs.readFileSync(settings.orderers[0].tls_cacerts,'utf-8');
-    } else {
-      // Set the PEM to be the org's CACertFile
-      opts.pem = fs.readFileSync(settings.orderers[0].CACertFile,'utf-8');
-    }
-    //opts.pem = fs.readFileSync(settings.fabricCA.publicCertFile,'utf-8');
-    //TODO Do the following better!
-    //Set ssl-target-name-override to let it work in test environment
-    opts['ssl-target-name-override'] = settings.orderers[0].hostname;
-
-    var ordererUrl = settings.orderers[0].url;
-    if(!ordererUrl.startsWith("grpc://") && !ordererUrl.startsWith("grpcs://") ){
-      logger.debug("Adding grpc:// prefix to "+ ordererUrl);
-      ordererUrl = "grpc://"+ordererUrl;
-    }
-    logger.debug("Orderer found: " + ordererUrl);
-    return Promise.resolve(new Orderer(ordererUrl,opts));
-  } else {
-    return Promise.reject("orderers[0] not configured in datasources.json");
-  }
-
+  return getOrderers(settings).then((orderers)=>orderers[0]);
 }
 
 /**
@@ -409,34 +360,16 @@ exports.getOrderer = function(settings){
 * @returns {Promise} Resolving to an array of {Orderer}s
 */
 var getOrderers = function(settings){
-  if(settings.orderers !== undefined && settings.orderers !== null){
-    var resultArray = new Array(settings.orderers.length);
-    settings.orderers.forEach( function(anOrd,index){
-      let opts = {};
-      if(anOrd.tls_cacerts){
-        // If tls cert for orderer set use that
-        opts.pem = fs.readFileSync(anOrd.tls_cacerts,'utf-8');
-      } else {
-        // Set the PEM to be the org's CACertFile
-        opts.pem = fs.readFileSync(anOrd.CACertFile,'utf-8');
-      }
-
-      if(anOrd.hostname!== undefined && anOrd.hostname !== null){
-        //Set ssl-target-name-override to let tls work in test environment
-        opts['ssl-target-name-override'] = anOrd.hostname;
-      }
-      var ordererUrl = settings.orderers[0].url;
-      if(!ordererUrl.startsWith("grpc://") && !ordererUrl.startsWith("grpcs://") ){
-        logger.debug("Adding grpc:// prefix to "+ ordererUrl);
-        ordererUrl = "grpc://"+ordererUrl;
-      }
-      logger.debug("Orderer found: " + ordererUrl);
-      resultArray[index] = new Orderer(ordererUrl,opts);
-    });
-    return Promise.resolve(resultArray);
-  } else {
-    return Promise.reject("orderers[0] not configured in datasources.json");
+  var topology;
+  try {
+    topology = Topology.of(settings);
+  } catch(err) {
+    return Promise.reject(err);
   }
+  return Promise.resolve(topology.orderers.map((anOrderer)=>{
+    logger.debug("Orderer found: " + anOrderer.url);
+    return new Orderer(anOrderer.url, topology.ordererOpts(anOrderer.index));
+  }));
 }
 exports.getOrderers = getOrderers;
 
@@ -530,6 +463,125 @@ exports.formatBufferResponse = function(response){
   }
 }
 
+/**
+* Find the start and end offsets of each element of a JSON array held in a Buffer,
+* without parsing the elements into objects. JSON's structural characters are all
+* ASCII so the UTF-8 bytes can be scanned directly.
+*
+* @param {Buffer} buffer A Buffer containing a JSON array
+* @returns {Array} An array of [start, end] offsets, one per element
+* @throws {Error} If the Buffer does not contain a well formed JSON array
+*/
+exports.splitJSONArray = function(buffer){
+  var isSpace = function(c){ return c === 0x20 || c === 0x0a || c === 0x0d || c === 0x09; };
+  var elements = [];
+  var depth = 0;
+  var inString = false;
+  var start = -1;
+  var end = -1;
+  var i = 0;
+  while(i < buffer.length && isSpace(buffer[i])) i++;
+  if(buffer[i] !== 0x5b) throw new Error("Not a JSON array");
+  for(i++; i < buffer.length; i++){
+    var c = buffer[i];
+    if(inString){
+      if(c === 0x5c) i++; // Skip the escaped character
+      else if(c === 0x22) { inString = false; end = i + 1; }
+      continue;
+    }
+    if(isSpace(c)) continue;
+    if(depth === 0 && (c === 0x2c || c === 0x5d)){ // , or ] ends an element
+      if(start >= 0) elements.push([start, end]);
+      start = -1;
+      if(c === 0x5d) return elements;
+      continue;
+    }
+    if(start < 0) start = i;
+    end = i + 1;
+    if(c === 0x22) inString = true;
+    else if(c === 0x7b || c === 0x5b) depth++;
+    else if(c === 0x7d || c === 0x5d) depth--;
+  }
+  throw new Error("Unterminated JSON array");
+}
+
+/**
+* Get a stream of newline delimited JSON, one line per element of a JSON array.
+*
+* @param {Buffer} buffer A Buffer containing a JSON array
+* @param {Array} elements [start, end] offsets of the elements to include, see splitJSONArray
+* @returns {stream.Readable} The stream of elements
+*/
+exports.ndjsonStream = function(buffer, elements){
+  var next = 0;
+  var newline = Buffer.from("\n");
+  return new Readable({
+    read: function(){
+      while(next < elements.length){
+        var element = elements[next++];
+        this.push(buffer.slice(element[0], element[1]));
+        if(!this.push(newline)) return;
+      }
+      this.push(null);
+    }
+  });
+}
+
+// Parts of a block that can be selected with a fields query parameter.
+var BLOCK_FIELDS = ["header", "txids", "data", "metadata"];
+
+/**
+* Parse a comma separated list of block fields.
+*
+* @param {string} fields The fields query parameter, e.g. "header,txids"
+* @returns {string[]} The names of the fields, or undefined for the whole block
+* @throws {Error} With a statusCode of 400 if a field name is unknown.
+*/
+exports.parseBlockFields = function(fields){
+  if(fields === undefined || fields === null || fields === "") return undefined;
+  var names = fields.split(",").map((name)=>name.trim()).filter((name)=>name.length > 0);
+  var unknown = names.filter((name)=>BLOCK_FIELDS.indexOf(name) < 0);
+  if(unknown.length > 0){
+    var error = new Error("Unknown block fields " + unknown.join(",") + ", use any of " + BLOCK_FIELDS.join(","));
+    error.statusCode = 400;
+    throw error;
+  }
+  return names;
+}
+
+/**
+* Select parts of a block so a client that only needs, say, the header is not sent
+* every transaction's payload, endorsements and read-write sets. "txids" is a
+* summary of each transaction: its tx_id, type, timestamp and validation_code.
+*
+* @param {Block} block A block, as returned by the SDK
+* @param {string[]} fields The fields to include, see parseBlockFields
+* @returns {object} A new object holding the selected fields, or the block itself
+*                   if fields is undefined.
+*/
+exports.selectBlockFields = function(block, fields){
+  if(fields === undefined) return block;
+  var result = {};
+  fields.forEach((field)=>{
+    if(field === "txids"){
+      var metadata = (block.metadata && block.metadata.metadata) || [];
+      var flags = (metadata[2] instanceof Array ? metadata[2] : []);
+      result.txids = ((block.data && block.data.data) || []).map((envelope, index)=>{
+        var channelHeader = envelope.payload.header.channel_header;
+        return {
+          tx_id: channelHeader.tx_id,
+          type: channelHeader.type,
+          timestamp: channelHeader.timestamp,
+          validation_code: (index < flags.length ? flags[index] : null)
+        };
+      });
+    } else {
+      result[field] = block[field];
+    }
+  });
+  return result;
+}
+
 var reconnect = function(channel,callback){
   //TODO
 };
@@ -0,0 +1,206 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+var Common = require('./Common.js');
+var Topology = require('./Topology.js');
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/EventHubPool.js');
+
+// Names of the TxValidationCode values in fabric/protos/peer/transaction.proto
+var validationCodes = ['VALID', 'NIL_ENVELOPE', 'BAD_PAYLOAD', 'BAD_COMMON_HEADER',
+  'BAD_CREATOR_SIGNATURE', 'INVALID_ENDORSER_TRANSACTION', 'INVALID_CONFIG_TRANSACTION',
+  'UNSUPPORTED_TX_PAYLOAD', 'BAD_PROPOSAL_TXID', 'DUPLICATE_TXID', 'ENDORSEMENT_POLICY_FAILURE',
+  'MVCC_READ_CONFLICT', 'PHANTOM_READ_CONFLICT', 'UNKNOWN_TX_TYPE', 'TARGET_CHAIN_NOT_FOUND',
+  'MARSHAL_TX_ERROR', 'NIL_TXACTION', 'EXPIRED_CHAINCODE', 'CHAINCODE_VERSION_CONFLICT',
+  'BAD_HEADER_EXTENSION', 'BAD_CHANNEL_HEADER', 'BAD_RESPONSE_PAYLOAD', 'BAD_RWSET',
+  'ILLEGAL_WRITESET'];
+
+var validationCodeName = function(code){
+  if(code === 254) return 'NOT_VALIDATED';
+  return validationCodes[code] || 'INVALID_OTHER_REASON';
+};
+
+/**
+* Persistent {EventHub} connections, one per peer, shared by every request that
+* waits for a transaction to be committed. Each EventHub has a single block
+* listener that settles the waits for all of the transactions in a block, so any
+* number of transactions can be in flight on one event stream.
+*/
+class EventHubPool {
+
+  /**
+  * @param {ClientPool} clientPool The pool providing the {Client} that signs event registrations.
+  * @param {integer} connectTimeout Milliseconds to wait for an EventHub to connect, default 10000.
+  */
+  constructor(clientPool, connectTimeout){
+    this.clientPool = clientPool;
+    this.connectTimeout = (connectTimeout !== undefined ? connectTimeout : 10000);
+    this.hubs = new Map();
+  };
+
+  /**
+  * Wait for the peer to accept a hub's event registration. Until then blocks are
+  * not sent to the hub, so a transaction waited for sooner could be missed.
+  *
+  * @returns {Promise} Resolving to the hub once connected, or rejecting if its
+  *                    event stream fails or it does not connect in time.
+  */
+  _whenConnected(hub){
+    return new Promise((resolve, reject)=>{
+      var started = Date.now();
+      var check = ()=>{
+        if(hub.failed !== undefined) return reject(hub.failed);
+        if(hub.eh.isconnected()) return resolve(hub);
+        if(Date.now() - started >= this.connectTimeout){
+          var err = new Error("Timed out connecting to the EventHub at " + hub.eh.getPeerAddr());
+          err.statusCode = 504;
+          return reject(err);
+        }
+        setTimeout(check, 10);
+      };
+      check();
+    });
+  };
+
+  /**
+  * Get the connected hub for a peer, connecting to it if needed.
+  */
+  _hub(settings, peerIndex){
+    var key = Topology.key(settings) + "#" + peerIndex;
+    var hub = this.hubs.get(key);
+    if(hub !== undefined) return hub.ready;
+
+    hub = { key: key, eh: null, pending: new Map() };
+    this.hubs.set(key, hub);
+    hub.ready = this.clientPool.getClient(settings).then((aClient)=>{
+      hub.eh = Common.getEventHub(aClient, settings, peerIndex);
+      hub.eh.connect();
+      hub.eh.registerBlockEvent((block)=>this._onBlock(hub, block), (err)=>this._onError(hub, err));
+      return this._whenConnected(hub);
+    }).then((hub)=>{
+      logger.debug("_hub() - connected to " + hub.eh.getPeerAddr());
+      return hub;
+    }).catch((err)=>{
+      if(this.hubs.get(key) === hub) this.hubs.delete(key);
+      if(hub.eh !== null){
+        try { hub.eh.disconnect(); } catch(ignored) {}
+      }
+      return Promise.reject(err);
+    });
+    return hub.ready;
+  };
+
+  /**
+  * Settle the waits for any pending transactions in a block.
+  */
+  _onBlock(hub, block){
+    if(hub.pending.size == 0) return;
+    var metadata = (block.metadata ? block.metadata.metadata : undefined);
+    var filter = (metadata ? metadata[2] : undefined);
+    if(!filter || !block.data || !(block.data.data instanceof Array)){
+      logger.warn("_onBlock() - skipping block " + (block.header ? block.header.number : "") + " without transaction validation codes");
+      return;
+    }
+    block.data.data.forEach(function(envelope, index){
+      var channelHeader = envelope.payload.header.channel_header;
+      var waiter = hub.pending.get(channelHeader.tx_id);
+      if(waiter === undefined || waiter.channelName !== channelHeader.channel_id) return;
+      var code = filter[index];
+      waiter.settle();
+      waiter.resolve({
+        commitStatus: validationCodeName(code),
+        validationCode: code,
+        blockNumber: block.header.number.toString()
+      });
+    });
+  };
+
+  /**
+  * The event stream has failed, fail all pending waits and reconnect on next use.
+  */
+  _onError(hub, err){
+    logger.error("EventHub " + (hub.eh ? hub.eh.getPeerAddr() : "") + " failed: " + err);
+    hub.failed = (err instanceof Error ? err : new Error(String(err)));
+    if(this.hubs.get(hub.key) === hub) this.hubs.delete(hub.key);
+    Array.from(hub.pending.values()).forEach(function(waiter){
+      waiter.settle();
+      waiter.reject(err instanceof Error ? err : new Error(String(err)));
+    });
+    try { hub.eh.disconnect(); } catch(ignored) {}
+  };
+
+  /**
+  * Start listening for a transaction to be committed. This must be done before the
+  * transaction is sent to the orderer.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @param {string} channelName Name of the channel
+  * @param {string} transactionID The transaction ID to wait for
+  * @param {integer} timeout Milliseconds to wait before giving up
+  * @returns {Promise} Resolving, once listening, to an object with a committed
+  *                    Promise and a cancel function. committed resolves to the
+  *                    commitStatus, validationCode and blockNumber of the
+  *                    transaction, or rejects with a 504 error on timeout.
+  */
+  register(settings, channelName, transactionID, timeout){
+    var peerIndex = -1;
+    var topology;
+    try {
+      topology = Topology.of(settings);
+    } catch(err) {
+      return Promise.reject(err);
+    }
+    var channelConfig = topology.channel(channelName);
+    if(channelConfig !== undefined){
+      peerIndex = channelConfig.peersIndex.find((index)=>topology.peers[index].eventUrl !== undefined);
+    }
+    if(peerIndex === undefined || peerIndex < 0){
+      var err = new Error("No peer with an eventURL is configured for channel " + channelName);
+      err.statusCode = 400;
+      return Promise.reject(err);
+    }
+
+    return this._hub(settings, peerIndex).then((hub)=>{
+      var waiter = { channelName: channelName };
+      var committed = new Promise(function(resolve, reject){
+        waiter.resolve = resolve;
+        waiter.reject = reject;
+      });
+      waiter.timer = setTimeout(function(){
+        waiter.settle();
+        var err = new Error("Timed out waiting for transaction " + transactionID + " to be committed");
+        err.statusCode = 504;
+        waiter.reject(err);
+      }, timeout);
+      waiter.settle = function(){
+        clearTimeout(waiter.timer);
+        hub.pending.delete(transactionID);
+      };
+      hub.pending.set(transactionID, waiter);
+      // Avoid unhandled rejection warnings if the caller cancels rather than waits.
+      committed.catch(function(){});
+      return { committed: committed, cancel: waiter.settle };
+    });
+  };
+
+  /**
+  * Disconnect all EventHubs, or only those for some settings.
+  *
+  * @param {Object} settings Optional settings passed to the loopback connector
+  */
+  close(settings){
+    var prefix = (settings !== undefined ? Topology.key(settings) + "#" : "");
+    Array.from(this.hubs.values()).forEach((hub)=>{
+      if(!hub.key.startsWith(prefix)) return;
+      this.hubs.delete(hub.key);
+      hub.ready.then((hub)=>hub.eh.disconnect(), ()=>{});
+    });
+  };
+};
+
+module.exports = EventHubPool;
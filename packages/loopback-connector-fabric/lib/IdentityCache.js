@@ -0,0 +1,104 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/IdentityCache.js');
+
+/**
+* A size and age bounded, least recently used cache of the state built for each
+* Fabric identity, such as a {Client} holding the identity's user context with its
+* signing identity and crypto suite. Loading an identity reads and imports its key
+* and certificate, so it is done once per identity rather than on every request.
+*
+* Entries expire ttl milliseconds after they are created, so a renewed certificate
+* or key is picked up without restarting the server.
+*/
+class IdentityCache {
+
+  /**
+  * @param {integer} maxEntries Maximum number of identities to hold, 0 disables the cache.
+  * @param {integer} ttl Milliseconds an entry is kept for, 0 for no limit.
+  */
+  constructor(maxEntries, ttl){
+    this.maxEntries = maxEntries;
+    this.ttl = ttl;
+    this.entries = new Map();
+  };
+
+  /**
+  * Get the value held for key, creating it if there is none or it has expired.
+  *
+  * @param {string} key Identifies the identity
+  * @param {function} create Called with no arguments to create the value
+  * @returns {any} The value held for key
+  */
+  get(key, create){
+    var entry = this.entries.get(key);
+    if(entry !== undefined){
+      this.entries.delete(key);
+      if(this.ttl == 0 || Date.now() < entry.expires){
+        // Re-insert to keep the Map in least recently used order.
+        this.entries.set(key, entry);
+        return entry.value;
+      }
+      logger.debug("get() - identity entry expired");
+    }
+    var value = create();
+    if(this.maxEntries > 0){
+      this.entries.set(key, { value: value, expires: Date.now() + this.ttl });
+      while(this.entries.size > this.maxEntries){
+        this.entries.delete(this.entries.keys().next().value);
+      }
+    }
+    return value;
+  };
+
+  /**
+  * Remove the entry for key, if it still holds value.
+  *
+  * @param {string} key Identifies the identity
+  * @param {any} value Optional value the entry must hold to be removed
+  */
+  delete(key, value){
+    var entry = this.entries.get(key);
+    if(entry !== undefined && (value === undefined || entry.value === value)){
+      this.entries.delete(key);
+    }
+  };
+
+  /**
+  * Remove the entries whose key starts with prefix.
+  *
+  * @param {string} prefix Prefix of the keys to remove, e.g. all identities for some settings
+  */
+  deletePrefix(prefix){
+    Array.from(this.entries.keys()).forEach((key)=>{
+      if(key.startsWith(prefix)) this.entries.delete(key);
+    });
+  };
+
+  /**
+  * @returns {any[]} The values held for keys starting with prefix.
+  */
+  values(prefix){
+    var values = [];
+    this.entries.forEach((entry, key)=>{
+      if(key.startsWith(prefix)) values.push(entry.value);
+    });
+    return values;
+  };
+
+  /**
+  * @returns {integer} The number of identities held.
+  */
+  size(){
+    return this.entries.size;
+  };
+};
+
+module.exports = IdentityCache;
@@ -0,0 +1,181 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+const crypto = require('crypto');
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/LedgerCache.js');
+
+/**
+* DER encode an element with the given tag and content.
+*/
+var derElement = function(tag, content){
+  var length;
+  if(content.length < 128){
+    length = [content.length];
+  } else {
+    length = [];
+    for(var len = content.length; len > 0; len = Math.floor(len / 256)){
+      length.unshift(len % 256);
+    }
+    length.unshift(0x80 | length.length);
+  }
+  return Buffer.concat([Buffer.from([tag].concat(length)), content]);
+};
+
+/**
+* DER encode a non-negative integer.
+*/
+var derInteger = function(value){
+  var bytes = [];
+  for(var n = Number(value); n > 0; n = Math.floor(n / 256)){
+    bytes.unshift(n % 256);
+  }
+  // Integers are signed, so pad with a zero byte if the top bit is set.
+  if(bytes.length == 0 || bytes[0] & 0x80) bytes.unshift(0);
+  return derElement(0x02, Buffer.from(bytes));
+};
+
+var toBuffer = function(value){
+  if(value instanceof Buffer) return value;
+  return Buffer.from(value || '', 'hex');
+};
+
+/**
+* Calculate the hash of a block the same way as the peer, the SHA256 of the ASN.1
+* encoding of the block header's number, previous hash and data hash.
+*
+* @param {Block} block A decoded block, see https://fabric-sdk-node.github.io/global.html#Block
+* @returns {string} The hash as a hex string
+*/
+var blockHash = function(block){
+  var header = block.header;
+  var asn1 = derElement(0x30, Buffer.concat([
+    derInteger(header.number.toString()),
+    derElement(0x04, toBuffer(header.previous_hash)),
+    derElement(0x04, toBuffer(header.data_hash))
+  ]));
+  return crypto.createHash('sha256').update(asn1).digest('hex');
+};
+exports.blockHash = blockHash;
+
+/**
+* A size bounded, least recently used cache of blocks and transactions read from
+* the ledger. Once committed these never change, so can be served without asking a
+* peer again. A block is reachable by both its number and its hash.
+*
+* Each Fabric identity may be allowed to read different channels, so entries are
+* kept separately for the identity that read them and only served to that identity.
+*/
+class LedgerCache {
+
+  /**
+  * @param {integer} maxEntries Maximum number of keys to hold, 0 disables the cache.
+  */
+  constructor(maxEntries){
+    this.maxEntries = maxEntries;
+    this.entries = new Map();
+    this.etags = new WeakMap();
+    this.hits = 0;
+    this.misses = 0;
+  };
+
+  _key(owner, channelName, queryType, id){
+    var key = String(id);
+    if(queryType == "blockHash") key = key.toLowerCase();
+    return JSON.stringify([owner === undefined ? null : owner, channelName, queryType, key]);
+  };
+
+  _set(key, value){
+    this.entries.delete(key);
+    this.entries.set(key, value);
+    while(this.entries.size > this.maxEntries){
+      this.entries.delete(this.entries.keys().next().value);
+    }
+  };
+
+  /**
+  * Look up a block or transaction.
+  *
+  * @param {string} channelName Name of the channel
+  * @param {string} queryType One of "blockId", "blockHash" or "txnId"
+  * @param {string} id The block number, block hash or transaction ID
+  * @param {string} owner Username of the Fabric identity reading, undefined for fabricUser
+  * @returns {object} The cached block or transaction, or undefined if not cached
+  */
+  get(channelName, queryType, id, owner){
+    if(this.maxEntries <= 0) return undefined;
+    var key = this._key(owner, channelName, queryType, id);
+    var value = this.entries.get(key);
+    if(value === undefined){
+      this.misses++;
+      return undefined;
+    }
+    this.hits++;
+    // Re-insert to keep the Map in least recently used order.
+    this._set(key, value);
+    logger.debug("get() - cache hit for " + key);
+    return value;
+  };
+
+  /**
+  * Store a block or transaction read from the ledger. Blocks are stored under their
+  * number and hash as well as the id they were queried by.
+  *
+  * @param {string} channelName Name of the channel
+  * @param {string} queryType One of "blockId", "blockHash" or "txnId"
+  * @param {string} id The block number, block hash or transaction ID queried
+  * @param {object} value The block or transaction returned by the peer
+  * @param {string} owner Username of the Fabric identity that read it, undefined for fabricUser
+  */
+  put(channelName, queryType, id, value, owner){
+    if(this.maxEntries <= 0 || value === undefined || value === null) return;
+    if(queryType == "txnId"){
+      this.etags.set(value, '"' + id + '-' + value.validationCode + '"');
+      this._set(this._key(owner, channelName, queryType, id), value);
+      return;
+    }
+    var hash;
+    try {
+      hash = blockHash(value);
+    } catch(err) {
+      logger.debug("put() - not caching block without a header: " + err);
+      return;
+    }
+    this.etags.set(value, '"' + hash + '"');
+    this._set(this._key(owner, channelName, queryType, id), value);
+    this._set(this._key(owner, channelName, "blockId", value.header.number.toString()), value);
+    this._set(this._key(owner, channelName, "blockHash", hash), value);
+  };
+
+  /**
+  * Get the ETag for a value returned by get() or stored with put().
+  *
+  * @param {object} value A block or transaction
+  * @returns {string} The ETag, or undefined if the value is not from the cache.
+  */
+  getETag(value){
+    if(value === null || typeof value !== 'object') return undefined;
+    return this.etags.get(value);
+  };
+
+  /**
+  * Remove every cached block and transaction, e.g. when the network is reconfigured.
+  */
+  clear(){
+    this.entries.clear();
+  };
+
+  /**
+  * @returns {object} The hit and miss counters and the cache size.
+  */
+  stats(){
+    return { hits: this.hits, misses: this.misses, size: this.entries.size, maxEntries: this.maxEntries };
+  };
+};
+
+exports.LedgerCache = LedgerCache;
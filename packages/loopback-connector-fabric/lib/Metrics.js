@@ -0,0 +1,251 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+
+// Upper bounds, in seconds, of the latency histogram buckets.
+var DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+
+/**
+* Seconds elapsed since a process.hrtime() start time.
+*/
+var elapsed = function(start){
+  var diff = process.hrtime(start);
+  return diff[0] + diff[1] / 1e9;
+};
+
+var escapeLabel = function(value){
+  return String(value).replace(/\\/g, '\\\\').replace(/\n/g, '\\n').replace(/"/g, '\\"');
+};
+
+/**
+* Format labels as {name="value",...}, or an empty string if there are none.
+*/
+var formatLabels = function(labels){
+  var names = Object.keys(labels);
+  if(names.length == 0) return '';
+  return '{' + names.map((name)=>name + '="' + escapeLabel(labels[name]) + '"').join(',') + '}';
+};
+
+/**
+* Counters and latency histograms for the connector, rendered in the Prometheus
+* text exposition format. Each metric family has a fixed name, type and help text;
+* series within a family are identified by their labels.
+*/
+class Metrics {
+
+  /**
+  * @param {number[]} buckets Optional histogram bucket upper bounds in seconds.
+  */
+  constructor(buckets){
+    this.buckets = buckets || DEFAULT_BUCKETS;
+    this.families = new Map();
+
+    this.define('fabric_rest_request_duration_seconds', 'histogram',
+      'Time taken to handle REST API requests, by method and HTTP status.');
+    this.define('fabric_rest_phase_duration_seconds', 'histogram',
+      'Time spent in each phase of handling a request, by method and phase.');
+    this.define('fabric_rest_peer_call_duration_seconds', 'histogram',
+      'Time taken by calls to peers, by peer URL and call.');
+    this.define('fabric_rest_peer_call_errors_total', 'counter',
+      'Calls to peers that failed, by peer URL and call.');
+    this.define('fabric_rest_orderer_call_duration_seconds', 'histogram',
+      'Time taken by calls to orderers, by orderer URL and call.');
+    this.define('fabric_rest_orderer_call_errors_total', 'counter',
+      'Calls to orderers that failed, by orderer URL and call.');
+  };
+
+  /**
+  * Define a metric family.
+  *
+  * @param {string} name Name of the metric
+  * @param {string} type One of "counter", "gauge" or "histogram"
+  * @param {string} help Description of the metric
+  * @param {function} collect Optional function returning the value of a counter or
+  *                           gauge when it is rendered, for values held elsewhere.
+  */
+  define(name, type, help, collect){
+    this.families.set(name, { name: name, type: type, help: help, collect: collect, series: new Map() });
+  };
+
+  _series(name, labels){
+    var family = this.families.get(name);
+    if(family === undefined) throw new Error("Unknown metric " + name);
+    var key = formatLabels(labels);
+    var series = family.series.get(key);
+    if(series === undefined){
+      series = { labels: labels, value: 0, sum: 0, count: 0 };
+      if(family.type === 'histogram') series.buckets = this.buckets.map(()=>0);
+      family.series.set(key, series);
+    }
+    return series;
+  };
+
+  /**
+  * Add to a counter.
+  *
+  * @param {string} name Name of the metric
+  * @param {object} labels Label names and values
+  * @param {number} amount Optional amount to add, default 1
+  */
+  inc(name, labels, amount){
+    this._series(name, labels).value += (amount === undefined ? 1 : amount);
+  };
+
+  /**
+  * Record a value, usually a latency in seconds, in a histogram.
+  *
+  * @param {string} name Name of the metric
+  * @param {object} labels Label names and values
+  * @param {number} value The value to record
+  */
+  observe(name, labels, value){
+    var series = this._series(name, labels);
+    series.sum += value;
+    series.count++;
+    for(var i = 0; i < this.buckets.length; i++){
+      if(value <= this.buckets[i]) series.buckets[i]++;
+    }
+  };
+
+  /**
+  * Start timing.
+  *
+  * @param {string} name Name of the histogram
+  * @param {object} labels Label names and values
+  * @returns {function} Call to record the time elapsed since the timer started,
+  *                     optionally with labels only known at the end. Only the
+  *                     first call is recorded.
+  */
+  startTimer(name, labels){
+    var start = process.hrtime();
+    return (endLabels)=>{
+      if(start === null) return;
+      this.observe(name, Object.assign({}, labels, endLabels), elapsed(start));
+      start = null;
+    };
+  };
+
+  /**
+  * Record how long a phase of a request takes to settle.
+  *
+  * @param {string} method Name of the connector method handling the request
+  * @param {string} phase Name of the phase, e.g. "client", "endorse", "broadcast"
+  * @param {Promise} promise The work done in the phase
+  * @returns {Promise} Settling the same way as promise
+  */
+  timePhase(method, phase, promise){
+    var end = this.startTimer('fabric_rest_phase_duration_seconds', { method: method, phase: phase });
+    return promise.then( (result)=>{
+      end();
+      return result;
+    }, (err)=>{
+      end();
+      return Promise.reject(err);
+    });
+  };
+
+  /**
+  * Wrap the methods of a {Peer} or {Orderer} to record their latency and errors.
+  *
+  * @param {Peer|Orderer} remote The remote to instrument
+  * @param {string} kind "peer" or "orderer"
+  * @param {string[]} calls Names of the methods, each returning a Promise
+  */
+  instrument(remote, kind, calls){
+    var url = remote.getUrl();
+    calls.forEach((call)=>{
+      var original = remote[call];
+      if(typeof original !== 'function') return;
+      var labels = { call: call };
+      labels[kind] = url;
+      remote[call] = (...args)=>{
+        var end = this.startTimer('fabric_rest_' + kind + '_call_duration_seconds', labels);
+        return original.apply(remote, args).then( (result)=>{
+          end();
+          return result;
+        }, (err)=>{
+          end();
+          this.inc('fabric_rest_' + kind + '_call_errors_total', labels);
+          return Promise.reject(err);
+        });
+      };
+    });
+  };
+
+  /**
+  * @returns {object[]} The metric families and the values of their series, as plain
+  *                     objects that can be sent to another process and passed to render().
+  */
+  snapshot(){
+    var families = [];
+    this.families.forEach((family)=>{
+      var series = [];
+      if(family.collect !== undefined){
+        series.push({ labels: {}, value: family.collect() });
+      } else {
+        family.series.forEach((s)=>series.push(s));
+      }
+      families.push({ name: family.name, type: family.type, help: family.help, series: series });
+    });
+    return JSON.parse(JSON.stringify(families));
+  };
+
+  /**
+  * Render metrics in the Prometheus text exposition format.
+  *
+  * @param {object[][]} snapshots Optional results of snapshot(), e.g. from each worker
+  *                               process, to add together and render instead of this
+  *                               object's metrics.
+  * @returns {string} The metrics in the Prometheus text exposition format.
+  */
+  render(snapshots){
+    var families = new Map();
+    (snapshots || [this.snapshot()]).forEach((snapshot)=>{
+      snapshot.forEach((family)=>{
+        var merged = families.get(family.name);
+        if(merged === undefined){
+          merged = { name: family.name, type: family.type, help: family.help, series: new Map() };
+          families.set(family.name, merged);
+        }
+        family.series.forEach((series)=>{
+          var key = formatLabels(series.labels);
+          var total = merged.series.get(key);
+          if(total === undefined){
+            total = { labels: series.labels, value: 0, sum: 0, count: 0, buckets: this.buckets.map(()=>0) };
+            merged.series.set(key, total);
+          }
+          total.value += series.value;
+          total.sum += series.sum;
+          total.count += series.count;
+          if(series.buckets !== undefined) series.buckets.forEach((n, i)=>{ total.buckets[i] += n; });
+        });
+      });
+    });
+
+    var lines = [];
+    families.forEach((family)=>{
+      lines.push('# HELP ' + family.name + ' ' + family.help);
+      lines.push('# TYPE ' + family.name + ' ' + family.type);
+      family.series.forEach((series)=>{
+        if(family.type !== 'histogram'){
+          lines.push(family.name + formatLabels(series.labels) + ' ' + series.value);
+          return;
+        }
+        this.buckets.forEach((bound, i)=>{
+          var labels = Object.assign({}, series.labels, { le: String(bound) });
+          lines.push(family.name + '_bucket' + formatLabels(labels) + ' ' + series.buckets[i]);
+        });
+        var labels = Object.assign({}, series.labels, { le: '+Inf' });
+        lines.push(family.name + '_bucket' + formatLabels(labels) + ' ' + series.count);
+        lines.push(family.name + '_sum' + formatLabels(series.labels) + ' ' + series.sum);
+        lines.push(family.name + '_count' + formatLabels(series.labels) + ' ' + series.count);
+      });
+    });
+    return lines.join('\n') + '\n';
+  };
+};
+
+module.exports = Metrics;
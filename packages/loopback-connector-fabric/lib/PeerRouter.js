@@ -0,0 +1,265 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+var Common = require('./Common.js');
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/PeerRouter.js');
+
+// Weight of the newest sample in the moving averages.
+var ALPHA = 0.2;
+// Number of recent latencies kept per peer for the hedge delay percentile.
+var SAMPLES = 100;
+// Hedge delay, in seconds, before a peer has any latency samples.
+var DEFAULT_HEDGE_DELAY = 0.05;
+// Longest penalty, as a multiple of the penalty time, for repeated failures.
+var MAX_PENALTY_FACTOR = 8;
+
+/**
+* Seconds elapsed since a process.hrtime() start time.
+*/
+var elapsed = function(start){
+  var diff = process.hrtime(start);
+  return diff[0] + diff[1] / 1e9;
+};
+
+/**
+* A query result that shows the peer could not answer, rather than an answer. The
+* SDK's queryByChaincode resolves with an Error in place of a peer's response.
+*/
+var failedResult = function(result){
+  if(result instanceof Array && result[0] instanceof Error && Common.isConnectionError(result[0])){
+    return result[0];
+  }
+  return undefined;
+};
+
+/**
+* A query result where the peer answered with an error, such as chaincode failing,
+* rather than failing to answer.
+*/
+var errorResult = function(result){
+  return result instanceof Array && result[0] instanceof Error && !Common.isConnectionError(result[0]);
+};
+
+/**
+* Chooses the peer to send each read-only query to. It keeps a moving average of
+* the latency and error rate of every peer, and sends a query to the peer expected
+* to answer fastest. Peers that fail to answer, or are beaten by a hedged request,
+* are penalized for a time and only used when no other peer is available.
+*
+* With hedging on, if the chosen peer has not answered within the hedgePercentile
+* of its recent latencies the query is also sent to the next best peer, and the
+* first answer is used.
+*
+* An error answer, e.g. not found, may come from a peer that has not caught up with
+* the others, so it is only used once a second peer has given one too, or no other
+* peer is left to ask. An answer without an error from any peer is used instead.
+*/
+class PeerRouter {
+
+  /**
+  * @param {object} options Optional hedge (boolean, default false), hedgePercentile
+  *                         (default 95) and penaltyTime (milliseconds, default 30000)
+  * @param {Metrics} metrics Optional metrics to count hedged queries and penalties in
+  */
+  constructor(options, metrics){
+    options = options || {};
+    this.hedge = options.hedge === true;
+    this.hedgePercentile = options.hedgePercentile || 95;
+    this.penaltyTime = (options.penaltyTime !== undefined ? options.penaltyTime : 30000);
+    this.metrics = metrics;
+    this.stats = new Map();
+    if(metrics !== undefined){
+      metrics.define('fabric_rest_hedged_queries_total', 'counter',
+        'Queries also sent to a second peer because the first was slow.');
+      metrics.define('fabric_rest_peer_penalties_total', 'counter',
+        'Times a peer was penalized for failing or being slow, by peer URL and reason.');
+    }
+  };
+
+  _stats(url){
+    var stats = this.stats.get(url);
+    if(stats === undefined){
+      stats = { latency: null, errorRate: 0, samples: [], failures: 0, penaltyUntil: 0 };
+      this.stats.set(url, stats);
+    }
+    return stats;
+  };
+
+  _penalize(url, reason, factor){
+    var stats = this._stats(url);
+    stats.penaltyUntil = Date.now() + this.penaltyTime * factor;
+    logger.info("Penalizing peer " + url + " for " + (this.penaltyTime * factor) + "ms, " + reason);
+    if(this.metrics !== undefined) this.metrics.inc('fabric_rest_peer_penalties_total', { peer: url, reason: reason });
+  };
+
+  /**
+  * Record the outcome of a query sent to a peer.
+  *
+  * @param {string} url URL of the peer
+  * @param {number} seconds Time the peer took to answer or fail
+  * @param {boolean} failed true if the peer could not answer
+  */
+  record(url, seconds, failed){
+    var stats = this._stats(url);
+    stats.errorRate = ALPHA * (failed ? 1 : 0) + (1 - ALPHA) * stats.errorRate;
+    if(failed){
+      stats.failures++;
+      this._penalize(url, "failed", Math.min(Math.pow(2, stats.failures - 1), MAX_PENALTY_FACTOR));
+      return;
+    }
+    stats.failures = 0;
+    stats.latency = (stats.latency === null ? seconds : ALPHA * seconds + (1 - ALPHA) * stats.latency);
+    stats.samples.push(seconds);
+    if(stats.samples.length > SAMPLES) stats.samples.shift();
+  };
+
+  /**
+  * @returns {boolean} true if the peer is being avoided after failing or being slow.
+  */
+  isPenalized(url){
+    return this._stats(url).penaltyUntil > Date.now();
+  };
+
+  /**
+  * Order peers best first: those not penalized before those that are, then by
+  * expected latency allowing for errors. Peers without samples come first so
+  * they are tried.
+  *
+  * @param {Peer[]} peers The peers that can answer the query
+  * @returns {Peer[]} The same peers, best first
+  */
+  rank(peers){
+    var score = (peer)=>{
+      var stats = this._stats(peer.getUrl());
+      var latency = (stats.latency === null ? 0 : stats.latency);
+      return { penalized: this.isPenalized(peer.getUrl()), cost: latency * (1 + 10 * stats.errorRate) };
+    };
+    return peers.map((peer)=>({ peer: peer, score: score(peer) })).sort((a, b)=>{
+      if(a.score.penalized !== b.score.penalized) return a.score.penalized ? 1 : -1;
+      return a.score.cost - b.score.cost;
+    }).map((ranked)=>ranked.peer);
+  };
+
+  /**
+  * @returns {number} Milliseconds to wait for a peer before hedging.
+  */
+  hedgeDelay(url){
+    var samples = this._stats(url).samples;
+    if(samples.length == 0) return DEFAULT_HEDGE_DELAY * 1000;
+    var sorted = samples.slice().sort((a, b)=>a - b);
+    var index = Math.min(sorted.length - 1, Math.ceil(sorted.length * this.hedgePercentile / 100) - 1);
+    return sorted[Math.max(index, 0)] * 1000;
+  };
+
+  /**
+  * Send a query to the best peer. If the peer can't be reached the next best peer is
+  * tried, and with hedging on a slow peer is raced against the next best one unless
+  * that peer is penalized.
+  *
+  * @param {Peer[]} peers The peers that can answer the query
+  * @param {function} send Called with a {Peer} to send it the query, returning a Promise
+  * @returns {Promise} Settling with the first answer from a peer, or the first error
+  *                    answer if a second peer also answers with an error or none
+  *                    other can answer, or rejecting with the error of the best peer
+  *                    if none could answer.
+  */
+  query(peers, send){
+    var ranked = this.rank(peers);
+    if(ranked.length == 0) return send(undefined);
+
+    return new Promise((resolve, reject)=>{
+      var next = 0;
+      var running = 0;
+      var settled = false;
+      var hedgeTimer = null;
+      var firstError;
+      // Settles with the first error answer, and the number of peers that gave one.
+      var errorAnswer;
+      var errorAnswers = 0;
+
+      // hedging is the URL of the slow peer when the query is sent as a hedge.
+      var start = (hedging)=>{
+        var peer = ranked[next++];
+        var url = peer.getUrl();
+        var began = process.hrtime();
+        running++;
+        // failure is set if the peer could not answer, isError if it answered with an error.
+        var finish = (failure, isError, settle)=>{
+          running--;
+          this.record(url, elapsed(began), failure !== undefined);
+          if(settled) return;
+          if(failure === undefined && !isError){
+            settled = true;
+            clearTimeout(hedgeTimer);
+            // The peer a hedge beat is slow, prefer others for a while.
+            if(hedging !== undefined && running > 0) this._penalize(hedging, "slow", 1);
+            settle();
+            return;
+          }
+          if(isError){
+            errorAnswers++;
+            if(errorAnswer === undefined) errorAnswer = settle;
+            // Wait for a query still running, it may have the answer.
+            if(errorAnswers < 2 && running > 0){
+              clearTimeout(hedgeTimer);
+              return;
+            }
+          } else if(firstError === undefined){
+            firstError = failure;
+          }
+          if(errorAnswers < 2 && next < ranked.length){
+            logger.debug("query() - peer " + url + (isError ? " answered with an error" : " failed") + ", trying the next peer");
+            clearTimeout(hedgeTimer);
+            start();
+          } else if(errorAnswers >= 2 || running == 0){
+            settled = true;
+            clearTimeout(hedgeTimer);
+            if(errorAnswer !== undefined){
+              errorAnswer();
+            } else {
+              reject(firstError);
+            }
+          }
+        };
+        Promise.resolve().then(()=>send(peer)).then( (result)=>{
+          var failure = failedResult(result);
+          finish(failure, failure === undefined && errorResult(result), ()=>resolve(result));
+        }, (err)=>{
+          // Errors other than connection failures, e.g. not found, are the peer's answer.
+          var failure = (Common.isConnectionError(err) ? err : undefined);
+          finish(failure, failure === undefined, ()=>reject(err));
+        });
+        if(this.hedge && next < ranked.length && !this.isPenalized(ranked[next].getUrl())){
+          hedgeTimer = setTimeout(()=>{
+            if(!settled && next < ranked.length){
+              logger.debug("query() - peer " + url + " is slow, hedging");
+              if(this.metrics !== undefined) this.metrics.inc('fabric_rest_hedged_queries_total', {});
+              start(url);
+            }
+          }, this.hedgeDelay(url));
+        }
+      };
+      start();
+    });
+  };
+
+  /**
+  * @returns {object} The moving average latency in seconds, error rate and penalty
+  *                   end time of each peer by URL.
+  */
+  peerStats(){
+    var result = {};
+    this.stats.forEach((stats, url)=>{
+      result[url] = { latency: stats.latency, errorRate: stats.errorRate, penaltyUntil: stats.penaltyUntil };
+    });
+    return result;
+  };
+};
+
+module.exports = PeerRouter;
@@ -0,0 +1,135 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+const crypto = require('crypto');
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/ProposalStore.js');
+
+/**
+* Endorsed proposals waiting to be committed. The proposal and its responses are
+* SDK objects that can't be rebuilt from JSON sent by a REST client, so they are
+* kept here and the client is given a handle to commit them with later.
+*
+* The store is bounded in size, dropping the oldest proposals first, and proposals
+* not committed within ttl milliseconds are dropped.
+*/
+class ProposalStore {
+
+  /**
+  * @param {integer} maxEntries Maximum number of proposals to hold, 0 disables the store.
+  * @param {integer} ttl Milliseconds a proposal is kept for.
+  */
+  constructor(maxEntries, ttl){
+    this.maxEntries = maxEntries;
+    this.ttl = ttl;
+    this.entries = new Map();
+    this.disabledReason = undefined;
+  };
+
+  /**
+  * Stop keeping proposals, so endorsements are not given a handle and any handle
+  * committed fails with the reason.
+  *
+  * @param {string} reason Why handles can't be used, for the error returned by take()
+  */
+  disable(reason){
+    this.maxEntries = 0;
+    this.disabledReason = reason;
+    this.entries.clear();
+  };
+
+  /**
+  * Drop the proposals that have expired. Entries are in the order they were added,
+  * so this stops at the first one that has not.
+  */
+  _expire(){
+    var now = Date.now();
+    for(var entry of this.entries.values()){
+      if(entry.expires > now) break;
+      this.entries.delete(entry.handle);
+    }
+  };
+
+  /**
+  * Keep an endorsed proposal.
+  *
+  * @param {string} channelName Name of the channel the proposal was sent on
+  * @param {TransactionID} txId The transaction ID of the proposal
+  * @param {TransactionRequest} tranReq The proposal and its responses, to pass to sendTransaction
+  * @param {string} owner Username of the Fabric identity that signed the proposal,
+  *                       undefined for fabricUser
+  * @returns {object} The handle, and expires as a Date, or undefined if the store is disabled
+  */
+  add(channelName, txId, tranReq, owner){
+    if(this.maxEntries <= 0) return undefined;
+    this._expire();
+    var entry = {
+      handle: crypto.randomBytes(16).toString('hex'),
+      channelName: channelName,
+      txId: txId,
+      tranReq: tranReq,
+      owner: owner,
+      expires: Date.now() + this.ttl
+    };
+    this.entries.set(entry.handle, entry);
+    while(this.entries.size > this.maxEntries){
+      logger.info("add() - dropping an uncommitted proposal, the store is full");
+      this.entries.delete(this.entries.keys().next().value);
+    }
+    return { handle: entry.handle, expires: new Date(entry.expires) };
+  };
+
+  /**
+  * Remove and return an endorsed proposal, so it is committed at most once.
+  *
+  * @param {string} channelName Name of the channel the proposal is to be committed on
+  * @param {string} handle The handle returned by add()
+  * @param {string} owner Username of the Fabric identity to commit as, undefined for fabricUser
+  * @returns {object} The txId and tranReq of the proposal
+  * @throws {Error} With a statusCode of 404 if there is no such proposal or it has
+  *                 expired, 400 if it was sent on another channel, 403 if it was
+  *                 signed by another identity, as the orderer would reject it, or 501
+  *                 if the store has been disabled.
+  */
+  take(channelName, handle, owner){
+    var err;
+    if(this.disabledReason !== undefined){
+      err = new Error("Endorsed proposal handles are not supported " + this.disabledReason);
+      err.statusCode = 501;
+      throw err;
+    }
+    this._expire();
+    var entry = this.entries.get(handle);
+    if(entry === undefined){
+      err = new Error("No endorsed proposal found for handle " + handle + ", it may have expired or been committed");
+      err.statusCode = 404;
+      throw err;
+    }
+    if(entry.channelName !== channelName){
+      err = new Error("Proposal " + handle + " was endorsed on channel " + entry.channelName);
+      err.statusCode = 400;
+      throw err;
+    }
+    if(entry.owner !== owner){
+      err = new Error("Proposal " + handle + " was endorsed by another identity");
+      err.statusCode = 403;
+      throw err;
+    }
+    this.entries.delete(handle);
+    return { txId: entry.txId, tranReq: entry.tranReq };
+  };
+
+  /**
+  * @returns {object} The number of proposals held and the store's limits.
+  */
+  stats(){
+    return { size: this.entries.size, maxEntries: this.maxEntries, ttl: this.ttl };
+  };
+};
+
+module.exports = ProposalStore;
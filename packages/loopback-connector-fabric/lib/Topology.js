@@ -0,0 +1,266 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+'use strict';
+const fs = require('fs');
+
+//This module requires fabric-client so safe to use the same logger as set for sdk.
+const sdkutils = require('fabric-client/lib/utils');
+var logger = sdkutils.getLogger('loopback-connector-fabric/lib/Topology.js');
+
+// Topologies and keys by settings object, so each is built once per configuration.
+var topologies = new WeakMap();
+var keys = new WeakMap();
+
+// The settings describing the network and the identities used to connect to it.
+var CONNECTION_SETTINGS = ['orgs', 'peers', 'orderers', 'channels', 'keyStoreFile', 'fabricUser', 'fabricUsers'];
+
+/**
+* Add the grpc:// scheme to a URL given without one.
+*/
+var normalizeUrl = function(url){
+  if(!url.startsWith("grpc://") && !url.startsWith("grpcs://")){
+    logger.debug("Adding grpc:// prefix to " + url);
+    return "grpc://" + url;
+  }
+  return url;
+};
+
+/**
+* Parse an index into a configured array, which may be given as a string.
+*
+* @returns {integer} The index, or undefined if it is not a valid index.
+*/
+var parseIndex = function(value, length){
+  var index = (typeof value === 'string' && value.trim() !== '' ? Number(value) : value);
+  if(!Number.isInteger(index) || index < 0 || index >= length) return undefined;
+  return index;
+};
+
+/**
+* The network configured in the connector settings, resolved once: URLs normalized,
+* TLS CA PEM files read, and the indexes of each channel's peers and orderers
+* checked. Building a {Peer}, {Orderer} or {EventHub} from a Topology needs no disk
+* I/O, and a configuration error is found when the settings are first used, at
+* startup, rather than by a request.
+*
+* A Topology and everything in it is frozen; new settings get a new Topology.
+*/
+class Topology {
+
+  /**
+  * @param {Object} settings The settings passed to the loopback connector
+  * @throws {Error} Listing every problem found if the settings are not valid.
+  */
+  constructor(settings){
+    var problems = [];
+    var pemFiles = new Map();
+    var readPem = function(file, what){
+      if(!pemFiles.has(file)){
+        try {
+          pemFiles.set(file, fs.readFileSync(file, 'utf-8'));
+        } catch(err) {
+          problems.push("cannot read the TLS CA certificate of " + what + ", " + err.message);
+          pemFiles.set(file, undefined);
+        }
+      }
+      return pemFiles.get(file);
+    };
+    var orgs = (settings.orgs instanceof Array ? settings.orgs : []);
+
+    var peers = (settings.peers instanceof Array ? settings.peers : []);
+    if(peers.length == 0) problems.push("no peers are configured");
+    this.peers = peers.map((aPeer, index)=>{
+      var what = "peers[" + index + "]";
+      if(typeof aPeer.requestURL !== 'string' || aPeer.requestURL === ''){
+        problems.push(what + " has no requestURL");
+        return undefined;
+      }
+      var opts = {};
+      var pemFile = aPeer.tls_cacerts;
+      if(!pemFile && aPeer.orgIndex !== undefined){
+        var orgIndex = parseIndex(aPeer.orgIndex, orgs.length);
+        if(orgIndex === undefined){
+          problems.push(what + " references org with index " + aPeer.orgIndex);
+        } else {
+          pemFile = orgs[orgIndex].CACertFile;
+        }
+      }
+      if(pemFile){
+        opts.pem = readPem(pemFile, what);
+      } else {
+        problems.push(what + " has no tls_cacerts or orgIndex of an org with a CACertFile");
+      }
+      if(aPeer.hostname !== undefined && aPeer.hostname !== null){
+        //Set ssl-target-name-override to let tls work in test environment
+        opts['ssl-target-name-override'] = aPeer.hostname;
+      }
+      return Object.freeze({
+        index: index,
+        url: normalizeUrl(aPeer.requestURL),
+        eventUrl: (aPeer.eventURL ? normalizeUrl(aPeer.eventURL) : undefined),
+        opts: Object.freeze(opts)
+      });
+    });
+
+    var orderers = (settings.orderers instanceof Array ? settings.orderers : []);
+    if(orderers.length == 0) problems.push("no orderers are configured");
+    this.orderers = orderers.map((anOrderer, index)=>{
+      var what = "orderers[" + index + "]";
+      if(typeof anOrderer.url !== 'string' || anOrderer.url === ''){
+        problems.push(what + " has no url");
+        return undefined;
+      }
+      var opts = {};
+      var pemFile = anOrderer.tls_cacerts || anOrderer.CACertFile;
+      if(pemFile){
+        opts.pem = readPem(pemFile, what);
+      } else {
+        problems.push(what + " has no tls_cacerts or CACertFile");
+      }
+      if(anOrderer.hostname !== undefined && anOrderer.hostname !== null){
+        //Set ssl-target-name-override to let tls work in test environment
+        opts['ssl-target-name-override'] = anOrderer.hostname;
+      }
+      return Object.freeze({
+        index: index,
+        url: normalizeUrl(anOrderer.url),
+        opts: Object.freeze(opts)
+      });
+    });
+
+    var channels = (settings.channels instanceof Array ? settings.channels : []);
+    if(channels.length == 0) problems.push("no channels are configured");
+    this.channelsByName = new Map();
+    this.channels = channels.map((channelConfig, cIndex)=>{
+      var what = "channels[" + cIndex + "]";
+      if(typeof channelConfig.name !== 'string' || channelConfig.name === ''){
+        problems.push(what + " has no name");
+        return undefined;
+      }
+      what = "Channel " + channelConfig.name;
+      if(this.channelsByName.has(channelConfig.name)) problems.push(what + " is configured more than once");
+      var resolve = function(indexes, remotes, kind){
+        if(!(indexes instanceof Array)){
+          problems.push(what + " has no " + kind + "sIndex array");
+          return [];
+        }
+        return indexes.map((value)=>{
+          var index = parseIndex(value, remotes.length);
+          if(index === undefined) problems.push(what + " references " + kind + " with index " + value);
+          return index;
+        }).filter((index)=>index !== undefined);
+      };
+      var channel = Object.freeze({
+        name: channelConfig.name,
+        peersIndex: Object.freeze(resolve(channelConfig.peersIndex, peers, "peer")),
+        orderersIndex: Object.freeze(resolve(channelConfig.orderersIndex, orderers, "orderer"))
+      });
+      this.channelsByName.set(channel.name, channel);
+      return channel;
+    });
+
+    if(problems.length > 0){
+      throw new Error("Invalid datasources.json settings: " + problems.join("; "));
+    }
+    Object.freeze(this.peers);
+    Object.freeze(this.orderers);
+    Object.freeze(this.channels);
+    Object.freeze(this);
+  };
+
+  /**
+  * Get the Topology for settings, building it the first time.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @returns {Topology} The Topology
+  * @throws {Error} If the settings are not valid.
+  */
+  static of(settings){
+    var topology = topologies.get(settings);
+    if(topology === undefined){
+      topology = new Topology(settings);
+      topologies.set(settings, topology);
+    }
+    return topology;
+  };
+
+  /**
+  * Get a string identifying a configuration, to key pooled connections by. Only the
+  * CONNECTION_SETTINGS are included, so settings that differ in other fields, such as
+  * the datasource name, have the same key. Settings objects are not changed once in
+  * use, so the key is worked out once for each.
+  *
+  * @param {Object} settings The settings passed to the loopback connector
+  * @returns {string} The key
+  */
+  static key(settings){
+    var key = keys.get(settings);
+    if(key === undefined){
+      key = JSON.stringify(CONNECTION_SETTINGS.map((name)=>settings[name]));
+      keys.set(settings, key);
+    }
+    return key;
+  };
+
+  /**
+  * Replace the connection settings, keeping the others.
+  *
+  * @param {Object} settings The settings in use
+  * @param {Object} connection Settings with the new CONNECTION_SETTINGS, e.g. read
+  *                           from datasources.json
+  * @returns {Object} New settings, the CONNECTION_SETTINGS from connection and the
+  *                   rest from settings.
+  */
+  static withConnection(settings, connection){
+    var result = Object.assign({}, settings);
+    CONNECTION_SETTINGS.forEach((name)=>{
+      if(connection[name] === undefined){
+        delete result[name];
+      } else {
+        result[name] = connection[name];
+      }
+    });
+    return result;
+  };
+
+  /**
+  * @param {Topology} other Another Topology
+  * @returns {boolean} true if other has the same peer and orderer URLs and channels.
+  */
+  sameNetwork(other){
+    var describe = (topology)=>JSON.stringify([
+      topology.peers.map((aPeer)=>[aPeer.url, aPeer.eventUrl]),
+      topology.orderers.map((anOrderer)=>anOrderer.url),
+      topology.channels
+    ]);
+    return describe(this) === describe(other);
+  };
+
+  /**
+  * @returns {Object} The connection options for a configured peer, a new copy the
+  *                   SDK is free to change.
+  */
+  peerOpts(index){
+    return Object.assign({}, this.peers[index].opts);
+  };
+
+  /**
+  * @returns {Object} The connection options for a configured orderer, a new copy.
+  */
+  ordererOpts(index){
+    return Object.assign({}, this.orderers[index].opts);
+  };
+
+  /**
+  * @returns {Object} The name, peersIndex and orderersIndex of a configured channel,
+  *                   or undefined if it is not configured.
+  */
+  channel(name){
+    return this.channelsByName.get(name);
+  };
+};
+
+module.exports = Topology;
@@ -11,6 +11,15 @@ const Client = require('fabric-client/lib/Client');
 const Channel = require('fabric-client/lib/Channel');
 const Peer = require('fabric-client/lib/Peer');
 var Common = require('./Common.js');
+var ClientPool = require('./ClientPool.js');
+var IdentityCache = require('./IdentityCache.js');
+var ProposalStore = require('./ProposalStore.js');
+var PeerRouter = require('./PeerRouter.js');
+var Admission = require('./Admission.js').Admission;
+var LedgerCache = require('./LedgerCache.js').LedgerCache;
+var EventHubPool = require('./EventHubPool.js');
+var Metrics = require('./Metrics.js');
+var Topology = require('./Topology.js');
 
 //This module requires fabric-client so safe to use the same logger as set for sdk.
 const sdkutils = require('fabric-client/lib/utils');
@@ -18,6 +27,72 @@ const sdkutils = require('fabric-client/lib/utils');
 var logger = sdkutils.getLogger(__filename.slice(__dirname.length + 1));
 
 
+/**
+ * Install chaincode onto the named peers
+ * @param {integer[]} peers Peers array to install chaincode on
+ * @param {ChaincodeInstallRequest} chaincode The chaincode install data with chaincodePackage as a Buffer.
+ * @param {object} lbConnector The loopback connector object
+ *
+ * @returns {installResult} result Result object
+ */
+var installChaincode = function(peers, chaincode, lbConnector){
+  var clientPromise = lbConnector.clientPool.getClient(lbConnector.settings, lbConnector.identity);
+  var peerArrayPromise;
+  if(peers !== undefined){
+    peerArrayPromise = lbConnector.clientPool.getPeers(lbConnector.settings, peers);
+  }
+  else { //Get all known peers
+    peerArrayPromise = lbConnector.clientPool.getPeers(lbConnector.settings);
+  }
+
+  //Once we have both Client and Peers use the client to install chaincode on the Peers
+  return Promise.all([clientPromise,peerArrayPromise]).then(
+    (data)=>{
+      var theClient = data[0];
+      var peerArray = data[1];
+      var request = chaincode;
+      request.targets = peerArray;
+      request.txId = theClient.newTransactionID();
+
+      logger.debug("installChaincode() - About to call installChaincode, "+request.chaincodeId+", "+request.chaincodeVersion);
+
+      //Expects https://fabric-sdk-node.github.io/global.html#ChaincodeInstallRequest with a targets parameter too.
+      return theClient.installChaincode(request);
+  }).then((results) => {
+    var proposalResponses = results[0];
+    //Do some internal checking to help debug.
+    var failed = Common.countFailedProposalResponses(proposalResponses);
+    var resp = {};
+    resp.peerResponses = results[0];
+    //Always send results from Peers even if not all worked.
+    return Promise.resolve(resp);
+  }).catch((err)=>{
+    lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
+    logger.debug("installChaincode() - Error caught");
+    if(err instanceof Error && !err.statusCode) err.statusCode = 500;
+    return Promise.reject(err);
+  });
+}
+
+/**
+ * Send a read-only query to the best of the channel's peers, as chosen by the peer router.
+ * @param {Channel} theChannel The channel to query
+ * @param {function} send Called with the {Peer} to query, returning a Promise
+ * @param {object} lbConnector The loopback connector object
+ *
+ * @returns {Promise} Settling with the first answer from a peer
+ */
+var routeQuery = function(theChannel, send, lbConnector){
+  return lbConnector.peerRouter.query(theChannel.getPeers(), send);
+}
+
+/**
+ * Add a peer to send a query by chaincode to, without changing the request.
+ */
+var targetQuery = function(queryRequest, peer){
+  return (peer === undefined ? queryRequest : Object.assign({}, queryRequest, { targets: [peer] }));
+}
+
 //A class that extends Connector to allow functions to be called from a Model.
 class HFCSDKConnector extends Connector {
 
@@ -27,8 +102,46 @@ class HFCSDKConnector extends Connector {
     Connector.call(this, 'hfc-sdk', settings);
 
     this.settings = settings; // Store the settings for ease of access
+    // Fabric identity to sign as instead of fabricUser, set on the connectors returned by forUser()
+    this.identity = undefined;
+    // Request, phase, peer and orderer latencies
+    this.metrics = new Metrics();
+    // Clients, peers and orderers shared across requests
+    // User contexts of identities other than fabricUser, identityCacheSize of 0 disables the cache
+    var identities = new IdentityCache(settings.identityCacheSize !== undefined ? settings.identityCacheSize : 100,
+      settings.identityCacheTTL !== undefined ? settings.identityCacheTTL : 3600000);
+    // Limits on the requests and peer and orderer calls in progress, 0 for no limit
+    this.admission = new Admission({
+      read: settings.readConcurrency !== undefined ? settings.readConcurrency : 200,
+      write: settings.writeConcurrency !== undefined ? settings.writeConcurrency : 50,
+      peer: settings.peerConcurrency !== undefined ? settings.peerConcurrency : 100,
+      orderer: settings.ordererConcurrency !== undefined ? settings.ordererConcurrency : 50
+    }, settings.admissionQueueSize !== undefined ? settings.admissionQueueSize : 500);
+    this.clientPool = new ClientPool(null, this.metrics, identities, this.admission);
+    // Chooses the peer for each read-only query, optionally hedging slow queries
+    this.peerRouter = new PeerRouter({
+      hedge: settings.hedgeQueries,
+      hedgePercentile: settings.hedgePercentile,
+      penaltyTime: settings.peerPenaltyTime
+    }, this.metrics);
+    // Endorsed proposals waiting to be committed by handle
+    this.proposals = new ProposalStore(settings.proposalStoreSize !== undefined ? settings.proposalStoreSize : 1000,
+      settings.proposalStoreTTL !== undefined ? settings.proposalStoreTTL : 300000);
+    // Committed blocks and transactions, ledgerCacheSize of 0 disables the cache
+    this.ledgerCache = new LedgerCache(settings.ledgerCacheSize !== undefined ? settings.ledgerCacheSize : 1000);
+    this.metrics.define('fabric_rest_ledger_cache_hits_total', 'counter',
+      'Blocks and transactions served from the ledger cache.', ()=>this.ledgerCache.stats().hits);
+    this.metrics.define('fabric_rest_ledger_cache_misses_total', 'counter',
+      'Blocks and transactions not found in the ledger cache.', ()=>this.ledgerCache.stats().misses);
+    this.metrics.define('fabric_rest_ledger_cache_entries', 'gauge',
+      'Keys held in the ledger cache.', ()=>this.ledgerCache.stats().size);
+    // EventHub connections shared by requests waiting for transactions to commit
+    this.eventHubs = new EventHubPool(this.clientPool);
 
     Common.validateSettings(this.settings);
+    // Read the TLS certificates and check the peers, orderers and channels now, so a
+    // configuration error stops the server starting rather than failing requests.
+    Topology.of(this.settings);
 
     //logger.info("Info output test");
     //logger.debug("Debugging output test");
@@ -36,6 +149,86 @@ class HFCSDKConnector extends Connector {
   };
 
 
+  /**
+   * Close the pooled peer, orderer and EventHub connections. Called when the
+   * DataSource is disconnected, e.g. as the REST server shuts down.
+   * @param {function} callback Called once the connections are closed
+   */
+  disconnect(callback){
+    this.eventHubs.close();
+    this.clientPool.close();
+    if(callback) process.nextTick(callback);
+  }
+
+  /**
+   * Get the connector to handle a request from an authenticated REST user with. A
+   * user listed in the fabricUsers setting signs as their own Fabric identity,
+   * other users, and requests without a user, sign as fabricUser. The connector
+   * returned shares everything else with this one.
+   * @param {string} username The REST user the request is from, or undefined
+   *
+   * @returns {object} The loopback connector object to pass to the connector methods
+   */
+  forUser(username){
+    var fabricUsers = this.settings.fabricUsers;
+    if(username === undefined || username === null || !fabricUsers || !fabricUsers[username]){
+      return this;
+    }
+    return Object.create(this, { identity: { value: fabricUsers[username] } });
+  }
+
+  /**
+   * @returns {string} The username of the Fabric identity requests sign as, undefined
+   *                   for fabricUser.
+   */
+  identityName(){
+    return (this.identity !== undefined ? this.identity.username : undefined);
+  }
+
+  /**
+   * Replace the peers, orderers, channels and users of the connector, e.g. after
+   * datasources.json is edited. Requests already in progress finish with the old
+   * settings; their pooled connections are closed once the grace period is over,
+   * unless the settings in use by then are the same. The ledger cache is emptied if
+   * the peers, orderers or channels change. Only the connection settings, see
+   * Topology.withConnection, are replaced; the rest, such as the concurrency limits,
+   * cache sizes and the datasource's own fields, only change on a restart.
+   * @param {object} settings The new connector settings, e.g. the fabricDataSource
+   *                          read from datasources.json
+   * @param {integer} gracePeriod Milliseconds to keep the old connections open for
+   *
+   * @returns {boolean} true if the settings were replaced, false if they are not valid
+   */
+  reload(settings, gracePeriod){
+    var oldSettings = this.settings;
+    var topology;
+    settings = Topology.withConnection(oldSettings, settings);
+    try {
+      topology = Topology.of(settings);
+    } catch(err) {
+      logger.error("reload() - Keeping the current settings, " + err.message);
+      return false;
+    }
+    var oldKey = Topology.key(oldSettings);
+    if(Topology.key(settings) === oldKey){
+      logger.info("reload() - Connector settings unchanged");
+      return true;
+    }
+    this.settings = settings;
+    Common.validateSettings(this.settings);
+    if(!topology.sameNetwork(Topology.of(oldSettings))){
+      this.ledgerCache.clear();
+    }
+    logger.info("reload() - Connector settings replaced");
+    setTimeout(()=>{
+      // The old settings may have been reloaded again since, keep their connections if so.
+      if(Topology.key(this.settings) === oldKey) return;
+      this.eventHubs.close(oldSettings);
+      this.clientPool.evict(oldSettings);
+    }, gracePeriod !== undefined ? gracePeriod : 60000).unref();
+    return true;
+  }
+
   /**
    * Install chaincode onto the named peers
    * @param {integer[]} peers Peers array to install chaincode on
@@ -60,43 +253,34 @@ class HFCSDKConnector extends Connector {
       return Promise.reject(err);
     }
 
-    var clientPromise = Common.getClient(lbConnector.settings);
-    var peerArrayPromise;
-    if(peers !== undefined){
-      peerArrayPromise = Common.getPeers(lbConnector.settings, peers);
-    }
-    else { //Get all known peers
-      peerArrayPromise = Common.getPeers(lbConnector.settings);
-    }
+    // Convert base64 archive input to a Buffer,
+    chaincode.chaincodePackage = Buffer.from(chaincode.chaincodePackage, 'base64');
+    return installChaincode(peers, chaincode, lbConnector);
+  }
 
-    //Once we have both Client and Peers use the client to install chaincode on the Peers
-    return Promise.all([clientPromise,peerArrayPromise]).then(
-      (data)=>{
-        var theClient = data[0];
-        var peerArray = data[1];
-        // Convert base64 archive input to a Buffer,
-        var packageBuffer = Buffer.from(chaincode.chaincodePackage, 'base64');
-        var request = chaincode;
-        request.targets = peerArray;
-        request.txId = theClient.newTransactionID();
-        request.chaincodePackage = packageBuffer;
-
-        logger.debug("postChaincodes() - About to call installChaincode, "+request.chaincodeId+", "+request.chaincodeVersion);
-
-        //Expects https://fabric-sdk-node.github.io/global.html#ChaincodeInstallRequest with a targets parameter too.
-        return theClient.installChaincode(request);
-    }).then((results) => {
-  		var proposalResponses = results[0];
-      //Do some internal checking to help debug.
-      var failed = Common.countFailedProposalResponses(proposalResponses);
-      var resp = {};
-      resp.peerResponses = results[0];
-      //Always send results from Peers even if not all worked.
-      return Promise.resolve(resp);
-    }).catch((err)=>{
-      logger.debug("postChaincodes() - Error caught");
-      if(err instanceof Error && !err.statusCode) err.statusCode = 500;
-      return Promise.reject(err);
+  /**
+   * Install chaincode onto the named peers, reading the chaincode package archive
+   * as binary data from a stream rather than as base64 in the request body.
+   * @param {integer[]} peers Peers array to install chaincode on
+   * @param {ChaincodeInstallRequest} chaincode The chaincode install data, without chaincodePackage.
+   * @param {stream.Readable} packageStream The chaincode package archive, e.g. the HTTP request
+   * @param {integer} packageLength Optional length of the archive in bytes
+   * @param {object} lbConnector The loopback connector object
+   *
+   * @returns {installResult} result Result object
+   */
+  postChaincodesPackage(peers, chaincode, packageStream, packageLength, lbConnector){
+    Common.logEntry(logger,this.postChaincodesPackage);
+    var maxPackageSize = (lbConnector.settings.maxPackageSize !== undefined ? lbConnector.settings.maxPackageSize : 104857600);
+    return Common.readStream(packageStream, packageLength, maxPackageSize).then( (packageBuffer)=>{
+      if(packageBuffer.length == 0){
+        logger.debug("postChaincodesPackage() - chaincode package empty");
+        var err = new Error("Bad request - chaincode package is empty");
+        err.statusCode = 400; //Bad request
+        return Promise.reject(err);
+      }
+      chaincode.chaincodePackage = packageBuffer;
+      return installChaincode(peers, chaincode, lbConnector);
     });
   }
 
@@ -110,13 +294,13 @@ class HFCSDKConnector extends Connector {
   getChaincodesId(id, peers, lbConnector){
     Common.logEntry(logger,this.getChaincodesId);
     //1. Get client and known peers
-    var clientPromise = Common.getClient(lbConnector.settings);
+    var clientPromise = lbConnector.clientPool.getClient(lbConnector.settings, lbConnector.identity);
     var peerArrayPromise;
     if(peers !== undefined){
-      peerArrayPromise = Common.getPeers(lbConnector.settings, peers);
+      peerArrayPromise = lbConnector.clientPool.getPeers(lbConnector.settings, peers);
     }
     else { //Get all known peers
-      peerArrayPromise = Common.getPeers(lbConnector.settings);
+      peerArrayPromise = lbConnector.clientPool.getPeers(lbConnector.settings);
     }
 
     //2. Once we have both Client and Peers use the client to query chaincode on the Peers
@@ -148,6 +332,7 @@ class HFCSDKConnector extends Connector {
       });
       return Promise.resolve(response);
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       logger.debug("getChaincodesId() - Error caught");
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
@@ -175,9 +360,9 @@ class HFCSDKConnector extends Connector {
     }
 
     //1. Get client
-    var clientPromise = Common.getClient(lbConnector.settings);
+    var clientPromise = lbConnector.clientPool.getClient(lbConnector.settings, lbConnector.identity);
     //2. Get Orderer
-    var ordererPromise = Common.getOrderer(lbConnector.settings);
+    var ordererPromise = lbConnector.clientPool.getOrderer(lbConnector.settings);
 
     //3. Convert base64 input to Buffer
     var envelope = Buffer.from(channelRequest.envelope, 'base64');
@@ -217,6 +402,7 @@ class HFCSDKConnector extends Connector {
       response.status = newChannelResponse.status;
       return Promise.resolve(response);
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       logger.debug("postChannelsChannelName() - Error caught");
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
@@ -244,9 +430,9 @@ class HFCSDKConnector extends Connector {
     }
 
     //1. Get client
-    var clientPromise = Common.getClient(lbConnector.settings);
+    var clientPromise = lbConnector.clientPool.getClient(lbConnector.settings, lbConnector.identity);
     //2. Get Orderer
-    var ordererPromise = Common.getOrderer(lbConnector.settings);
+    var ordererPromise = lbConnector.clientPool.getOrderer(lbConnector.settings);
 
     //3. Convert base64 input to Buffer
     updateChannelReq.config = Buffer.from(channelRequest.config, 'base64');
@@ -279,10 +465,13 @@ class HFCSDKConnector extends Connector {
       updateChannelReq.name = channelName;
       return theClient.updateChannel(updateChannelReq);
     }).then((updateChannelResponse)=>{
-      //8. Return new channel response status with transaciton ID
+      //8. Channel configuration has changed so initialize it again on next use.
+      lbConnector.clientPool.resetChannel(lbConnector.settings, channelName);
+      //9. Return new channel response status with transaciton ID
       response.status = updateChannelResponse.status;
       return Promise.resolve(response);
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       logger.debug("postChannelsChannelName() - Error caught");
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
@@ -304,23 +493,25 @@ class HFCSDKConnector extends Connector {
     var request = {};
     var theClient;
     var theChannel;
+    var metrics = lbConnector.metrics;
+    var method = "postChannelsChannelNameChaincodes";
 
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return metrics.timePhase(method, "client", lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity)).then( (aClient) =>{
       logger.debug("postChannelsChannelNameChaincodes() - created client instance");
       theClient = aClient;
       //2. Get the Channel to instantiate chaincode on
       theChannel = theClient.getChannel(channelName);
 
       //3. Channel must be initialized to instantiate chaincode.
-      return theChannel.initialize();
+      return metrics.timePhase(method, "initialize", lbConnector.clientPool.initializeChannel(lbConnector.settings, theChannel, lbConnector.identity));
     }).then( (ignored)=>{
       //4. build txId
       request = chaincode;
       request.txId = theClient.newTransactionID();
 
       //5. Propose it
-      return theChannel.sendInstantiateProposal(request);
+      return metrics.timePhase(method, "endorse", theChannel.sendInstantiateProposal(request));
 
     }).then( (instantiateResponse)=>{
       //6 Check instantiate went okay
@@ -338,12 +529,13 @@ class HFCSDKConnector extends Connector {
       tranRequest.proposalResponses = instantiateResponse[0];
       tranRequest.proposal = instantiateResponse[1];
       //7. Once the proposal results are available we can send to the orderer.
-      return theChannel.sendTransaction(tranRequest);
+      return metrics.timePhase(method, "broadcast", theChannel.sendTransaction(tranRequest));
     }).then( (ordererResponse)=>{
       //REST caller may need to know transaction ID for later query
       ordererResponse.transactionID = request.txId.getTransactionID();
       return Promise.resolve(ordererResponse);
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       logger.debug("postChannelsChannelNameChaincodes() - Error caught");
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
@@ -368,13 +560,13 @@ class HFCSDKConnector extends Connector {
     var theChannel;
 
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
       logger.debug("putChannelsChannelNameChaincodes() - created client instance");
       theClient = aClient;
       //2. Get the Channel to instantiate chaincode on
       theChannel = aClient.getChannel(channelName);
       //3. Channel must be initialized to instantiate chaincode.
-      return theChannel.initialize();
+      return lbConnector.clientPool.initializeChannel(lbConnector.settings, theChannel, lbConnector.identity);
     }).then( (ignored)=>{
       //4. Check if chaincode exists on channel, return 404 if not as nothing to upgrade.
       return theChannel.queryInstantiatedChaincodes();
@@ -431,6 +623,7 @@ class HFCSDKConnector extends Connector {
       ordererResponse.transactionID = request.txId.getTransactionID();
       return Promise.resolve(ordererResponse);
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       logger.debug("putChannelsChannelNameChaincodes() - Error caught");
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
@@ -439,18 +632,22 @@ class HFCSDKConnector extends Connector {
   }
 
   /**
-   * Transaction proposal
+   * Transaction proposal. The proposal and its responses are kept in the proposal
+   * store, and the handle returned can be passed to postChannelsChannelNameTransactions
+   * to commit them.
    * @param {string} channelName Name of the channel
    * @param {integer[]} peers optional index(es) into datasources.json peers array to request endorsement from.
    * @param {transaction} transaction The transaction to commit and any proposal response.
    * @param {object} lbConnector The loopback connector object
    *
-   * @returns {Promise}
+   * @returns {Promise} Resolving to the transactionID, peerResponses, and the handle
+   *                    and its expiry time unless the proposal store is disabled.
    */
   postChannelsChannelNameEndorse(channelName, peers, transaction, lbConnector){
     Common.logEntry(logger,this.postChannelsChannelNameEndorse);
     var errMsg = "";
     var response = {};
+    var txId;
 
     //Check key fields were passed in.
     if(transaction.proposal === undefined){errMsg = "proposal"}
@@ -462,8 +659,14 @@ class HFCSDKConnector extends Connector {
     }
     if(errMsg.length > 0) return Promise.reject("Missing parameters: "+errMsg);
 
-    //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient)=>{
+    //1. Get a new client instance, and the peers if some were named.
+    var clientPromise = lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity);
+    var peerArrayPromise;
+    if(peers !== undefined && peers.length > 0){
+      peerArrayPromise = lbConnector.clientPool.getPeers(lbConnector.settings, peers);
+    }
+    return lbConnector.metrics.timePhase("postChannelsChannelNameEndorse", "client", Promise.all([clientPromise, peerArrayPromise])).then( (data)=>{
+      var aClient = data[0];
       //2. Once the client is configured set theChannel instance to use later.
       logger.debug("postChannelsChannelNameEndorse() - getting the channel");
       var theChannel = aClient.getChannel(channelName);
@@ -477,9 +680,24 @@ class HFCSDKConnector extends Connector {
       if(transaction.proposal.txId === undefined){
         endorseRequest.txId = aClient.newTransactionID();
       }
+      txId = endorseRequest.txId;
+      if(data[1] !== undefined){
+        endorseRequest.targets = data[1];
+      }
       // Now request endorsement
-      return Common.sendTxProposal(theChannel,endorseRequest);
+      return lbConnector.metrics.timePhase("postChannelsChannelNameEndorse", "endorse", Common.sendTxProposal(theChannel,endorseRequest));
+    }).then( (tranReq)=>{
+      //4. Keep the proposal and its responses to be committed later by handle.
+      response.transactionID = txId.getTransactionID();
+      response.peerResponses = tranReq.proposalResponses;
+      var stored = lbConnector.proposals.add(channelName, txId, tranReq, lbConnector.identityName());
+      if(stored !== undefined){
+        response.handle = stored.handle;
+        response.expires = stored.expires.toISOString();
+      }
+      return Promise.resolve(response);
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       logger.debug("postChannelsChannelNameEndorse() - Error caught");
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
@@ -488,30 +706,41 @@ class HFCSDKConnector extends Connector {
   }
 
   /**
-   * Commit a transaction, if no proposal responses propose and commit.
+   * Commit a transaction, if no proposal responses propose and commit. A transaction
+   * with a handle commits the proposal endorsed by postChannelsChannelNameEndorse.
    * @param {string} channelName Name of the channel
-   * @param {transaction} transaction The transaction to commit and any proposal response.
+   * @param {boolean} waitForCommit Optionally wait for the transaction to be committed by a peer before responding.
+   * @param {transaction} transaction The transaction to commit and any proposal response, or the handle of an endorsed proposal.
    * @param {object} lbConnector The loopback connector object
    *
    * @returns {Promise}
    */
-  postChannelsChannelNameTransactions(channelName, transaction, lbConnector){
+  postChannelsChannelNameTransactions(channelName, waitForCommit, transaction, lbConnector){
     Common.logEntry(logger,this.postChannelsChannelNameTransactions);
     var errMsg = "";
     var response = {};
     var theChannel;
     var txId;
+    var commitWaiter;
+    var endorsed;
 
     //Check key fields were passed in.
-    if(transaction.proposal === undefined){errMsg = "proposal"}
+    if(transaction.handle !== undefined){
+      // Commit a proposal endorsed by an earlier request.
+      try {
+        endorsed = lbConnector.proposals.take(channelName, transaction.handle, lbConnector.identityName());
+      } catch(err) {
+        return Promise.reject(err);
+      }
+    }
+    else if(transaction.proposal === undefined){errMsg = "proposal"}
     else if(transaction.proposal.header !== undefined){
       // If a header property exists this is an endorsement repsonse passed through
       logger.debug("postChannelsChannelNameTransactions() - proposal is a Buffer");
       /*TODO allow this once the sdk allows data only input to sendTransaction()
-       *     OR the objects can be stored across REST client requests
        *     OR the data can be easily turned back into the right objects
        */
-      var err = new Error("ProposalResponses passed over REST are not supported at this time");
+      var err = new Error("ProposalResponses passed over REST are not supported, commit the handle returned by /endorse instead");
       err.statusCode = 501;
       return Promise.reject(err);
     }
@@ -523,14 +752,22 @@ class HFCSDKConnector extends Connector {
     }
     if(errMsg.length > 0) return Promise.reject("Missing parameters: "+errMsg);
 
+    var metrics = lbConnector.metrics;
+    var method = "postChannelsChannelNameTransactions";
+
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient)=>{
+    return metrics.timePhase(method, "client", lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity)).then( (aClient)=>{
       //2. Once the client is configured set theChannel instance to use later.
       logger.debug("postChannelsChannelNameTransactions() - getting the channel");
       theChannel = aClient.getChannel(channelName);
 
       //3. Do endorsement if needed
       // Resolve step with https://fabric-sdk-node.github.io/global.html#TransactionRequest
+      if(endorsed !== undefined){
+        logger.debug("postChannelsChannelNameTransactions() - Endorsed by handle");
+        txId = endorsed.txId;
+        return Promise.resolve(endorsed.tranReq);
+      }
       // If nothing in proposalResponses as array or single ProposalResponse do endorsement first.
       if(transaction.proposalResponses === undefined
         || (transaction.proposalResponses.length === 0 && transaction.proposalResponses.payload === undefined)
@@ -543,7 +780,7 @@ class HFCSDKConnector extends Connector {
           endorseRequest.txId = txId;
         }
         // Now request endorsement
-        return Common.sendTxProposal(theChannel,endorseRequest);
+        return metrics.timePhase(method, "endorse", Common.sendTxProposal(theChannel,endorseRequest));
       } else {
         logger.debug("postChannelsChannelNameTransactions() - NO endorsement");
         // Need to convert data only proposal input into the object the SDK expects
@@ -553,17 +790,35 @@ class HFCSDKConnector extends Connector {
       }
     }).then( (tranReq)=>{
       //5. Once the proposal results are available we can sendTransaction.
-      return theChannel.sendTransaction(tranReq);
+      if(!waitForCommit){
+        return metrics.timePhase(method, "broadcast", theChannel.sendTransaction(tranReq));
+      }
+      //5.1 Listen for the transaction to be committed before sending it to the orderer.
+      var commitTimeout = (lbConnector.settings.commitTimeout !== undefined ? lbConnector.settings.commitTimeout : 30000);
+      var registered = lbConnector.eventHubs.register(lbConnector.settings, channelName, txId.getTransactionID(), commitTimeout);
+      return metrics.timePhase(method, "register", registered).then( (waiter)=>{
+        commitWaiter = waiter;
+        return metrics.timePhase(method, "broadcast", theChannel.sendTransaction(tranReq));
+      });
     }).then( (broadcastResponse)=>{
       //6. Format out the status returned on the broadcastResponse.status fields
       response.status = broadcastResponse.status;
       response.transactionID = txId.getTransactionID();
-      if(broadcastResponse.status === "SUCCESS"){
-        return Promise.resolve(response);
-      } else {
+      if(broadcastResponse.status !== "SUCCESS"){
         return Promise.reject(response);
+      } else if(commitWaiter === undefined){
+        return Promise.resolve(response);
       }
+      //7. Add the commit status and block number once a peer has committed the transaction.
+      return metrics.timePhase(method, "commit", commitWaiter.committed).then( (commit)=>{
+        response.commitStatus = commit.commitStatus;
+        response.validationCode = commit.validationCode;
+        response.blockNumber = commit.blockNumber;
+        return Promise.resolve(response);
+      });
     }).catch((err)=>{
+      if(commitWaiter !== undefined) commitWaiter.cancel();
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       logger.debug("postChannelsChannelNameTransactions() - Error caught");
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
@@ -579,8 +834,8 @@ class HFCSDKConnector extends Connector {
   getChannels(lbConnector){
     Common.logEntry(logger,this.getChannels);
 
-    var clientPromise = Common.getClient(lbConnector.settings);
-    var peerPromise   = Common.getPeer(lbConnector.settings);
+    var clientPromise = lbConnector.clientPool.getClient(lbConnector.settings, lbConnector.identity);
+    var peerPromise   = lbConnector.clientPool.getPeer(lbConnector.settings);
 
     //Once we have both Client and Peer query the Peer for the known Channels
     return Promise.all([clientPromise,peerPromise]).then(
@@ -599,6 +854,7 @@ class HFCSDKConnector extends Connector {
           return Promise.resolve(response);
         }
     ).catch((error)=>{
+        lbConnector.clientPool.evictIfBroken(lbConnector.settings, error);
         //Failed to perform function log error and reject promise
         logger.error("Failed to queryChannels: "+ error);
         return Promise.reject(error);
@@ -619,23 +875,23 @@ class HFCSDKConnector extends Connector {
     var theChannel;
 
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
       logger.debug("getChannelsChannelName() - created client instance");
       //3. Initialize the Channel and query it's Info
       theChannel = aClient.getChannel(channelName);
-      return theChannel.initialize();
+      return lbConnector.clientPool.initializeChannel(lbConnector.settings, theChannel, lbConnector.identity);
     }).then( (ignored) =>{
-      response = theChannel;
       return theChannel.queryInfo();
     }).then( (channelInfo) =>{
       logger.debug("getChannelsChannelName() - queried channel okay");
-      //Remove the _clientContext property from the Channel to avoid cyclic references in JSON response.
-      // If the Client is ever persisted across requests this delete could cause problems.
+      //Copy the shared Channel without the _clientContext property to avoid cyclic references in JSON response.
+      response = Object.assign({}, theChannel);
       delete response._clientContext;
       //4. Resolve with Channel and the queryInfo
       response.queryInfo = channelInfo;
       return Promise.resolve( response );
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
     });
@@ -659,12 +915,12 @@ class HFCSDKConnector extends Connector {
     var theClient;
 
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
       logger.debug("postChannelsChannelNamePeers() - created client instance");
       //2. Get and initialize the Channel
       theClient = aClient; //Store in wider scope for use in follow on step.
       theChannel = theClient.getChannel(channelName);
-      return theChannel.initialize();
+      return lbConnector.clientPool.initializeChannel(lbConnector.settings, theChannel, lbConnector.identity);
     }).then( (ignored) =>{
       var request = {};
       request.txId = theClient.newTransactionID();
@@ -696,6 +952,7 @@ class HFCSDKConnector extends Connector {
         return Promise.reject(err);
       }
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
     });
@@ -714,7 +971,7 @@ class HFCSDKConnector extends Connector {
     var response = {};
 
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
       logger.debug("getChannelsChannelNameChaincodesId() - created client instance");
       //3. Initialize the Channel and query it's chaincodes
       var theChannel = aClient.getChannel(channelName);
@@ -733,6 +990,7 @@ class HFCSDKConnector extends Connector {
       }
       return Promise.resolve( response );
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
     });
@@ -750,18 +1008,19 @@ class HFCSDKConnector extends Connector {
     var theChannel;
 
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
       logger.debug("getChannelsChannelNameChaincodes() - created client instance");
       //3. Initialize the Channel and query it's Info
       theChannel = aClient.getChannel(channelName);
-      return theChannel.initialize();
+      return lbConnector.clientPool.initializeChannel(lbConnector.settings, theChannel, lbConnector.identity);
     }).then( (ignored) =>{
-      return theChannel.queryInstantiatedChaincodes();
+      return routeQuery(theChannel, (peer)=>theChannel.queryInstantiatedChaincodes(peer), lbConnector);
     }).then( (installedChaincodes) =>{
       logger.debug("getChannelsChannelNameChaincodes() - queried channel for chaincode okay");
       response = installedChaincodes; //Indirection not needed here.
       return Promise.resolve( response );
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       if(err instanceof Error && !err.statusCode) err.statusCode = 500;
       return Promise.reject(err);
     });
@@ -795,15 +1054,29 @@ class HFCSDKConnector extends Connector {
       return Promise.reject("1 query parameter must be used on this request, "+queryParmCount+" found");
     }
 
+    //Blocks and transactions never change once committed so may already be cached.
+    var ledgerId;
+    if(queryType !== "chaincodeId"){
+      ledgerId = (queryType === "blockId" ? blockId : (queryType === "blockHash" ? blockHash : txnId));
+      var cached = lbConnector.ledgerCache.get(channelName, queryType, ledgerId, lbConnector.identityName());
+      if(cached !== undefined) return Promise.resolve(cached);
+    }
+
+    var metrics = lbConnector.metrics;
+    var method = "postChannelsChannelNameLedger";
+    var endQuery;
+
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return metrics.timePhase(method, "client", lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity)).then( (aClient) =>{
       logger.debug("postChannelsChannelNameLedger() - configured client instance");
+      endQuery = metrics.startTimer('fabric_rest_phase_duration_seconds', { method: method, phase: "query" });
       //3. Get the Channel, build request and send it
       var theChannel = aClient.getChannel(channelName);
 
       if(chaincodeId !== undefined && chaincodeId !== null){
         queryRequest.chaincodeId = chaincodeId;
-        if(body !== undefined && body.args !== null && body.fcn !== null){
+        if(body !== undefined && body !== null && body.args !== undefined && body.args !== null
+          && body.fcn !== undefined && body.fcn !== null){
           queryRequest.args = body.args;
           queryRequest.fcn = body.fcn;
         } else {
@@ -812,17 +1085,23 @@ class HFCSDKConnector extends Connector {
           return Promise.reject(parmsError);
         }
         logger.debug("postChannelsChannelNameLedger query: "+JSON.stringify(queryRequest));
-        return theChannel.queryByChaincode(queryRequest);
+        return routeQuery(theChannel, (peer)=>theChannel.queryByChaincode(targetQuery(queryRequest, peer)), lbConnector);
       } else if(blockId !== undefined && blockId !== null){
-        return theChannel.queryBlock(blockId);
+        return routeQuery(theChannel, (peer)=>theChannel.queryBlock(blockId, peer), lbConnector);
       } else if(blockHash !== undefined && blockHash !== null){
-        return theChannel.queryBlockByHash(blockHash);
+        return routeQuery(theChannel, (peer)=>theChannel.queryBlockByHash(blockHash, peer), lbConnector);
       } else if(txnId !== undefined && txnId !== null){
-        return theChannel.queryTransaction(txnId);
+        return routeQuery(theChannel, (peer)=>theChannel.queryTransaction(txnId, peer), lbConnector);
       } else {
         return Promise.reject("postChannelsChannelNameLedger unknown query");
       }
     }).then( (queryResult) =>{
+      endQuery();
+      // Query by chaincode resolves with a peer's error in place of its response.
+      if(queryResult instanceof Array && queryResult[0] instanceof Error){
+        return Promise.reject(queryResult[0]);
+      }
+      var endFormat = metrics.startTimer('fabric_rest_phase_duration_seconds', { method: method, phase: "format" });
       logger.debug("postChannelsChannelNameLedger() - queried channel for " + queryType);
       try{
         if(queryResult instanceof Array && queryResult[0] instanceof Buffer){
@@ -830,13 +1109,18 @@ class HFCSDKConnector extends Connector {
           response = Common.formatBufferResponse(queryResult[0]);
         } else {
           response = queryResult;
+          lbConnector.ledgerCache.put(channelName, queryType, ledgerId, response, lbConnector.identityName());
         }
       } catch(err){
         logger.debug("postChannelsChannelNameLedger() - return 404");
         return Promise.reject(err);
+      } finally {
+        endFormat();
       }
       return Promise.resolve( response );
     }).catch((err)=>{
+      if(endQuery !== undefined) endQuery();
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       if(err instanceof Error && err.message.indexOf("error Entry not found in index") > -1){
         err.statusCode = 404; //If block not found return a 404 instead of 500.
       } else if(err instanceof Error && !err.statusCode) err.statusCode = 500;
@@ -844,6 +1128,127 @@ class HFCSDKConnector extends Connector {
     });
   }
 
+  /**
+  * @returns {Promise} Resolving to an array with a result for each query, in the
+  *                    same order as the queries. Each result has the HTTP status
+  *                    of the query and either its data or an error message.
+  *
+  * Run many queries of the channel's ledger concurrently.
+  * @param {string} channelName Name of the channel
+  * @param {Array} queries Objects each with one of chaincodeId (with fcn and args), blockId, blockHash or txnId
+  * @param {object} lbConnector The loopback connector object
+  */
+  postChannelsChannelNameLedgerBatch(channelName, queries, lbConnector){
+    Common.logEntry(logger,this.postChannelsChannelNameLedgerBatch);
+    var maxBatchSize = lbConnector.settings.maxBatchSize || 100;
+    var parmsError;
+
+    if(!(queries instanceof Array)){
+      parmsError = new Error("An array of queries is required");
+    } else if(queries.length > maxBatchSize){
+      parmsError = new Error("No more than " + maxBatchSize + " queries can be sent at once");
+    }
+    if(parmsError !== undefined){
+      parmsError.statusCode = 400; //Bad Request
+      return Promise.reject(parmsError);
+    }
+
+    //Every query uses the same shared Channel, so run them all at once.
+    return Promise.all(queries.map( (query) =>{
+      if(query === null || typeof query !== 'object') query = {};
+      var body = { fcn: query.fcn, args: query.args };
+      // Unlike query parameters, the body isn't coerced to the declared types.
+      var blockId = (typeof query.blockId === 'string' ? Number(query.blockId) : query.blockId);
+      return this.postChannelsChannelNameLedger(channelName, query.chaincodeId, blockId,
+        query.blockHash, query.txnId, body, lbConnector).then( (data) =>{
+        return { status: 200, data: data };
+      }, (err) =>{
+        if(err instanceof Error) return { status: err.statusCode || 500, error: err.message };
+        // Parameter errors are rejected with a string.
+        return { status: 400, error: String(err) };
+      });
+    }));
+  }
+
+  /**
+  * @returns {Promise} Resolving to an object with a stream of the records as newline
+  *                    delimited JSON, and the bookmark for the next page or "" if
+  *                    there are no more records.
+  *
+  * Query the channel's ledger using chaincode, returning the records of the result
+  * as a stream rather than as one parsed array.
+  * @param {string} channelName Name of the channel
+  * @param {string} chaincodeId Chaincode ID to query
+  * @param {integer} pageSize Optional maximum number of records to return
+  * @param {string} bookmark Optional bookmark, from a previous page, of the first record to return
+  * @param {args} body Args for query by chaincode
+  * @param {object} lbConnector The loopback connector object
+  */
+  postChannelsChannelNameLedgerStream(channelName, chaincodeId, pageSize, bookmark, body, lbConnector){
+    Common.logEntry(logger,this.postChannelsChannelNameLedgerStream);
+    var queryRequest = {};
+    var first = 0;
+    var parmsError;
+
+    if(chaincodeId === undefined || chaincodeId === null){
+      parmsError = new Error("chaincodeId is required for a streamed query");
+    } else if(body === undefined || body === null || body.args === undefined || body.args === null
+      || body.fcn === undefined || body.fcn === null){
+      parmsError = new Error("Either \"args\" or \"fcn\" is missing for chaincode query");
+    } else if(pageSize !== undefined && pageSize !== null && !(pageSize > 0)){
+      parmsError = new Error("pageSize must be greater than 0");
+    } else if(bookmark !== undefined && bookmark !== null && bookmark !== ""){
+      first = Number(bookmark);
+      if(!Number.isInteger(first) || first < 0) parmsError = new Error("Invalid bookmark " + bookmark);
+    }
+    if(parmsError !== undefined){
+      parmsError.statusCode = 400; //Bad Request
+      return Promise.reject(parmsError);
+    }
+
+    //1. Get a new client instance.
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
+      //2. Get the Channel, build request and send it
+      var theChannel = aClient.getChannel(channelName);
+      queryRequest.chaincodeId = chaincodeId;
+      queryRequest.args = body.args;
+      queryRequest.fcn = body.fcn;
+      logger.debug("postChannelsChannelNameLedgerStream query: "+JSON.stringify(queryRequest));
+      return routeQuery(theChannel, (peer)=>theChannel.queryByChaincode(targetQuery(queryRequest, peer)), lbConnector);
+    }).then( (queryResult) =>{
+      var result = queryResult[0];
+      if(!(result instanceof Buffer)){
+        return Promise.reject(result);
+      }
+      //3. Find the records in the result without parsing them.
+      var records;
+      try {
+        records = Common.splitJSONArray(result);
+      } catch(notArray) {
+        var text = result.toString().trim();
+        if(text === ""){
+          logger.debug("postChannelsChannelNameLedgerStream() - empty response");
+          var err = new Error("Not Found");
+          err.statusCode = 404;
+          return Promise.reject(err);
+        }
+        // A single object is one record, anything else is returned as a JSON string.
+        if(!text.startsWith("{")) result = Buffer.from(JSON.stringify(text));
+        records = [[0, result.length]];
+      }
+      //4. Stream the requested page of records.
+      var last = records.length;
+      if(pageSize !== undefined && pageSize !== null) last = Math.min(first + pageSize, last);
+      var response = {};
+      response.stream = Common.ndjsonStream(result, records.slice(first, last));
+      response.bookmark = (last < records.length ? String(last) : "");
+      return Promise.resolve(response);
+    }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
+      if(err instanceof Error && !err.statusCode) err.statusCode = 500;
+      return Promise.reject(err);
+    });
+  }
 
   /**
   * @returns {Promise}
@@ -852,13 +1257,22 @@ class HFCSDKConnector extends Connector {
   * @param {string} channelName Name of the channel
   * @param {string} blockId Query data
   * @param {string} blockHash Query data
+  * @param {string} fields Optional comma separated parts of the block to return, of
+  *                        header, txids, data and metadata
   * @param {object} lbConnector The loopback connector object
   */
-  getChannelsChannelNameBlocks(channelName, blockId, blockHash, lbConnector){
+  getChannelsChannelNameBlocks(channelName, blockId, blockHash, fields, lbConnector){
     Common.logEntry(logger,this.getChannelsChannelNameBlocks);
     var response = {};
     var queryType = "NOT SET"
     var queryParmCount = 0;
+    var selected;
+
+    try {
+      selected = Common.parseBlockFields(fields);
+    } catch(err) {
+      return Promise.reject(err);
+    }
 
     //Validate that the number of query parameters is valid
     if(blockId !== undefined && blockId !== null){ queryParmCount++; queryType = "blockId"}
@@ -867,24 +1281,31 @@ class HFCSDKConnector extends Connector {
       return Promise.reject("1 query parameter must be used on this request, "+queryParmCount+" found");
     }
 
+    //Blocks never change once committed so may already be cached.
+    var ledgerId = (queryType === "blockId" ? blockId : blockHash);
+    var cached = lbConnector.ledgerCache.get(channelName, queryType, ledgerId, lbConnector.identityName());
+    if(cached !== undefined) return Promise.resolve(Common.selectBlockFields(cached, selected));
+
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
       logger.debug("getChannelsChannelNameBlocks() - configured client instance");
       //3. Get the Channel, build request and send it
       var theChannel = aClient.getChannel(channelName);
 
       if(blockId !== undefined && blockId !== null){
-        return theChannel.queryBlock(blockId);
+        return routeQuery(theChannel, (peer)=>theChannel.queryBlock(blockId, peer), lbConnector);
       } else if(blockHash !== undefined && blockHash !== null){
-        return theChannel.queryBlockByHash(blockHash);
+        return routeQuery(theChannel, (peer)=>theChannel.queryBlockByHash(blockHash, peer), lbConnector);
       } else {
         return Promise.reject("getChannelsChannelNameBlocks unknown query");
       }
     }).then( (queryResult) =>{
       logger.debug("getChannelsChannelNameBlocks() - queried channel for " + queryType);
       response = queryResult; //Indirection not needed here.
-      return Promise.resolve( response );
+      lbConnector.ledgerCache.put(channelName, queryType, ledgerId, response, lbConnector.identityName());
+      return Promise.resolve( Common.selectBlockFields(response, selected) );
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       if(err instanceof Error && !err.statusCode){
         if(err.message.startsWith("chaincode error (status: 500, message: Failed to get block")){
           //TODO Fragile test, but not much else to go on.
@@ -897,23 +1318,103 @@ class HFCSDKConnector extends Connector {
     });
   }
 
+  /**
+  * @returns {Promise} Resolving to an object with the blocks in the range and the
+  *                    current height of the chain.
+  *
+  * Query a range of blocks on a channel. Blocks beyond the end of the chain are
+  * not returned, so fewer blocks than requested means the end has been reached.
+  * @param {string} channelName Name of the channel
+  * @param {integer} start Number of the first block
+  * @param {integer} end Optional number of the last block
+  * @param {string} fields Optional comma separated parts of each block to return, of
+  *                        header, txids, data and metadata
+  * @param {object} lbConnector The loopback connector object
+  */
+  getChannelsChannelNameBlocksRange(channelName, start, end, fields, lbConnector){
+    Common.logEntry(logger,this.getChannelsChannelNameBlocksRange);
+    var maxBlockRange = lbConnector.settings.maxBlockRange || 100;
+    var response = {};
+    var theChannel;
+    var parmsError;
+    var selected;
+
+    try {
+      selected = Common.parseBlockFields(fields);
+    } catch(err) {
+      return Promise.reject(err);
+    }
+    if(!Number.isInteger(start) || start < 0){
+      parmsError = new Error("start must be a block number");
+    } else if(end === undefined || end === null){
+      end = start + maxBlockRange - 1;
+    } else if(!Number.isInteger(end) || end < start){
+      parmsError = new Error("end must be a block number no less than start");
+    } else if(end - start + 1 > maxBlockRange){
+      parmsError = new Error("No more than " + maxBlockRange + " blocks can be queried at once");
+    }
+    if(parmsError !== undefined){
+      parmsError.statusCode = 400; //Bad Request
+      return Promise.reject(parmsError);
+    }
+
+    //1. Get a new client instance.
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
+      logger.debug("getChannelsChannelNameBlocksRange() - configured client instance");
+      //2. Find the height of the chain so blocks not yet committed aren't queried.
+      theChannel = aClient.getChannel(channelName);
+      return theChannel.queryInfo();
+    }).then( (channelInfo) =>{
+      response.height = channelInfo.height.toString();
+      var last = Math.min(end, Number(response.height) - 1);
+      //3. Query the blocks in parallel, using any already cached.
+      var blocks = [];
+      for(var blockId = start; blockId <= last; blockId++){
+        let id = String(blockId);
+        let cached = lbConnector.ledgerCache.get(channelName, "blockId", id, lbConnector.identityName());
+        if(cached !== undefined){
+          blocks.push(cached);
+        } else {
+          blocks.push(theChannel.queryBlock(blockId).then( (block) =>{
+            lbConnector.ledgerCache.put(channelName, "blockId", id, block, lbConnector.identityName());
+            return block;
+          }));
+        }
+      }
+      return Promise.all(blocks);
+    }).then( (blocks) =>{
+      logger.debug("getChannelsChannelNameBlocksRange() - queried " + blocks.length + " blocks from " + start);
+      response.blocks = blocks.map((block)=>Common.selectBlockFields(block, selected));
+      return Promise.resolve( response );
+    }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
+      if(err instanceof Error && !err.statusCode) err.statusCode = 500;
+      return Promise.reject(err);
+    });
+  }
 
   getChannelsChannelNameTransactionsTransactionID(channelName, transactionID, lbConnector){
     Common.logEntry(logger,this.getChannelsChannelNameTransactionsTransactionID);
     var response = {};
 
+    //Transactions never change once committed so may already be cached.
+    var cached = lbConnector.ledgerCache.get(channelName, "txnId", transactionID, lbConnector.identityName());
+    if(cached !== undefined) return Promise.resolve(cached);
+
     //1. Get a new client instance.
-    return Common.getClientWithChannels(lbConnector.settings).then( (aClient) =>{
+    return lbConnector.clientPool.getClientWithChannels(lbConnector.settings, lbConnector.identity).then( (aClient) =>{
       logger.debug("getChannelsChannelNameTransactionsTransactionID() - configured client instance");
       //3. Get the Channel, build request and send it
       var theChannel = aClient.getChannel(channelName);
 
-      return theChannel.queryTransaction(transactionID);
+      return routeQuery(theChannel, (peer)=>theChannel.queryTransaction(transactionID, peer), lbConnector);
     }).then( (queryResult) =>{
       logger.debug("getChannelsChannelNameTransactionsTransactionID() - queried channel for " + transactionID);
       response = queryResult; //Indirection not needed here.
+      lbConnector.ledgerCache.put(channelName, "txnId", transactionID, response, lbConnector.identityName());
       return Promise.resolve( response );
     }).catch((err)=>{
+      lbConnector.clientPool.evictIfBroken(lbConnector.settings, err);
       if(err instanceof Error && !err.statusCode){
         if(err.message.startsWith("chaincode error (status: 500, message: Failed to get transaction with id")){
           //TODO Fragile test, but not much else to go on.
@@ -0,0 +1,466 @@
+#
+# Copyright IBM Corp. All Rights Reserved.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+# Async Fabric Rest
+#
+# asyncio wrapper around the Fabric REST API, requires Python 3.6 or later.
+
+import asyncio
+import collections
+import json
+import os
+import ssl
+from http.cookies import SimpleCookie
+
+from fabric_rest import (BlockView, FabricRest, FabricRestBusy, FabricRestError, _IDEMPOTENT, _IDLE_TIMEOUT, _clock,
+                         _error_body, _retry_after)
+
+
+class _NoResponse(ConnectionResetError):
+    """The server closed the connection without sending any of a response."""
+
+
+class AsyncTransport:
+    """asyncio transport using a pool of keep-alive HTTP/1.1 connections."""
+
+    def __init__(self, hostname, port, tls, pool_size=8):
+        self.hostname = hostname
+        self.port = int(port)
+        self.pool_size = pool_size
+        self.cookies = {}
+        self.ssl_context = None
+        if tls:
+            # Match curl -k, the REST server is usually run with a self signed certificate.
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+        self._idle = []
+
+    def _headers(self, verb, endpoint, length, content_type):
+        lines = [verb.upper() + " " + endpoint + " HTTP/1.1",
+                 "Host: " + self.hostname + ":" + str(self.port),
+                 "Connection: keep-alive",
+                 "Content-Type: " + content_type,
+                 "Content-Length: " + str(length)]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(k + "=" + v for k, v in self.cookies.items()))
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _read_head(self, reader):
+        """Read the status line and headers of a response, returning (status, headers)."""
+        status_line = await reader.readline()
+        if not status_line:
+            raise _NoResponse("Connection closed by REST server")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            name = name.strip().lower()
+            if name == "set-cookie":
+                jar = SimpleCookie()
+                jar.load(value.strip())
+                for key, morsel in jar.items():
+                    self.cookies[key] = morsel.value
+            headers[name] = value.strip()
+        if "content-length" not in headers and headers.get("transfer-encoding", "").lower() != "chunked":
+            # The body runs to the end of the connection.
+            headers["connection"] = "close"
+        return int(status_line.split()[1]), headers
+
+    async def _iter_body(self, reader, headers):
+        """Yield the data of a response body as it is received."""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                yield await reader.readexactly(size)
+                await reader.readline()
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining > 0:
+                data = await reader.read(min(remaining, 65536))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                yield data
+        else:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                yield data
+
+    async def _read_response(self, reader):
+        status, headers = await self._read_head(reader)
+        data = b"".join([chunk async for chunk in self._iter_body(reader, headers)])
+        return status, headers, data, headers.get("connection", "").lower() != "close"
+
+    async def _send_file(self, writer, body, start):
+        body.seek(start)
+        while True:
+            chunk = body.read(65536)
+            if not chunk:
+                break
+            writer.write(chunk)
+            await writer.drain()
+
+    async def _send(self, verb, endpoint, body, content_type, read):
+        """Send a request, returning (reader, writer, await read(reader)).
+
+        The caller must check the connection back in.
+        """
+        start = None
+        if hasattr(body, "read"):
+            start = body.tell()
+            length = os.fstat(body.fileno()).st_size - start
+        else:
+            if body is None:
+                body = b""
+            elif not isinstance(body, bytes):
+                body = body.encode("utf-8")
+            length = len(body)
+        for attempt in (0, 1):
+            reused = False
+            while self._idle and not reused:
+                reader, writer, since = self._idle.pop()
+                if _clock() - since < _IDLE_TIMEOUT:
+                    reused = True
+                else:
+                    writer.close()
+            if not reused:
+                reader, writer = await asyncio.open_connection(self.hostname, self.port, ssl=self.ssl_context)
+            sent = False
+            try:
+                writer.write(self._headers(verb, endpoint, length, content_type))
+                if start is None:
+                    writer.write(body)
+                else:
+                    await self._send_file(writer, body, start)
+                await writer.drain()
+                sent = True
+                result = await read(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as err:
+                writer.close()
+                # A reused connection may have been closed by the server while idle, which fails
+                # before any of the response arrives. Send the request once more on a new
+                # connection, unless the server may have acted on it: a request that is not
+                # idempotent is never sent twice once it has been sent.
+                retry = reused and not attempt and (
+                    (not sent and isinstance(err, ConnectionError)) or
+                    (isinstance(err, _NoResponse) and verb.upper() in _IDEMPOTENT))
+                if not retry:
+                    raise
+                continue
+            except BaseException:
+                # Cancelled or timed out part way through a response, the connection can't be reused.
+                writer.close()
+                raise
+            return reader, writer, result
+
+    def _checkin(self, reader, writer, reusable):
+        if reusable and len(self._idle) < self.pool_size:
+            self._idle.append((reader, writer, _clock()))
+        else:
+            writer.close()
+
+    async def request(self, verb, endpoint, body=None, content_type="application/json"):
+        """Send a request and return the response body.
+
+        body may be a string, or a file opened in binary mode which is streamed to the server.
+        """
+        reader, writer, (status, headers, data, reusable) = await self._send(verb, endpoint, body, content_type,
+                                                                            self._read_response)
+        self._checkin(reader, writer, reusable)
+        if status == 429:
+            raise FabricRestBusy(_error_body(data), _retry_after(headers.get("retry-after")))
+        return data
+
+    async def stream(self, verb, endpoint, body=None, content_type="application/json"):
+        """Send a request, returning (headers, lines) as soon as the response headers arrive.
+
+        headers is a dict with lower case names and lines is an async iterator over the
+        lines of the response body as they are received. The connection is returned to
+        the pool once all the lines have been read. Raises FabricRestError for an error status.
+        """
+        reader, writer, (status, headers) = await self._send(verb, endpoint, body, content_type, self._read_head)
+        reusable = headers.get("connection", "").lower() != "close"
+        if status >= 400:
+            try:
+                data = b"".join([chunk async for chunk in self._iter_body(reader, headers)])
+            except BaseException:
+                writer.close()
+                raise
+            self._checkin(reader, writer, reusable)
+            if status == 429:
+                raise FabricRestBusy(_error_body(data), _retry_after(headers.get("retry-after")))
+            raise FabricRestError(status, _error_body(data))
+
+        async def lines():
+            complete = False
+            try:
+                pending = b""
+                async for data in self._iter_body(reader, headers):
+                    pending += data
+                    *complete_lines, pending = pending.split(b"\n")
+                    for line in complete_lines:
+                        yield line
+                if pending:
+                    yield pending
+                complete = True
+            finally:
+                self._checkin(reader, writer, complete and reusable)
+        return headers, lines()
+
+    def close(self):
+        """Close all idle connections."""
+        idle, self._idle = self._idle, []
+        for _, writer, _ in idle:
+            writer.close()
+
+
+class AsyncBlockView(BlockView):
+    """A BlockView whose full block is fetched by a coroutine.
+
+    await load() before using the block, or the envelopes, read-write sets and
+    signatures of its transactions.
+    """
+    __slots__ = ()
+
+    async def load(self):
+        """Fetch the full block if it has not been already, and return it."""
+        if self._block is None:
+            self._block = await self._loader()
+            self._loader = None
+        return self._block
+
+    @property
+    def block(self):
+        """The full block, once load() has been awaited."""
+        if self._block is None:
+            raise RuntimeError("Block %d is not loaded, await load() first" % self.number)
+        return self._block
+
+
+class AsyncFabricRest(FabricRest):
+    """An asyncio wrapper around the Fabric REST API.
+
+    Provides the same endpoint methods as FabricRest as coroutines. No more than
+    max_in_flight requests are sent to the REST server at a time, and each request
+    is cancelled if it has not completed after timeout seconds. A request the REST
+    server is too busy for is retried up to retries times, without holding a slot
+    while waiting to retry.
+    """
+
+    def __init__(self, hostname="localhost", port="3000", tls=False, max_in_flight=16, timeout=60, retries=3):
+        self.hostname = hostname
+        self.port = port
+        self.tls = tls
+        self.retries = retries
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.transport = AsyncTransport(hostname, port, tls, max_in_flight)
+        self.timing_hooks = []
+        self._in_flight = None
+
+    async def login(self):
+        """Authenticate with the REST server, subsequent requests use the session cookie."""
+        return await self._call_endpoint("POST", "/auth/ldap", authenticate=True)
+
+    async def _retry(self, call, body=None):
+        """Return await call(), retrying with backoff while it raises FabricRestBusy."""
+        start = body.tell() if hasattr(body, "seek") else None
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except FabricRestBusy as e:
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e.retry_after))
+                attempt += 1
+                if start is not None:
+                    body.seek(start)
+
+    async def _call_endpoint(self, verb, endpoint, data=None, authenticate=False, content_type="application/json"):
+        """Call a REST endpoint, returning a dict representation of the returned JSON."""
+        try:
+            response = await self._retry(lambda: self._request(verb, endpoint, data, authenticate, content_type), data)
+        except FabricRestBusy as e:
+            # Still busy after the retries, return the error like any other.
+            return e.body
+        try:
+            return json.loads(response)
+        except ValueError:
+            return response
+
+    async def _request(self, verb, endpoint, data, authenticate, content_type):
+        # Created here so it belongs to the running event loop.
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        async with self._in_flight:
+            if authenticate:
+                request = self.transport.request(verb, endpoint, "username=alice&password=secret",
+                                                 "application/x-www-form-urlencoded")
+            else:
+                request = self.transport.request(verb, endpoint, data, content_type)
+            # Timed once a slot is free, so the latency doesn't include queueing in the client.
+            start = _clock()
+            error = None
+            try:
+                return await asyncio.wait_for(request, self.timeout)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._timed(verb, endpoint, start, error)
+
+    async def install_chaincode_package(self, chaincode_id, chaincode_path, package_file, chaincode_version, peers):
+        """Install chaincode onto the named peers, streaming the package archive from a file"""
+        url = "/api/fabric/1_0/chaincodes?" + self._package_query(chaincode_id, chaincode_path, chaincode_version, peers)
+        with open(package_file, "rb") as archive:
+            return await self._call_endpoint("POST", url, archive, content_type="application/octet-stream")
+
+    async def iter_query_results(self, channel, chaincode_id, data, page_size=None):
+        """Query the channel's ledger by chaincode, yielding each record of the result.
+
+        Records are parsed as they arrive rather than once the whole result has been
+        received. If page_size is set the records are fetched that many at a time,
+        following the bookmark returned with each page. The request holds one of the
+        max_in_flight slots until all of its records have been read.
+        """
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        bookmark = None
+        while True:
+            url = self._stream_url(channel, chaincode_id, page_size, bookmark)
+            async with self._in_flight:
+                headers, lines = await self._retry(lambda: asyncio.wait_for(self.transport.stream("POST", url, data),
+                                                                            self.timeout))
+                async for line in lines:
+                    if line.strip():
+                        yield json.loads(line.decode("utf-8"))
+            bookmark = headers.get("x-fabric-bookmark")
+            if not bookmark:
+                return
+
+    async def query_block(self, channel, block_id=None, block_hash=None, fields=None):
+        """Query a block on a channel by ID or Hash, see FabricRest.query_block."""
+        url = "/api/fabric/1_0/channels/" + channel + "/blocks?"
+        if block_id is not None:
+            url += "blockId=" + str(block_id)
+        if block_hash:
+            url += "blockHash=" + block_hash
+        if fields:
+            url += "&fields=" + fields
+        result = await self._call_endpoint("GET", url)
+        if not isinstance(result, dict) or "error" in result:
+            error = result.get("error", {}) if isinstance(result, dict) else {}
+            raise FabricRestError(error.get("statusCode", 0), result)
+        return result
+
+    async def query_block_range(self, channel, start, end=None, fields=None):
+        """Query a range of blocks on a channel, see FabricRest.query_block_range."""
+        url = "/api/fabric/1_0/channels/" + channel + "/blocks/range?start=" + str(start)
+        if end is not None:
+            url += "&end=" + str(end)
+        if fields:
+            url += "&fields=" + fields
+        result = await self._call_endpoint("GET", url)
+        if not isinstance(result, dict) or "blocks" not in result:
+            error = result.get("error", {}) if isinstance(result, dict) else {}
+            raise FabricRestError(error.get("statusCode", 0), result)
+        return result
+
+    async def iter_blocks(self, channel, start=0, end=None, batch_size=50, window=4, follow=False, poll_interval=1.0,
+                          fields=None):
+        """Yield the blocks on a channel in order, see FabricRest.iter_blocks."""
+        pending = collections.deque()
+        next_start = start
+        try:
+            while True:
+                while len(pending) < window and (end is None or next_start <= end):
+                    last = next_start + batch_size - 1
+                    if end is not None:
+                        last = min(last, end)
+                    fetch = asyncio.ensure_future(self.query_block_range(channel, next_start, last, fields))
+                    pending.append((next_start, last, fetch))
+                    next_start = last + 1
+                if not pending:
+                    return
+                first, last, fetch = pending.popleft()
+                blocks = (await fetch)["blocks"]
+                for block in blocks:
+                    yield block
+                if first + len(blocks) <= last:
+                    # Reached the end of the chain, batches prefetched beyond it are incomplete.
+                    for _, _, fetch in pending:
+                        fetch.cancel()
+                    pending.clear()
+                    next_start = first + len(blocks)
+                    if not follow:
+                        return
+                    if not blocks:
+                        await asyncio.sleep(poll_interval)
+        finally:
+            for _, _, fetch in pending:
+                fetch.cancel()
+
+    async def iter_block_views(self, channel, start=0, end=None, batch_size=50, window=4, follow=False,
+                               poll_interval=1.0):
+        """Yield an AsyncBlockView of each block on a channel, see FabricRest.iter_block_views."""
+        async for block in self.iter_blocks(channel, start, end, batch_size, window, follow, poll_interval,
+                                            fields="header,txids"):
+            number = int(block["header"]["number"])
+            yield AsyncBlockView(block["header"], block["txids"],
+                                 loader=lambda number=number: self.query_block(channel, block_id=number))
+
+    async def _stream(self, calls):
+        """Run calls, at most max_in_flight at a time, yielding (index, result) as each completes.
+
+        If a call fails the exception is yielded as its result.
+        """
+        calls = iter(enumerate(calls))
+        pending = {}
+
+        def start_next():
+            for index, call in calls:
+                pending[asyncio.ensure_future(call())] = index
+                return
+
+        for _ in range(self.max_in_flight):
+            start_next()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                start_next()
+                if future.exception() is not None:
+                    yield index, future.exception()
+                else:
+                    yield index, future.result()
+
+    def gather_queries(self, channel, queries):
+        """Run many ledger queries on a channel, yielding (index, result) as each completes.
+
+        Each query is a dict of keyword arguments for query_ledger, e.g.
+        {"chaincode_id": "fabcar", "data": '{"fcn":"queryCar","args":["CAR4"]}'}.
+        """
+        return self._stream(lambda query=query: self.query_ledger(channel, **query) for query in queries)
+
+    def submit_many(self, channel, transactions):
+        """Commit many transactions on a channel, yielding (index, result) as each completes.
+
+        Each transaction is the JSON request body passed to commit_transaction.
+        """
+        return self._stream(lambda data=data: self.commit_transaction(channel, data) for data in transactions)
+
+    def close(self):
+        """Release any connections held by the transport."""
+        self.transport.close()
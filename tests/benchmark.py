@@ -0,0 +1,246 @@
+#
+# Copyright IBM Corp. All Rights Reserved.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+# Benchmark
+#
+# Drive each /api/fabric/1_0 endpoint through FabricRest at a given concurrency, and
+# report the p50, p95 and p99 latency and the throughput of each. Run against a REST
+# server connected to the stand-in in standin/ it needs no Fabric network, see
+# benchmark.sh.
+
+from __future__ import print_function
+
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+
+from fabric_rest import FabricRest, _clock
+
+# The peers query parameter for the first peer, [0].
+FIRST_PEER = "%5B0%5D"
+
+
+def _failed(result):
+    """True if a FabricRest call returned an error body rather than raising."""
+    return isinstance(result, dict) and "error" in result
+
+
+def percentile(latencies, percent):
+    """The nearest-rank percentile of a sorted list of latencies, or None if there are none."""
+    if not latencies:
+        return None
+    rank = max(0, min(len(latencies) - 1, int(round(percent / 100.0 * len(latencies))) - 1))
+    return latencies[rank]
+
+
+def _milliseconds(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def run_endpoint(call, requests, concurrency, warmup=0):
+    """Call an endpoint requests times from concurrency threads.
+
+    Returns a dict of the number of requests and errors, the p50, p95 and p99 latency
+    in milliseconds, None if no requests were sent, and the throughput in requests per
+    second.
+    """
+    for _ in range(warmup):
+        try:
+            call()
+        except Exception:
+            pass
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    remaining = [requests]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = _clock()
+            try:
+                failed = _failed(call())
+            except Exception:
+                failed = True
+            latency = _clock() - start
+            with lock:
+                latencies.append(latency)
+                if failed:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = _clock()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = _clock() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "p50": _milliseconds(percentile(latencies, 50)),
+        "p95": _milliseconds(percentile(latencies, 95)),
+        "p99": _milliseconds(percentile(latencies, 99)),
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def _first_transaction(restserver, channel):
+    """The ID of a transaction on the channel to query, or None if none could be found."""
+    try:
+        for tx in restserver.query_block(channel, block_id=1, fields="txids")["txids"]:
+            if tx.get("tx_id"):
+                return tx["tx_id"]
+    except Exception:
+        pass
+    return None
+
+
+def endpoints(restserver, args):
+    """A list of (name, call, admin) for each endpoint. Admin endpoints change the
+    network's configuration, so are only safe to benchmark against the stand-in.
+    """
+    channel = args.channel
+    chaincode = args.chaincode
+    tx_id = args.transaction or _first_transaction(restserver, channel) or "0"
+    with open(args.channel_tx, "rb") as config:
+        channel_config = base64.b64encode(config.read()).decode("ascii")
+    peer_data = json.dumps({"url": args.join_peer_url})
+    batch = [{"chaincode_id": chaincode, "data": args.query}] * 10
+
+    return [
+        ("GET /channels",
+         lambda: restserver.get_channels(), False),
+        ("GET /channels/{channelName}",
+         lambda: restserver.get_channel_info(channel), False),
+        ("GET /channels/{channelName}/chaincodes",
+         lambda: restserver.query_all_chaincode(channel), False),
+        ("GET /channels/{channelName}/chaincodes/{id}",
+         lambda: restserver.query_channel_chaincode(channel, chaincode), False),
+        ("GET /chaincodes/{id}",
+         lambda: restserver.query_chaincode(chaincode, FIRST_PEER), False),
+        ("GET /channels/{channelName}/blocks",
+         lambda: restserver.query_block(channel, block_id=1), False),
+        ("GET /channels/{channelName}/blocks/range",
+         lambda: restserver.query_block_range(channel, 0, 9), False),
+        ("GET /channels/{channelName}/transactions/{transactionID}",
+         lambda: restserver.query_transaction(channel, tx_id), False),
+        ("POST /channels/{channelName}/ledger",
+         lambda: restserver.query_ledger(channel, data=args.query, chaincode_id=chaincode), False),
+        ("POST /channels/{channelName}/ledger/batch",
+         lambda: restserver.query_ledger_many(channel, batch), False),
+        ("POST /channels/{channelName}/ledger/stream",
+         lambda: list(restserver.iter_query_results(channel, chaincode, args.query)), False),
+        ("POST /channels/{channelName}/endorse",
+         lambda: restserver.send_proposal(channel, args.invoke), False),
+        ("POST /channels/{channelName}/transactions",
+         lambda: restserver.commit_transaction(channel, args.invoke), False),
+        ("POST /chaincodes",
+         lambda: restserver.install_chaincode_package(chaincode, chaincode, args.package, args.version, FIRST_PEER),
+         True),
+        ("POST /channels/{channelName}/chaincodes",
+         lambda: restserver.instantiate_chaincode(channel, chaincode, args.version), True),
+        ("PUT /channels/{channelName}/chaincodes",
+         lambda: restserver.init_updated_chaincode(channel, chaincode, args.version), True),
+        ("POST /channels/{channelName}",
+         lambda: restserver.create_channel(channel, channel_config), True),
+        ("PUT /channels/{channelName}",
+         lambda: restserver.update_channel(channel, channel_config), True),
+        ("POST /channels/{channelName}/peers",
+         lambda: restserver.join_channel(channel, peer_data), True),
+    ]
+
+
+def compare(results, baseline, tolerance):
+    """The endpoints whose throughput fell by more than tolerance from the baseline."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append((name, before["throughput"], result["throughput"]))
+    return regressions
+
+
+def _format_latency(latency):
+    return "n/a" if latency is None else "%.1f" % latency
+
+
+def report(results, order):
+    print("%-56s %8s %6s %9s %9s %9s %9s" % ("Endpoint", "Requests", "Errors", "p50 ms", "p95 ms", "p99 ms", "req/s"))
+    for name in order:
+        if name not in results:
+            continue
+        r = results[name]
+        print("%-56s %8d %6d %9s %9s %9s %9.1f" % (name, r["requests"], r["errors"], _format_latency(r["p50"]),
+                                                    _format_latency(r["p95"]), _format_latency(r["p99"]),
+                                                    r["throughput"]))
+
+
+if __name__ == "__main__":
+    tests_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Benchmark the REST server's endpoints")
+    parser.add_argument('--tls', '-t', help='Enable TLS', action='store_true', default=False)
+    parser.add_argument('--hostname', '-n', help='Hostname of SDK REST server to connect to', default='localhost')
+    parser.add_argument('--port', '-p', help='Port of SDK REST server to connect on', default='3000')
+    parser.add_argument('--concurrency', '-c', help='Requests in flight at once', type=int, default=8)
+    parser.add_argument('--requests', '-r', help='Requests to send to each endpoint', type=int, default=200)
+    parser.add_argument('--warmup', '-w', help='Requests to send to each endpoint before measuring', type=int,
+                        default=10)
+    parser.add_argument('--endpoint', '-e', help='Only benchmark endpoints containing this text, may be repeated',
+                        action='append')
+    parser.add_argument('--admin', help='Also benchmark endpoints that change the network configuration',
+                        action='store_true', default=False)
+    parser.add_argument('--channel', help='Channel to query', default='mychannel')
+    parser.add_argument('--chaincode', help='Chaincode to query and invoke', default='fabcar')
+    parser.add_argument('--version', help='Chaincode version to install and instantiate', default='1.0')
+    parser.add_argument('--query', help='Chaincode query request body',
+                        default='{"fcn":"queryAllCars","args":[]}')
+    parser.add_argument('--invoke', help='Chaincode transaction request body',
+                        default='{"proposal":{"chaincodeId":"fabcar","fcn":"changeCarOwner","args":["CAR0","Dave"]}}')
+    parser.add_argument('--transaction', help='ID of a transaction to query, by default one in block 1')
+    parser.add_argument('--package', help='Chaincode package to install',
+                        default=os.path.join(tests_dir, 'input', 'installFabcar.tar.gz'))
+    parser.add_argument('--channel-tx', help='Channel configuration transaction to create and update the channel with',
+                        default=os.path.join(tests_dir, 'basic-network', 'config', 'channel.tx'))
+    parser.add_argument('--join-peer-url', help='URL of the peer to join to the channel', default='grpc://0.0.0.0:7051')
+    parser.add_argument('--save', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Results saved by an earlier run to compare throughput with')
+    parser.add_argument('--tolerance', help='Fraction throughput may fall from the baseline', type=float, default=0.1)
+    args = parser.parse_args()
+
+    restserver = FabricRest(args.hostname, args.port, args.tls, pool_size=args.concurrency, retries=0)
+    results = {}
+    order = []
+    try:
+        for name, call, admin in endpoints(restserver, args):
+            if admin and not args.admin:
+                continue
+            if args.endpoint and not any(text in name for text in args.endpoint):
+                continue
+            order.append(name)
+            results[name] = run_endpoint(call, args.requests, args.concurrency, args.warmup)
+            print("%s: %.1f req/s" % (name, results[name]["throughput"]), file=sys.stderr)
+    finally:
+        restserver.close()
+
+    report(results, order)
+    if args.save:
+        with open(args.save, "w") as saved:
+            json.dump(results, saved, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as saved:
+            regressions = compare(results, json.load(saved), args.tolerance)
+        for name, before, after in regressions:
+            print("REGRESSION %s: %.1f req/s, was %.1f req/s" % (name, after, before))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,137 @@
+#!/bin/bash -
+#
+# Copyright IBM Corp. All Rights Reserved.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+
+# Benchmark the Fabric SDK REST server without a Fabric network
+#
+# 1. Start the Fabric stand-in, replaying responses recorded from a network
+# 2. Start the Fabric SDK REST server, connected to the stand-in
+# 3. Run benchmark.py against every endpoint
+# 4. Stop the REST server and the stand-in
+#
+# With -r the stand-in records from the running network configured in the REST
+# server's datasources.json instead, and each endpoint is called once to record its
+# responses. Arguments after -- are passed to benchmark.py, in both modes, so admin
+# endpoints are recorded and benchmarked with -- --admin.
+
+
+project_dir="$(cd "$( dirname "${BASH_SOURCE[0]}" )/.." && pwd)"
+server_dir="${project_dir}/packages/fabric-rest"
+tests_dir="${project_dir}/tests"
+datasources_file="${server_dir}/server/datasources.json"
+standin_datasources_file="/tmp/standin-datasources.json"
+recording_file="${tests_dir}/standin/recording.json"
+port=3000
+port_offset=10000
+latency=5
+orderer_latency=20
+
+_show_help() {
+    printf -- "Usage: benchmark.sh [OPTIONS] [-- BENCHMARK OPTIONS]\n\n"
+    printf -- "Options:\n"
+    printf -- "-r record responses from the running Fabric network instead of benchmarking\n"
+    printf -- "-f file to record responses to and replay them from (default: standin/recording.json)\n"
+    printf -- "-c datasources file of the Fabric network (default: the REST server's datasources.json)\n"
+    printf -- "-p specify a port for the Fabric SDK REST server to listen on (default: 3000)\n"
+    printf -- "-o added to the network's ports for the stand-in to listen on (default: 10000)\n"
+    printf -- "-l milliseconds the stand-in peers take to respond (default: 5)\n"
+    printf -- "-L milliseconds the stand-in orderers take to respond (default: 20)\n"
+    exit 12
+}
+
+while getopts :rf:c:p:o:l:L:h opt; do
+    case "$opt" in
+        r)    record=true
+              ;;
+        f)    recording_file="$OPTARG"
+              ;;
+        c)    datasources_file="$OPTARG"
+              ;;
+        p)    port="$OPTARG"
+              ;;
+        o)    port_offset="$OPTARG"
+              ;;
+        l)    latency="$OPTARG"
+              ;;
+        L)    orderer_latency="$OPTARG"
+              ;;
+        h)    _show_help
+              ;;
+        '?')  printf -- "Invalid option $OPTARG. Try '-h' for help.\n" && exit 12
+              ;;
+    esac
+done
+
+shift $((OPTIND-1))
+
+if [[ ! -f "$datasources_file" ]]; then
+    printf "Exiting: no datasources file ${datasources_file}, run setup.sh for the network first\n"
+    exit 1
+fi
+
+
+#
+# Start the Fabric stand-in
+#
+
+
+if [[ -n $record ]]; then
+    standin_options="--record"
+elif [[ ! -f "$recording_file" ]]; then
+    printf "Exiting: no recorded responses in ${recording_file}, record them with -r first\n"
+    exit 1
+fi
+
+node "${tests_dir}/standin/fabric-standin.js" --config "$datasources_file" --out "$standin_datasources_file" \
+    --recording "$recording_file" --port-offset "$port_offset" --latency "$latency" \
+    --orderer-latency "$orderer_latency" $standin_options &
+standin_pid=$!
+printf "Starting Fabric stand-in, PID: ${standin_pid}\n"
+sleep 3
+
+
+#
+# Start the Fabric SDK REST server
+#
+
+
+cd "${server_dir}"
+./fabric-rest-server -p "$port" -c "$standin_datasources_file"
+rest_server_pid=$(</tmp/.fabric-rest-server.pid)
+printf "Starting REST server, PID: ${rest_server_pid}\n"
+printf "Sleeping for 10s to allow the REST server to start up\n"
+sleep 10
+
+
+#
+# Run the benchmark
+#
+
+
+cd "${tests_dir}"
+join_peer_url="grpc://0.0.0.0:$((7051 + port_offset))"
+if [[ -n $record ]]; then
+    printf "Calling each endpoint once to record its responses\n"
+    python ./benchmark.py -p "$port" --requests 1 --concurrency 1 --warmup 0 --join-peer-url "$join_peer_url" "$@"
+else
+    python ./benchmark.py -p "$port" --join-peer-url "$join_peer_url" "$@"
+fi
+result=$?
+
+
+#
+# Stop the Fabric SDK REST server and the stand-in
+#
+
+
+printf "Stopping REST SDK server, PID: ${rest_server_pid}\n"
+kill -2 "$rest_server_pid"
+printf "Stopping Fabric stand-in, PID: ${standin_pid}\n"
+kill -2 "$standin_pid"
+wait "$standin_pid"
+
+exit $result
@@ -8,43 +8,607 @@
 #
 # Thin wrapper around the Fabric REST API.
 
+import collections
+import errno
 import json
+import os
+import random
+import socket
+import ssl
 import subprocess
+import threading
+import time
+
+try:
+    import http.client as httplib
+    from http.cookies import SimpleCookie
+except ImportError:  # Python 2
+    import httplib
+    from Cookie import SimpleCookie
+
+# Python 2 has no perf_counter.
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class FabricRestError(Exception):
+    """The REST server returned an error status for a streamed request."""
+
+    def __init__(self, status, body):
+        Exception.__init__(self, "REST server returned " + str(status) + ": " + str(body))
+        self.status = status
+        self.body = body
+
+
+class FabricRestBusy(FabricRestError):
+    """The REST server is too busy to take the request, and asked for it to be retried later."""
+
+    def __init__(self, body, retry_after):
+        FabricRestError.__init__(self, 429, body)
+        self.retry_after = retry_after
+
+
+def _retry_after(value):
+    """Seconds to wait from a Retry-After header value, or None if there is none."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _lines(read):
+    """Split the data returned by successive calls of read() into lines."""
+    pending = b""
+    while True:
+        data = read()
+        if not data:
+            break
+        pending += data
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def _error_body(data):
+    try:
+        return json.loads(data.decode("utf-8"))
+    except ValueError:
+        return data
+
+
+class CurlTransport:
+    """Transport that runs a curl process per request, sharing cookies through a file."""
+
+    def __init__(self, hostname, port, tls, cookies_file):
+        self.base_url = ("https" if tls else "http") + "://" + hostname + ":" + str(port)
+        self.cookies_file = cookies_file
+
+    def request(self, verb, endpoint, body=None, content_type="application/json", login=False):
+        """Send a request and return the response body.
+
+        body may be a string, or a file opened in binary mode to stream it to curl's stdin.
+        """
+        process_list, stdin = self._command(verb, endpoint, body, content_type, login)
+        # -i includes the response headers, to find a 429 and its Retry-After.
+        process_list[1:1] = ["-i"]
+        output = subprocess.check_output(process_list, stdin=stdin)
+        status, headers = 100, {}
+        # Skip any 1xx interim responses.
+        while status < 200 and output.startswith(b"HTTP/"):
+            head, _, output = output.partition(b"\r\n\r\n")
+            head_lines = head.decode("latin-1").split("\r\n")
+            status = int(head_lines[0].split()[1])
+            headers = {}
+            for line in head_lines[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if status == 429:
+            raise FabricRestBusy(_error_body(output), _retry_after(headers.get("retry-after")))
+        return output
+
+    def _command(self, verb, endpoint, body, content_type, login=False):
+        process_list = ["curl", "-k", "-s", "-X", verb.upper(), "--header", "Content-Type: " + content_type]
+        if login:
+            process_list.extend(["-c", self.cookies_file])
+        else:
+            process_list.extend(["-b", self.cookies_file])
+        stdin = None
+        if hasattr(body, "read"):
+            process_list.extend(["--data-binary", "@-"])
+            stdin = body
+        elif body:
+            process_list.extend(["-d", body])
+        process_list.append(self.base_url + endpoint)
+        return process_list, stdin
+
+    def stream(self, verb, endpoint, body=None, content_type="application/json"):
+        """Send a request, returning (headers, lines) as soon as the response headers arrive.
+
+        headers is a dict with lower case names and lines iterates over the lines of the
+        response body as they are received. Raises FabricRestError for an error status.
+        """
+        process_list, stdin = self._command(verb, endpoint, body, content_type)
+        # -N stops curl buffering the body, -D - writes the response headers before it.
+        process_list[1:1] = ["-N", "-D", "-"]
+        process = subprocess.Popen(process_list, stdin=stdin, stdout=subprocess.PIPE)
+        status, headers = 100, {}
+        # Skip any 1xx interim responses.
+        while status < 200:
+            status_line = process.stdout.readline()
+            if not status_line:
+                process.wait()
+                raise FabricRestError(0, "No response from " + self.base_url)
+            status = int(status_line.split()[1])
+            headers = {}
+            for line in iter(process.stdout.readline, b""):
+                line = line.decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if status >= 400:
+            data = process.stdout.read()
+            process.wait()
+            if status == 429:
+                raise FabricRestBusy(_error_body(data), _retry_after(headers.get("retry-after")))
+            raise FabricRestError(status, _error_body(data))
+
+        def lines():
+            try:
+                for line in iter(process.stdout.readline, b""):
+                    yield line.rstrip(b"\n")
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                process.wait()
+        return headers, lines()
+
+    def close(self):
+        pass
+
+
+class _HTTPSConnection(httplib.HTTPSConnection):
+    """HTTPSConnection that resumes the TLS session last negotiated by its pool."""
+
+    def __init__(self, host, port, pool, timeout):
+        httplib.HTTPSConnection.__init__(self, host, port, timeout=timeout, context=pool.ssl_context)
+        self._pool = pool
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        kwargs = {"server_hostname": self.host}
+        if self._pool.tls_session is not None:
+            kwargs["session"] = self._pool.tls_session
+        self.sock = self._pool.ssl_context.wrap_socket(sock, **kwargs)
+        # Remember the session so the next new connection can skip the full handshake.
+        if getattr(self.sock, "session", None) is not None:
+            self._pool.tls_session = self.sock.session
+
+
+# Verbs that can safely be sent again if the server may already have acted on them.
+_IDEMPOTENT = ("GET", "HEAD", "OPTIONS")
+
+# Seconds a pooled connection may be idle before it is closed rather than reused, less
+# than the REST server's keep-alive timeout of 5 seconds so it is not closed under us.
+_IDLE_TIMEOUT = 4.0
+
+
+def _no_response(err):
+    """True if err shows the server closed the connection without sending any of a response."""
+    remote_disconnected = getattr(httplib, "RemoteDisconnected", None)
+    if remote_disconnected is not None:
+        if isinstance(err, remote_disconnected):
+            return True
+    elif isinstance(err, httplib.BadStatusLine) and (not err.line or err.line.startswith("No status line")):
+        return True  # Python 2
+    if isinstance(err, socket.timeout):
+        return False
+    return getattr(err, "errno", None) in (errno.ECONNRESET, errno.EPIPE)
+
+
+class PooledTransport:
+    """In-process transport using a pool of keep-alive connections.
+
+    Connections are reused across requests, TLS sessions are resumed when a new
+    connection has to be opened, and cookies are held in memory instead of a file.
+    """
+
+    def __init__(self, hostname, port, tls, pool_size=8, timeout=60):
+        self.hostname = hostname
+        self.port = int(port)
+        self.tls = tls
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cookies = {}
+        self.tls_session = None
+        self.ssl_context = None
+        if tls:
+            # Match curl -k, the REST server is usually run with a self signed certificate.
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _new_connection(self):
+        if self.tls:
+            return _HTTPSConnection(self.hostname, self.port, self, self.timeout)
+        conn = httplib.HTTPConnection(self.hostname, self.port, timeout=self.timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _checkout(self):
+        """Get a connection, returning (conn, reused) where reused is True for an idle one."""
+        self._slots.acquire()
+        expired = []
+        try:
+            with self._lock:
+                while self._idle:
+                    conn, since = self._idle.pop()
+                    if _clock() - since < _IDLE_TIMEOUT:
+                        return conn, True
+                    expired.append(conn)
+        finally:
+            for conn in expired:
+                conn.close()
+        try:
+            return self._new_connection(), False
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.append((conn, _clock()))
+        else:
+            conn.close()
+        self._slots.release()
+
+    def _cookie_header(self):
+        with self._lock:
+            return "; ".join(name + "=" + value for name, value in self.cookies.items())
+
+    def _store_cookies(self, response):
+        if hasattr(response.msg, "get_all"):
+            headers = response.msg.get_all("Set-Cookie") or []
+        else:  # Python 2
+            headers = response.msg.getheaders("Set-Cookie")
+        for header in headers:
+            jar = SimpleCookie()
+            jar.load(header)
+            with self._lock:
+                for name, morsel in jar.items():
+                    self.cookies[name] = morsel.value
+
+    def _send(self, verb, endpoint, body, content_type, read):
+        """Send a request on a pooled connection, returning (conn, response, read(response)).
+
+        The caller must check the connection back in.
+        """
+        headers = {"Content-Type": content_type, "Connection": "keep-alive"}
+        cookie = self._cookie_header()
+        if cookie:
+            headers["Cookie"] = cookie
+        start = None
+        if hasattr(body, "read"):
+            start = body.tell()
+            headers["Content-Length"] = str(os.fstat(body.fileno()).st_size - start)
+        elif body is not None and not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        for attempt in (0, 1):
+            if start is not None:
+                body.seek(start)
+            conn, reused = self._checkout()
+            sent = False
+            try:
+                conn.request(verb.upper(), endpoint, body, headers)
+                sent = True
+                response = conn.getresponse()
+            except (httplib.HTTPException, socket.error) as err:
+                self._checkin(conn, False)
+                # A reused connection may have been closed by the server while idle, which fails
+                # before any of the response arrives. Send the request once more on a new
+                # connection, unless the server may have acted on it: a request that is not
+                # idempotent is never sent twice once it has been sent.
+                if attempt or not reused or not _no_response(err) or (sent and verb.upper() not in _IDEMPOTENT):
+                    raise
+                continue
+            try:
+                data = read(response)
+            except Exception:
+                self._checkin(conn, False)
+                raise
+            self._store_cookies(response)
+            return conn, response, data
+
+    def request(self, verb, endpoint, body=None, content_type="application/json", login=False):
+        """Send a request and return the response body.
+
+        body may be a string, or a file opened in binary mode which is streamed to the server.
+        """
+        conn, response, data = self._send(verb, endpoint, body, content_type, lambda response: response.read())
+        self._checkin(conn, not response.will_close)
+        if response.status == 429:
+            raise FabricRestBusy(_error_body(data), _retry_after(response.getheader("Retry-After")))
+        return data
+
+    def stream(self, verb, endpoint, body=None, content_type="application/json"):
+        """Send a request, returning (headers, lines) as soon as the response headers arrive.
+
+        headers is a dict with lower case names and lines iterates over the lines of the
+        response body as they are received. The connection is returned to the pool once
+        all the lines have been read. Raises FabricRestError for an error status.
+        """
+        conn, response, _ = self._send(verb, endpoint, body, content_type, lambda response: None)
+        if response.status >= 400:
+            data = response.read()
+            self._checkin(conn, not response.will_close)
+            if response.status == 429:
+                raise FabricRestBusy(_error_body(data), _retry_after(response.getheader("Retry-After")))
+            raise FabricRestError(response.status, _error_body(data))
+        headers = dict((name.lower(), value) for name, value in response.getheaders())
+        # read1 returns data as it arrives, Python 2 only has read.
+        read1 = getattr(response, "read1", None)
+        read = (lambda: read1(65536)) if read1 else (lambda: response.read(4096))
+
+        def lines():
+            complete = False
+            try:
+                for line in _lines(read):
+                    yield line
+                complete = True
+            finally:
+                self._checkin(conn, complete and not response.will_close)
+        return headers, lines()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+class _Prefetch(threading.Thread):
+    """Run a call in a background thread, keeping its result or exception."""
+
+    def __init__(self, call):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.call = call
+        self.result = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            self.result = self.call()
+        except Exception as error:
+            self.error = error
+
+    def get(self):
+        """Wait for the call to complete, returning its result or raising its exception."""
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class BlockView(object):
+    """A block's header and transaction summaries, loading the rest of the block only when needed.
+
+    The REST server can return just the "header" and "txids" of a block, which is all
+    that scanning a chain for block numbers, transaction IDs or validation codes needs.
+    The full block, with every envelope, endorsement and read-write set, is fetched by
+    calling loader the first time it is used, and then kept.
+    """
+    __slots__ = ("number", "header", "transactions", "_loader", "_block")
+
+    def __init__(self, header, txids, loader=None, block=None):
+        self.number = int(header["number"])
+        self.header = header
+        self.transactions = [TransactionView(self, index, summary) for index, summary in enumerate(txids)]
+        self._loader = loader
+        self._block = block
+
+    @classmethod
+    def from_block(cls, block):
+        """A view of a full block, as returned by query_block or query_ledger."""
+        metadata = block.get("metadata", {}).get("metadata") or []
+        flags = metadata[2] if len(metadata) > 2 and isinstance(metadata[2], list) else []
+        txids = []
+        for index, envelope in enumerate(block["data"]["data"]):
+            channel_header = envelope["payload"]["header"]["channel_header"]
+            txids.append({"tx_id": channel_header.get("tx_id"), "type": channel_header.get("type"),
+                          "timestamp": channel_header.get("timestamp"),
+                          "validation_code": flags[index] if index < len(flags) else None})
+        return cls(block["header"], txids, block=block)
+
+    @property
+    def block(self):
+        """The full block, fetched on first use."""
+        if self._block is None:
+            self._block = self._loader()
+            self._loader = None
+        return self._block
+
+    @property
+    def metadata(self):
+        return self.block["metadata"]
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(self.transactions)
+
+    def __repr__(self):
+        return "<BlockView %d, %d transactions>" % (self.number, len(self.transactions))
+
+
+class TransactionView(object):
+    """A transaction in a BlockView. Its envelope, read-write sets and signatures come from
+    the full block, so accessing them loads the block if it has not been already.
+    """
+    __slots__ = ("block_view", "index", "tx_id", "type", "timestamp", "validation_code", "_rwsets")
+
+    def __init__(self, block_view, index, summary):
+        self.block_view = block_view
+        self.index = index
+        self.tx_id = summary.get("tx_id")
+        self.type = summary.get("type")
+        self.timestamp = summary.get("timestamp")
+        self.validation_code = summary.get("validation_code")
+        self._rwsets = None
+
+    @property
+    def is_valid(self):
+        """True if the transaction was committed as valid, see VALID in ledger_index."""
+        return self.validation_code == 0
+
+    @property
+    def envelope(self):
+        return self.block_view.block["data"]["data"][self.index]
+
+    @property
+    def signature(self):
+        """The signature of the transaction's submitter over its payload."""
+        return self.envelope.get("signature")
+
+    @property
+    def creator(self):
+        """The identity that submitted the transaction."""
+        return self.envelope["payload"]["header"]["signature_header"].get("creator")
+
+    @property
+    def actions(self):
+        return self.envelope["payload"].get("data", {}).get("actions") or []
+
+    @property
+    def endorsements(self):
+        """The endorsements of each of the transaction's actions, in one list."""
+        endorsements = []
+        for action in self.actions:
+            try:
+                endorsements.extend(action["payload"]["action"]["endorsements"] or [])
+            except (KeyError, TypeError):
+                continue
+        return endorsements
+
+    @property
+    def rwsets(self):
+        """A list of (namespace, rwset) for each chaincode the transaction read or wrote."""
+        if self._rwsets is None:
+            rwsets = []
+            for action in self.actions:
+                try:
+                    ns_rwsets = action["payload"]["action"]["proposal_response_payload"]["extension"]["results"]["ns_rwset"]
+                except (KeyError, TypeError):
+                    continue
+                for ns_rwset in ns_rwsets:
+                    rwsets.append((ns_rwset["namespace"], ns_rwset.get("rwset", {})))
+            self._rwsets = rwsets
+        return self._rwsets
+
+    def __repr__(self):
+        return "<TransactionView %s in block %d>" % (self.tx_id, self.block_view.number)
 
 
 class FabricRest:
     """A thin wrapper around the Fabric REST API."""
     COOKIES_FILE="cookies.txt"
 
-    def __init__(self, hostname="localhost", port="3000", tls=False, authenticate=False):
+    def __init__(self, hostname="localhost", port="3000", tls=False, authenticate=False, transport="pooled", pool_size=8,
+                 retries=3):
+        """Create a client for the REST server.
+
+        transport is "pooled" (default) to use in-process keep-alive connections, or
+        "curl" to start a curl process per request as earlier versions did. A request
+        the REST server is too busy for is retried up to retries times.
+        """
         self.hostname = hostname
         self.port = port
         self.tls = tls
+        self.retries = retries
+        self.timing_hooks = []
+        if transport == "curl":
+            self.transport = CurlTransport(hostname, port, tls, FabricRest.COOKIES_FILE)
+        elif transport == "pooled":
+            self.transport = PooledTransport(hostname, port, tls, pool_size)
+        else:
+            raise ValueError("Unknown transport: " + str(transport))
         if authenticate:
             self._call_endpoint("POST", "/auth/ldap", authenticate=True)
 
-    def _call_endpoint(self, verb, endpoint, data=None, authenticate=False):
+    def close(self):
+        """Release any connections held by the transport."""
+        self.transport.close()
+
+    def add_timing_hook(self, hook):
+        """Call hook(verb, endpoint, seconds, error) after every request.
+
+        seconds is the client side latency of the request, to compare with the REST
+        server's /metrics, and error is the exception raised or None.
+        """
+        self.timing_hooks.append(hook)
+
+    def _timed(self, verb, endpoint, start, error):
+        seconds = _clock() - start
+        for hook in self.timing_hooks:
+            hook(verb, endpoint, seconds, error)
+
+    def _backoff(self, attempt, retry_after):
+        """Seconds to wait before retrying a request the REST server was too busy for.
+
+        At least the Retry-After the server asked for, plus a random amount growing with
+        each attempt so that clients turned away together don't all retry together.
+        """
+        return (retry_after or 0) + random.uniform(0, min(30, 0.5 * 2 ** attempt))
+
+    def _retry(self, call, body=None):
+        """Return call(), retrying with backoff while it raises FabricRestBusy."""
+        start = body.tell() if hasattr(body, "seek") else None
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except FabricRestBusy as e:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self._backoff(attempt, e.retry_after))
+                attempt += 1
+                if start is not None:
+                    body.seek(start)
+
+    def _call_endpoint(self, verb, endpoint, data=None, authenticate=False, content_type="application/json"):
         """Call a REST endpoint, returning a dict representation of the returned JSON."""
-        url = "http"
-        if self.tls:
-            url += "s"
-        url += "://" + self.hostname + ":" + self.port + endpoint
-        process_list = ["curl", "-k", "-s", "-X", verb.upper(), "--header"]
-        if authenticate:
-            process_list.append("Content-Type: application/x-www-form-urlencoded")
-            process_list.extend(["-d", "username=alice&password=secret"])
-            process_list.extend(["-c", FabricRest.COOKIES_FILE])
-        else:
-            process_list.append("Content-Type: application/json")
-            process_list.extend(["-b", FabricRest.COOKIES_FILE])
-        if data:
-            process_list.extend(["-d", data])
-        process_list.append(url)
-        process_output = subprocess.check_output(process_list)
+        start = _clock()
+        error = None
         try:
-            return json.loads(process_output)
+            if authenticate:
+                response = self._retry(lambda: self.transport.request(verb, endpoint, "username=alice&password=secret",
+                                                                      "application/x-www-form-urlencoded", login=True))
+            else:
+                response = self._retry(lambda: self.transport.request(verb, endpoint, data, content_type), data)
+        except FabricRestBusy as e:
+            # Still busy after the retries, return the error like any other.
+            error = e
+            return e.body
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._timed(verb, endpoint, start, error)
+        try:
+            return json.loads(response)
         except ValueError:
-            return process_output
+            return response
 
     # GET /fabric/1_0/channels
     def get_channels(self):
@@ -69,6 +633,19 @@ class FabricRest:
         data='{"chaincodeId":"'+chaincode_id+'","chaincodePath":"'+ chaincode_path+'","chaincodeVersion":"'+ chaincode_version+'"}'
         return self._call_endpoint("POST", url, data)
 
+    # POST /fabric/1_0/chaincodes
+    def install_chaincode_package(self, chaincode_id, chaincode_path, package_file, chaincode_version, peers):
+        """Install chaincode onto the named peers, streaming the package archive from a file"""
+        url = "/api/fabric/1_0/chaincodes?" + self._package_query(chaincode_id, chaincode_path, chaincode_version, peers)
+        with open(package_file, "rb") as archive:
+            return self._call_endpoint("POST", url, archive, content_type="application/octet-stream")
+
+    def _package_query(self, chaincode_id, chaincode_path, chaincode_version, peers):
+        query = "chaincodeId=" + chaincode_id + "&chaincodePath=" + chaincode_path + "&chaincodeVersion=" + chaincode_version
+        if peers:
+            query += "&peers=" + peers
+        return query
+
     # GET /fabric/1_0/chaincodes/{id}
     def query_chaincode(self, chaincode_id, peers):
         """Query chaincode installed on a peer by ID"""
@@ -78,9 +655,10 @@ class FabricRest:
         return self._call_endpoint("GET", url)
 
     # GET /fabric/1_0/channels/{channelName}
-    def get_channel_info(self):
+    def get_channel_info(self, channel_name):
         """Get information about the named channel"""
-        pass
+        url = "/api/fabric/1_0/channels/" + channel_name
+        return self._call_endpoint("GET", url)
 
     # PUT /fabric/1_0/channels/{channelName}
     def update_channel(self, channel_name, channel_config_base64):
@@ -97,19 +675,106 @@ class FabricRest:
         return self._call_endpoint("POST", url, data)
 
     # GET /fabric/1_0/channels/{channelName}/blocks
-    def query_block(self):
-        """Query a block on a channel by ID or Hash"""
-        pass
+    def query_block(self, channel, block_id=None, block_hash=None, fields=None):
+        """Query a block on a channel by ID or Hash.
+
+        fields is an optional comma separated list of the parts of the block to return,
+        of "header", "txids", "data" and "metadata". "txids" summarizes each transaction
+        with its tx_id, type, timestamp and validation_code.
+        """
+        url = "/api/fabric/1_0/channels/" + channel + "/blocks?"
+        if block_id is not None:
+            url += "blockId=" + str(block_id)
+        if block_hash:
+            url += "blockHash=" + block_hash
+        if fields:
+            url += "&fields=" + fields
+        result = self._call_endpoint("GET", url)
+        if not isinstance(result, dict) or "error" in result:
+            error = result.get("error", {}) if isinstance(result, dict) else {}
+            raise FabricRestError(error.get("statusCode", 0), result)
+        return result
+
+    # GET /fabric/1_0/channels/{channelName}/blocks/range
+    def query_block_range(self, channel, start, end=None, fields=None):
+        """Query a range of blocks on a channel.
+
+        Returns a dict with the "blocks" from start to end, stopping at the end of the
+        chain, and the chain's "height". The server limits the size of a range, 100
+        blocks by default. fields selects the parts of each block, as for query_block.
+        """
+        url = "/api/fabric/1_0/channels/" + channel + "/blocks/range?start=" + str(start)
+        if end is not None:
+            url += "&end=" + str(end)
+        if fields:
+            url += "&fields=" + fields
+        result = self._call_endpoint("GET", url)
+        if not isinstance(result, dict) or "blocks" not in result:
+            error = result.get("error", {}) if isinstance(result, dict) else {}
+            raise FabricRestError(error.get("statusCode", 0), result)
+        return result
+
+    def iter_blocks(self, channel, start=0, end=None, batch_size=50, window=4, follow=False, poll_interval=1.0,
+                    fields=None):
+        """Yield the blocks on a channel in order, from start to end.
+
+        Blocks are fetched batch_size at a time, with up to window batches requested
+        concurrently ahead of the block being yielded. Without an end the blocks are
+        yielded up to the current end of the chain. If follow is set, rather than
+        stopping at the end of the chain, wait for new blocks to be committed, checking
+        every poll_interval seconds. fields selects the parts of each block, as for
+        query_block.
+        """
+        pending = collections.deque()
+        next_start = start
+        while True:
+            while len(pending) < window and (end is None or next_start <= end):
+                last = next_start + batch_size - 1
+                if end is not None:
+                    last = min(last, end)
+                fetch = _Prefetch(lambda first=next_start, last=last:
+                                  self.query_block_range(channel, first, last, fields))
+                pending.append((next_start, last, fetch))
+                next_start = last + 1
+            if not pending:
+                return
+            first, last, fetch = pending.popleft()
+            blocks = fetch.get()["blocks"]
+            for block in blocks:
+                yield block
+            if first + len(blocks) <= last:
+                # Reached the end of the chain, batches prefetched beyond it are incomplete.
+                pending.clear()
+                next_start = first + len(blocks)
+                if not follow:
+                    return
+                if not blocks:
+                    time.sleep(poll_interval)
+
+    def iter_block_views(self, channel, start=0, end=None, batch_size=50, window=4, follow=False, poll_interval=1.0):
+        """Yield a BlockView of each block on a channel in order, as for iter_blocks.
+
+        Only the header and transaction summaries of each block are fetched, the rest of
+        a block is fetched if its envelopes, read-write sets or signatures are used.
+        """
+        for block in self.iter_blocks(channel, start, end, batch_size, window, follow, poll_interval,
+                                      fields="header,txids"):
+            number = int(block["header"]["number"])
+            yield BlockView(block["header"], block["txids"],
+                            loader=lambda number=number: self.query_block(channel, block_id=number))
 
     # GET /fabric/1_0/channels/{channelName}/chaincodes
-    def query_all_chaincode(self):
+    def query_all_chaincode(self, channel_name):
         """Query all chaincode instantiated on the channel"""
-        pass
+        url = "/api/fabric/1_0/channels/" + channel_name + "/chaincodes"
+        return self._call_endpoint("GET", url)
 
     # PUT /fabric/1_0/channels/{channelName}/chaincodes
-    def init_updated_chaincode(self):
+    def init_updated_chaincode(self, channel_name, chaincode_id, chaincode_version):
         """Instantiate updated chaincode in the channel for the named peers"""
-        pass
+        url = "/api/fabric/1_0/channels/" + channel_name + "/chaincodes?peers=%5B0%5D"
+        data = '{"chaincodeId":"' + chaincode_id + '","chaincodeVersion":"' + chaincode_version + '"}'
+        return self._call_endpoint("PUT", url, data)
 
     # POST /fabric/1_0/channels/{channelName}/chaincodes
     def instantiate_chaincode(self,channel_name,chaincode_id,chaincode_version):
@@ -119,14 +784,23 @@ class FabricRest:
         return self._call_endpoint("POST", url, data)
 
     # GET /fabric/1_0/channels/{channelName}/chaincodes/{id}
-    def query_channel_chaincode(self):
+    def query_channel_chaincode(self, channel_name, chaincode_id):
         """Query chaincode instantiated on a channel by ID"""
-        pass
+        url = "/api/fabric/1_0/channels/" + channel_name + "/chaincodes/" + chaincode_id
+        return self._call_endpoint("GET", url)
 
     # POST /fabric/1_0/channels/{channelName}/endorse
-    def send_proposal(self):
-        """Send a proposal to the channel's peers. This could be for either chaincode or a transaction."""
-        pass
+    def send_proposal(self, channel, data, peers=None):
+        """Send a proposal to the channel's peers. This could be for either chaincode or a transaction.
+
+        data is the JSON request body, as for commit_transaction. The result includes the
+        peerResponses and a "handle" that commits the endorsed proposal when passed to
+        commit_transaction before the result's "expires" time.
+        """
+        url = "/api/fabric/1_0/channels/" + channel + "/endorse"
+        if peers:
+            url += "?peers=" + peers
+        return self._call_endpoint("POST", url, data)
 
     # POST /fabric/1_0/channels/{channelName}/ledger
     def query_ledger(self, channel, data=None, chaincode_id=None, block_id=None, block_hash=None, txn_id=None):
@@ -146,6 +820,60 @@ class FabricRest:
             url += "txnId=" + txn_id
         return self._call_endpoint("POST", url, data)
 
+    # POST /fabric/1_0/channels/{channelName}/ledger/batch
+    def query_ledger_many(self, channel, queries):
+        """Run many queries of the channel's ledger in one request.
+
+        Each query is a dict of keyword arguments for query_ledger, e.g.
+        {"chaincode_id": "fabcar", "data": '{"fcn":"queryCar","args":["CAR4"]}'} or
+        {"block_id": "3"}. Returns a list with, for each query in order, a dict with its
+        "status" and either its "data" or an "error" message.
+        """
+        batch = []
+        for query in queries:
+            descriptor = {}
+            data = query.get("data")
+            if data:
+                descriptor.update(data if isinstance(data, dict) else json.loads(data))
+            if query.get("chaincode_id"):
+                descriptor["chaincodeId"] = query["chaincode_id"]
+            if query.get("block_id") is not None:
+                descriptor["blockId"] = int(query["block_id"])
+            if query.get("block_hash"):
+                descriptor["blockHash"] = query["block_hash"]
+            if query.get("txn_id"):
+                descriptor["txnId"] = query["txn_id"]
+            batch.append(descriptor)
+        url = "/api/fabric/1_0/channels/" + channel + "/ledger/batch"
+        return self._call_endpoint("POST", url, json.dumps(batch))
+
+    # POST /fabric/1_0/channels/{channelName}/ledger/stream
+    def iter_query_results(self, channel, chaincode_id, data, page_size=None):
+        """Query the channel's ledger by chaincode, yielding each record of the result.
+
+        Records are parsed as they arrive rather than once the whole result has been
+        received. If page_size is set the records are fetched that many at a time,
+        following the bookmark returned with each page.
+        """
+        bookmark = None
+        while True:
+            url = self._stream_url(channel, chaincode_id, page_size, bookmark)
+            headers, lines = self._retry(lambda: self.transport.stream("POST", url, data))
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line.decode("utf-8"))
+            bookmark = headers.get("x-fabric-bookmark")
+            if not bookmark:
+                return
+
+    def _stream_url(self, channel, chaincode_id, page_size, bookmark):
+        url = "/api/fabric/1_0/channels/" + channel + "/ledger/stream?chaincodeId=" + chaincode_id
+        if page_size:
+            url += "&pageSize=" + str(page_size)
+        if bookmark:
+            url += "&bookmark=" + bookmark
+        return url
+
     # POST /fabric/1_0/channels/{channelName}/peers
     def join_channel(self, channel_name, peer_data):
         """Join a channel"""
@@ -153,12 +881,23 @@ class FabricRest:
         return self._call_endpoint("POST", url, peer_data)
 
     # POST /fabric/1_0/channels/{channelName}/transactions
-    def commit_transaction(self,channel,data):
-        """Commit a transaction, if no proposal responses propose and commit."""
+    def commit_transaction(self,channel,data=None,wait_for_commit=False,handle=None):
+        """Commit a transaction, if no proposal responses propose and commit.
+
+        If handle is given, commit the proposal endorsed by send_proposal that returned
+        it instead of sending data. If wait_for_commit is set the response is returned
+        once a peer has committed the transaction, and includes its commitStatus and
+        blockNumber.
+        """
+        if handle is not None:
+            data = json.dumps({"handle": handle})
         url = "/api/fabric/1_0/channels/" + channel + "/transactions"
+        if wait_for_commit:
+            url += "?waitForCommit=true"
         return self._call_endpoint("POST", url, data)
 
     # GET /fabric/1_0/channels/{channelName}/transactions/{transactionID}
-    def query_transaction(self):
+    def query_transaction(self, channel_name, transaction_id):
         """Query a transaction on a channel by ID"""
-        pass
+        url = "/api/fabric/1_0/channels/" + channel_name + "/transactions/" + transaction_id
+        return self._call_endpoint("GET", url)
@@ -155,8 +155,6 @@ fi
 #
 
 
-printf "Wait 5 seconds to allow fabcar to finish initializing\n"
-sleep 5
 python ./test_fabcar.py -p "$port"
 if [[ $? -eq 0 ]]; then # Error response was found
   result_test2="PASSED"
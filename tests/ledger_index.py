@@ -0,0 +1,187 @@
+#
+# Copyright IBM Corp. All Rights Reserved.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+# Ledger Index
+#
+# A local SQLite index of a channel's ledger, built by tailing its blocks through the
+# REST server, so transactions and key histories can be looked up without asking a peer.
+
+import argparse
+import sqlite3
+
+from fabric_rest import FabricRest
+
+# Validation code of a valid transaction, see TxValidationCode in the Fabric protos.
+VALID = 0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint (
+    channel TEXT PRIMARY KEY,
+    next_block INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    channel TEXT NOT NULL,
+    tx_id TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    tx_index INTEGER NOT NULL,
+    validation_code INTEGER,
+    timestamp TEXT,
+    PRIMARY KEY (channel, tx_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    channel TEXT NOT NULL,
+    chaincode TEXT NOT NULL,
+    key TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    tx_index INTEGER NOT NULL,
+    tx_id TEXT NOT NULL,
+    value TEXT,
+    is_delete INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS writes_by_key ON writes (channel, chaincode, key, block_number, tx_index);
+CREATE TABLE IF NOT EXISTS latest (
+    channel TEXT NOT NULL,
+    chaincode TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    is_delete INTEGER NOT NULL,
+    block_number INTEGER NOT NULL,
+    tx_id TEXT NOT NULL,
+    PRIMARY KEY (channel, chaincode, key)
+);
+"""
+
+
+def _transaction_writes(envelope):
+    """Yield (chaincode, write) for each key written by a transaction envelope."""
+    actions = envelope["payload"].get("data", {}).get("actions") or []
+    for action in actions:
+        try:
+            ns_rwsets = action["payload"]["action"]["proposal_response_payload"]["extension"]["results"]["ns_rwset"]
+        except (KeyError, TypeError):
+            continue
+        for ns_rwset in ns_rwsets:
+            for write in ns_rwset.get("rwset", {}).get("writes") or []:
+                yield ns_rwset["namespace"], write
+
+
+class LedgerIndex(object):
+    """An on-disk index of the transactions and key writes on a channel.
+
+    update() reads the blocks committed since the last update and adds them to the
+    index, one SQLite transaction per block together with the checkpoint of the next
+    block to read, so an interrupted update resumes where it stopped. Only writes by
+    valid transactions are indexed, as in the peer's history database.
+    """
+
+    def __init__(self, path, channel):
+        self.channel = channel
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def next_block(self):
+        """The number of the next block to index."""
+        row = self.db.execute("SELECT next_block FROM checkpoint WHERE channel = ?", (self.channel,)).fetchone()
+        return row["next_block"] if row else 0
+
+    def add_block(self, block):
+        """Index a block, as returned by the REST server, and move the checkpoint past it."""
+        number = int(block["header"]["number"])
+        metadata = block.get("metadata", {}).get("metadata") or []
+        flags = metadata[2] if len(metadata) > 2 and isinstance(metadata[2], list) else []
+        with self.db:
+            for tx_index, envelope in enumerate(block["data"]["data"]):
+                channel_header = envelope["payload"]["header"]["channel_header"]
+                tx_id = channel_header.get("tx_id")
+                if not tx_id:
+                    continue
+                code = flags[tx_index] if tx_index < len(flags) else None
+                # A transaction ID is only committed once, a later envelope with the same ID is
+                # rejected as a duplicate and must not replace the original.
+                self.db.execute("INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+                                (self.channel, tx_id, number, tx_index, code, channel_header.get("timestamp")))
+                if code not in (VALID, None):
+                    continue
+                for chaincode, write in _transaction_writes(envelope):
+                    is_delete = 1 if write.get("is_delete") else 0
+                    value = None if is_delete else write.get("value")
+                    self.db.execute("INSERT INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (self.channel, chaincode, write["key"], number, tx_index, tx_id, value, is_delete))
+                    self.db.execute("INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (self.channel, chaincode, write["key"], value, is_delete, number, tx_id))
+            self.db.execute("INSERT OR REPLACE INTO checkpoint VALUES (?, ?)", (self.channel, number + 1))
+
+    def update(self, restserver, follow=False, poll_interval=1.0, batch_size=50):
+        """Index the blocks committed since the checkpoint, returning the number indexed.
+
+        If follow is set, keep indexing new blocks as they are committed instead of
+        returning at the end of the chain.
+        """
+        count = 0
+        for block in restserver.iter_blocks(self.channel, start=self.next_block(), batch_size=batch_size,
+                                            follow=follow, poll_interval=poll_interval):
+            self.add_block(block)
+            count += 1
+        return count
+
+    def transaction(self, tx_id):
+        """The block_number, tx_index, validation_code and timestamp of a transaction, or None."""
+        row = self.db.execute("SELECT block_number, tx_index, validation_code, timestamp FROM transactions"
+                              " WHERE channel = ? AND tx_id = ?", (self.channel, tx_id)).fetchone()
+        return dict(row) if row else None
+
+    def latest(self, chaincode, key):
+        """The latest value of a key with the block_number and tx_id that wrote it, or None.
+
+        A deleted key has a value of None and is_delete set.
+        """
+        row = self.db.execute("SELECT value, is_delete, block_number, tx_id FROM latest"
+                              " WHERE channel = ? AND chaincode = ? AND key = ?",
+                              (self.channel, chaincode, key)).fetchone()
+        if not row:
+            return None
+        result = dict(row)
+        result["is_delete"] = bool(result["is_delete"])
+        return result
+
+    def history(self, chaincode, key):
+        """The writes to a key, oldest first, each with its value, is_delete, block_number and tx_id."""
+        rows = self.db.execute("SELECT value, is_delete, block_number, tx_id FROM writes"
+                               " WHERE channel = ? AND chaincode = ? AND key = ?"
+                               " ORDER BY block_number, tx_index",
+                               (self.channel, chaincode, key)).fetchall()
+        history = []
+        for row in rows:
+            write = dict(row)
+            write["is_delete"] = bool(write["is_delete"])
+            history.append(write)
+        return history
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index a channel's ledger into a SQLite database")
+    parser.add_argument('--tls', '-t', help='Enable TLS', action='store_true', default=False)
+    parser.add_argument('--hostname', '-n', help='Hostname of SDK REST server to connect to', default='localhost')
+    parser.add_argument('--port', '-p', help='Port of SDK REST server to connect on', default='3000')
+    parser.add_argument('--channel', '-c', help='Channel to index', default='mychannel')
+    parser.add_argument('--database', '-d', help='SQLite database file to write the index to', default='ledger.db')
+    parser.add_argument('--follow', '-f', help='Keep indexing new blocks as they are committed', action='store_true',
+                        default=False)
+    args = parser.parse_args()
+
+    restserver = FabricRest(args.hostname, args.port, args.tls)
+    index = LedgerIndex(args.database, args.channel)
+    try:
+        print("Indexed %d blocks of %s" % (index.update(restserver, follow=args.follow), args.channel))
+    except KeyboardInterrupt:
+        print("Stopped, the next block to index is %d" % index.next_block())
+    finally:
+        index.close()
+        restserver.close()
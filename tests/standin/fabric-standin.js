@@ -0,0 +1,350 @@
+//
+// Copyright IBM Corp. All Rights Reserved.
+//
+// SPDX-License-Identifier: Apache-2.0
+//
+
+// Fabric stand-in
+//
+// Serves the peer and orderer gRPC APIs the REST server uses, answering from
+// responses recorded from a real network after a configurable latency, so the
+// REST server can be run and benchmarked without a Fabric network.
+//
+// Record the responses of a running network, proxying to its peers and orderers:
+//   node fabric-standin.js --config datasources.json --record --port-offset 10000 \
+//     --out standin-datasources.json --recording recording.json
+// Replay them, listening on the same ports:
+//   node fabric-standin.js --config datasources.json --port-offset 10000 \
+//     --out standin-datasources.json --recording recording.json --latency 5
+//
+// The REST server is pointed at the stand-in by the datasources file written to
+// --out. Requests and responses are recorded as the bytes sent over gRPC, so the
+// REST server does all its usual work to build, sign and decode them.
+
+'use strict';
+
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+
+// fabric-client, and the grpc module it uses, are installed with the connector.
+var connectorModules = path.join(__dirname, '..', '..', 'packages', 'loopback-connector-fabric', 'node_modules');
+module.paths.unshift(connectorModules, path.join(connectorModules, 'fabric-client', 'node_modules'));
+const grpc = require('grpc');
+
+var protosDir = path.join(path.dirname(require.resolve('fabric-client/package.json')), 'lib', 'protos');
+var loadProto = function(file){
+  return grpc.load(path.join(protosDir, file));
+};
+var proposalProto = loadProto('peer/proposal.proto').protos;
+var responseProto = loadProto('peer/proposal_response.proto').protos;
+var chaincodeProto = loadProto('peer/chaincode.proto').protos;
+var commonProto = loadProto('common/common.proto').common;
+var abProto = loadProto('orderer/ab.proto').orderer;
+
+/**
+* Parse --name value and --flag arguments.
+*/
+var parseArgs = function(argv){
+  var args = {};
+  for(var i = 0; i < argv.length; i++){
+    if(!argv[i].startsWith('--')) continue;
+    var name = argv[i].slice(2);
+    if(i + 1 < argv.length && !argv[i + 1].startsWith('--')){
+      args[name] = argv[++i];
+    } else {
+      args[name] = true;
+    }
+  }
+  return args;
+};
+
+// Messages are passed through as the bytes sent over gRPC, they are only decoded to
+// find which recorded response answers a request.
+var passThrough = function(buffer){ return buffer; };
+var method = function(methodPath, stream){
+  return {
+    path: methodPath,
+    requestStream: stream,
+    responseStream: stream,
+    requestSerialize: passThrough,
+    requestDeserialize: passThrough,
+    responseSerialize: passThrough,
+    responseDeserialize: passThrough
+  };
+};
+var endorserService = {
+  processProposal: method('/protos.Endorser/ProcessProposal', false)
+};
+var broadcastService = {
+  broadcast: method('/orderer.AtomicBroadcast/Broadcast', true),
+  deliver: method('/orderer.AtomicBroadcast/Deliver', true)
+};
+
+/**
+* The channel, chaincode, function and arguments of a signed proposal.
+*/
+var describeProposal = function(signedProposalBytes){
+  var signedProposal = proposalProto.SignedProposal.decode(signedProposalBytes);
+  var proposal = proposalProto.Proposal.decode(signedProposal.proposal_bytes);
+  var header = commonProto.Header.decode(proposal.header);
+  var channelHeader = commonProto.ChannelHeader.decode(header.channel_header);
+  var payload = proposalProto.ChaincodeProposalPayload.decode(proposal.payload);
+  var spec = chaincodeProto.ChaincodeInvocationSpec.decode(payload.input).chaincode_spec;
+  var args = spec.input.args.map((arg)=>arg.toBuffer());
+  return {
+    channel: channelHeader.channel_id,
+    chaincode: spec.chaincode_id.name,
+    fcn: (args.length > 0 ? args[0].toString() : ''),
+    args: args
+  };
+};
+
+/**
+* The channel an envelope sent to an orderer is for.
+*/
+var envelopeChannel = function(envelopeBytes){
+  var envelope = commonProto.Envelope.decode(envelopeBytes);
+  var payload = commonProto.Payload.decode(envelope.payload);
+  return commonProto.ChannelHeader.decode(payload.header.channel_header).channel_id;
+};
+
+/**
+* Responses recorded from a network, as base64 gRPC messages. A proposal is answered
+* by the response recorded for the same arguments if there is one, or else by the
+* last response recorded for the same chaincode function, so e.g. a query for any
+* block number is answered with a recorded block.
+*/
+class Recording {
+
+  constructor(file){
+    this.file = file;
+    this.proposals = {};
+    this.functions = {};
+    this.deliver = {};
+    if(fs.existsSync(file)){
+      var saved = JSON.parse(fs.readFileSync(file, 'utf-8'));
+      this.proposals = saved.proposals || {};
+      this.functions = saved.functions || {};
+      this.deliver = saved.deliver || {};
+    }
+  };
+
+  static exactKey(description){
+    var hash = crypto.createHash('sha256');
+    description.args.forEach((arg)=>{
+      hash.update(String(arg.length) + ':');
+      hash.update(arg);
+    });
+    return description.channel + '/' + description.chaincode + '/' + hash.digest('hex');
+  };
+
+  static functionKey(description){
+    return description.channel + '/' + description.chaincode + '/' + description.fcn;
+  };
+
+  addProposal(description, response){
+    var encoded = response.toString('base64');
+    this.proposals[Recording.exactKey(description)] = encoded;
+    this.functions[Recording.functionKey(description)] = encoded;
+  };
+
+  proposalResponse(description){
+    var encoded = this.proposals[Recording.exactKey(description)] ||
+                  this.functions[Recording.functionKey(description)];
+    if(encoded !== undefined) return Buffer.from(encoded, 'base64');
+    return new responseProto.ProposalResponse({
+      response: { status: 500, message: 'No response recorded for ' + Recording.functionKey(description) }
+    }).toBuffer();
+  };
+
+  save(){
+    var saved = { proposals: this.proposals, functions: this.functions, deliver: this.deliver };
+    fs.writeFileSync(this.file, JSON.stringify(saved, null, 1));
+    console.log('Saved ' + Object.keys(this.proposals).length + ' proposal responses to ' + this.file);
+  };
+};
+
+/**
+* Wait latency milliseconds, plus up to jitter more chosen at random.
+*/
+var delay = function(latency, jitter){
+  var ms = latency + jitter * Math.random();
+  return new Promise((resolve)=>setTimeout(resolve, ms));
+};
+
+var address = function(url){
+  return url.replace(/^grpcs?:\/\//, '');
+};
+
+/**
+* Credentials and options to connect to a configured peer or orderer.
+*/
+var upstreamCredentials = function(settings, remote, url){
+  if(!url.startsWith('grpcs://')) return { credentials: grpc.credentials.createInsecure(), options: {} };
+  var pemFile = remote.tls_cacerts || remote.CACertFile;
+  if(!pemFile && remote.orgIndex !== undefined) pemFile = settings.orgs[remote.orgIndex].CACertFile;
+  var options = {};
+  if(remote.hostname){
+    options['grpc.ssl_target_name_override'] = remote.hostname;
+    options['grpc.default_authority'] = remote.hostname;
+  }
+  return { credentials: grpc.credentials.createSsl(fs.readFileSync(pemFile)), options: options };
+};
+
+/**
+* Proxy a bidirectional stream to upstream, passing each response to onResponse
+* before sending it on.
+*/
+var proxyStream = function(call, upstream, onResponse){
+  upstream.on('data', (response)=>{
+    onResponse(response);
+    call.write(response);
+  });
+  upstream.on('end', ()=>call.end());
+  upstream.on('error', (err)=>call.emit('error', err));
+  call.on('data', (request)=>upstream.write(request));
+  call.on('end', ()=>upstream.end());
+};
+
+/**
+* Start a stand-in peer, listening on listenUrl.
+*/
+var startPeer = function(settings, aPeer, listenUrl, recording, options){
+  var server = new grpc.Server();
+  var upstream;
+  if(options.record){
+    var creds = upstreamCredentials(settings, aPeer, aPeer.requestURL);
+    var Endorser = grpc.makeGenericClientConstructor(endorserService);
+    upstream = new Endorser(address(aPeer.requestURL), creds.credentials, creds.options);
+  }
+  server.addService(endorserService, {
+    processProposal: (call, callback)=>{
+      var description;
+      try {
+        description = describeProposal(call.request);
+      } catch(err) {
+        return callback(err);
+      }
+      if(upstream !== undefined){
+        upstream.processProposal(call.request, (err, response)=>{
+          if(!err) recording.addProposal(description, response);
+          callback(err, response);
+        });
+      } else {
+        delay(options.latency, options.jitter).then(()=>callback(null, recording.proposalResponse(description)));
+      }
+    }
+  });
+  server.bind(address(listenUrl), grpc.ServerCredentials.createInsecure());
+  server.start();
+  console.log('Stand-in peer for ' + aPeer.requestURL + ' listening on ' + listenUrl);
+  return server;
+};
+
+/**
+* Start a stand-in orderer, listening on listenUrl. Broadcasts always succeed when
+* replaying; deliver requests, used to fetch a channel's genesis block, are
+* answered with the responses recorded for the channel.
+*/
+var startOrderer = function(settings, anOrderer, listenUrl, recording, options){
+  var server = new grpc.Server();
+  var upstream;
+  if(options.record){
+    var creds = upstreamCredentials(settings, anOrderer, anOrderer.url);
+    var AtomicBroadcast = grpc.makeGenericClientConstructor(broadcastService);
+    upstream = new AtomicBroadcast(address(anOrderer.url), creds.credentials, creds.options);
+  }
+  var success = new abProto.BroadcastResponse({ status: 200 }).toBuffer();
+  var notFound = new abProto.DeliverResponse({ status: 404 }).toBuffer();
+  server.addService(broadcastService, {
+    broadcast: (call)=>{
+      if(upstream !== undefined) return proxyStream(call, upstream.broadcast(), ()=>{});
+      call.on('data', ()=>{
+        delay(options.ordererLatency, options.jitter).then(()=>call.write(success));
+      });
+      call.on('end', ()=>{
+        delay(options.ordererLatency, options.jitter).then(()=>call.end());
+      });
+    },
+    deliver: (call)=>{
+      if(upstream !== undefined){
+        var recorded = [];
+        call.once('data', (envelope)=>{
+          try {
+            recording.deliver[envelopeChannel(envelope)] = recorded;
+          } catch(err) {
+            console.error('Could not decode deliver request: ' + err.message);
+          }
+        });
+        return proxyStream(call, upstream.deliver(), (response)=>recorded.push(response.toString('base64')));
+      }
+      call.on('data', (envelope)=>{
+        var responses = (recording.deliver[envelopeChannel(envelope)] || []).map((encoded)=>Buffer.from(encoded, 'base64'));
+        if(responses.length == 0) responses = [notFound];
+        delay(options.ordererLatency, options.jitter).then(()=>responses.forEach((response)=>call.write(response)));
+      });
+      call.on('end', ()=>call.end());
+    }
+  });
+  server.bind(address(listenUrl), grpc.ServerCredentials.createInsecure());
+  server.start();
+  console.log('Stand-in orderer for ' + anOrderer.url + ' listening on ' + listenUrl);
+  return server;
+};
+
+/**
+* The URL to listen on in place of a configured peer or orderer URL.
+*/
+var standInUrl = function(url, offset){
+  var match = /^(?:grpcs?:\/\/)?([^:]+):(\d+)$/.exec(url);
+  if(match === null) throw new Error('Cannot find the port in ' + url);
+  return 'grpc://' + match[1] + ':' + (Number(match[2]) + offset);
+};
+
+var main = function(){
+  var args = parseArgs(process.argv.slice(2));
+  if(!args.config){
+    console.error('Usage: node fabric-standin.js --config datasources.json [--record] [--recording file]\n' +
+                  '         [--port-offset n] [--out datasources.json] [--latency ms] [--orderer-latency ms] [--jitter ms]');
+    process.exit(12);
+  }
+  var dataSources = JSON.parse(fs.readFileSync(args.config, 'utf-8'));
+  var settings = dataSources.fabricDataSource;
+  var offset = Number(args['port-offset'] || 0);
+  var options = {
+    record: args.record === true,
+    latency: Number(args.latency || 5),
+    ordererLatency: Number(args['orderer-latency'] || 20),
+    jitter: Number(args.jitter || 0)
+  };
+  if(options.record && offset == 0){
+    console.error('--record proxies to the configured peers and orderers, so needs a --port-offset to listen on');
+    process.exit(12);
+  }
+  var recording = new Recording(args.recording || 'recording.json');
+
+  settings.peers.forEach((aPeer)=>{
+    var listenUrl = standInUrl(aPeer.requestURL, offset);
+    startPeer(settings, aPeer, listenUrl, recording, options);
+    aPeer.requestURL = listenUrl;
+  });
+  settings.orderers.forEach((anOrderer)=>{
+    var listenUrl = standInUrl(anOrderer.url, offset);
+    startOrderer(settings, anOrderer, listenUrl, recording, options);
+    anOrderer.url = listenUrl;
+  });
+  if(args.out){
+    fs.writeFileSync(args.out, JSON.stringify(dataSources, null, 2));
+    console.log('Wrote datasources for the stand-in to ' + args.out);
+  }
+
+  var stop = ()=>{
+    if(options.record) recording.save();
+    process.exit(0);
+  };
+  process.on('SIGINT', stop);
+  process.on('SIGTERM', stop);
+};
+
+main();
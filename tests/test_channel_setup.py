@@ -68,13 +68,10 @@ class TestChannelSetup(unittest.TestCase):
         #TODO check response
 
     def test_ad_chaincode_install_fabcar(self):
-        """Test to confirm that installing fabcar chaincode on a peer works."""
-        # install chaincode: id, path(in archive), archive as base64 string, version, peers
+        """Test to confirm that installing fabcar chaincode on a peer works, uploading the archive as binary."""
+        # install chaincode: id, path(in archive), archive file, version, peers
         # Created using "tar -cvzf installFabcar.tar.gz src/fabcar/fabcar.go"
-        archiveFile = open('input/installFabcar.tar.gz', 'rb')
-        archiveInb64 = base64.b64encode(archiveFile.read())
-        archiveFile.close()
-        install_result = restserver.install_chaincode("fabcar","fabcar",archiveInb64,"1.0","%5B0%5D")["peerResponses"]
+        install_result = restserver.install_chaincode_package("fabcar","fabcar",'input/installFabcar.tar.gz',"1.0","%5B0%5D")["peerResponses"]
         time.sleep(5) # Allow chaincode install to complete
         #TODO check response
 
@@ -87,8 +84,9 @@ class TestChannelSetup(unittest.TestCase):
     def test_af_initialize_fabcar(self):
         """Test to initialize the ledger with fabcar data."""
         init_result = restserver.commit_transaction("mychannel",
-                                            data=r'{"proposal":{"chaincodeId":"fabcar","fcn":"initLedger","args":[""]}}')
-        #TODO check response
+                                            data=r'{"proposal":{"chaincodeId":"fabcar","fcn":"initLedger","args":[""]}}',
+                                            wait_for_commit=True)
+        self.assertEqual(init_result["commitStatus"],"VALID")
 
 # TODO Failing with "Rejecting CONFIG_UPDATE because: Error authorizing update: Update not for correct channel:"
     # def test_ag_update_channel(self):
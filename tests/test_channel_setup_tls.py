@@ -103,8 +103,9 @@ class TestChannelSetup(unittest.TestCase):
     def test_af_initialize_fabcar(self):
         """Test to initialize the ledger with fabcar data."""
         init_result = restserver.commit_transaction("mychannel",
-                                            data=r'{"proposal":{"chaincodeId":"fabcar","fcn":"initLedger","args":[""]}}')
-        #TODO check response
+                                            data=r'{"proposal":{"chaincodeId":"fabcar","fcn":"initLedger","args":[""]}}',
+                                            wait_for_commit=True)
+        self.assertEqual(init_result["commitStatus"],"VALID")
 
 # TODO Failing with "Rejecting CONFIG_UPDATE because: Error authorizing update: Update not for correct channel:"
     # def test_ag_update_channel(self):
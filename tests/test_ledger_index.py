@@ -0,0 +1,141 @@
+#
+# Copyright IBM Corp. All Rights Reserved.
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+
+# Test Ledger Index
+#
+# Tests of indexing blocks into a LedgerIndex, run without a REST server.
+
+
+from ledger_index import LedgerIndex, VALID
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# Validation codes of transactions rejected as a duplicate and for a read conflict, see TxValidationCode
+# in the Fabric protos.
+DUPLICATE_TXID = 9
+MVCC_READ_CONFLICT = 11
+
+
+def envelope(tx_id, key, value, is_delete=False):
+    """A transaction envelope writing value to key of chaincode cc, or deleting the key."""
+    write = {"key": key, "is_delete": is_delete, "value": value}
+    return {"payload": {"header": {"channel_header": {"tx_id": tx_id, "timestamp": "ts " + tx_id}},
+                        "data": {"actions": [{"payload": {"action": {"proposal_response_payload": {
+                            "extension": {"results": {"ns_rwset": [
+                                {"namespace": "cc", "rwset": {"writes": [write]}}]}}}}}}]}}}
+
+
+def block(number, envelopes, codes):
+    return {"header": {"number": str(number)}, "data": {"data": envelopes},
+            "metadata": {"metadata": [[], [], codes]}}
+
+
+class FakeRest(object):
+    """Serves blocks to LedgerIndex.update() the way FabricRest.iter_blocks() does."""
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.starts = []
+
+    def iter_blocks(self, channel, start=0, batch_size=50, follow=False, poll_interval=1.0):
+        self.starts.append(start)
+        return iter(self.blocks[start:])
+
+
+class TestLedgerIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = LedgerIndex(":memory:", "mychannel")
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_add_block(self):
+        """Test that a block's transactions and writes are indexed and the checkpoint moves past it."""
+        self.index.add_block(block(0, [envelope("tx1", "k", "1")], [VALID]))
+        self.assertEqual(self.index.next_block(), 1)
+        self.assertEqual(self.index.transaction("tx1")["block_number"], 0)
+        self.assertEqual(self.index.latest("cc", "k")["value"], "1")
+
+    def test_duplicate_tx_id(self):
+        """Test that a later duplicate of a transaction ID does not replace the original."""
+        self.index.add_block(block(0, [envelope("tx1", "k", "1")], [VALID]))
+        self.index.add_block(block(1, [envelope("tx1", "k", "2")], [DUPLICATE_TXID]))
+        transaction = self.index.transaction("tx1")
+        self.assertEqual(transaction["block_number"], 0)
+        self.assertEqual(transaction["validation_code"], VALID)
+        self.assertEqual(self.index.latest("cc", "k")["value"], "1")
+        self.assertEqual(len(self.index.history("cc", "k")), 1)
+        self.assertEqual(self.index.next_block(), 2)
+
+    def test_invalid_transaction(self):
+        """Test that an invalid transaction is recorded but its writes are not indexed."""
+        self.index.add_block(block(0, [envelope("tx1", "k", "1"), envelope("tx2", "k", "2")],
+                                   [VALID, MVCC_READ_CONFLICT]))
+        self.assertEqual(self.index.transaction("tx2")["validation_code"], MVCC_READ_CONFLICT)
+        self.assertEqual(self.index.latest("cc", "k")["value"], "1")
+        self.assertEqual([write["tx_id"] for write in self.index.history("cc", "k")], ["tx1"])
+
+    def test_delete(self):
+        """Test that a delete is the latest write to a key, with no value, and is kept in its history."""
+        self.index.add_block(block(0, [envelope("tx1", "k", "1")], [VALID]))
+        self.index.add_block(block(1, [envelope("tx2", "k", "ignored", is_delete=True)], [VALID]))
+        latest = self.index.latest("cc", "k")
+        self.assertTrue(latest["is_delete"])
+        self.assertIsNone(latest["value"])
+        self.assertEqual(latest["tx_id"], "tx2")
+        history = self.index.history("cc", "k")
+        self.assertEqual([(write["value"], write["is_delete"]) for write in history], [("1", False), (None, True)])
+
+    def test_history_order(self):
+        """Test that a key's history is ordered by block and by position in the block, not by when it was added."""
+        self.index.add_block(block(1, [envelope("tx2", "k", "2"), envelope("tx3", "k", "3")], [VALID, VALID]))
+        self.index.add_block(block(0, [envelope("tx1", "k", "1")], [VALID]))
+        history = self.index.history("cc", "k")
+        self.assertEqual([write["tx_id"] for write in history], ["tx1", "tx2", "tx3"])
+        self.assertEqual([write["block_number"] for write in history], [0, 1, 1])
+
+
+class TestLedgerIndexResume(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "ledger.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume(self):
+        """Test that reopening the database resumes indexing from the checkpoint."""
+        blocks = [block(0, [envelope("tx1", "k", "1")], [VALID]),
+                  block(1, [envelope("tx2", "k", "2")], [VALID])]
+        index = LedgerIndex(self.path, "mychannel")
+        try:
+            self.assertEqual(index.update(FakeRest(blocks[:1])), 1)
+        finally:
+            index.close()
+
+        restserver = FakeRest(blocks)
+        index = LedgerIndex(self.path, "mychannel")
+        try:
+            self.assertEqual(index.next_block(), 1)
+            self.assertEqual(index.update(restserver), 1)
+            self.assertEqual(restserver.starts, [1])
+            self.assertEqual(index.next_block(), 2)
+            self.assertEqual([write["tx_id"] for write in index.history("cc", "k")], ["tx1", "tx2"])
+        finally:
+            index.close()
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(verbosity=1)
+    loader = unittest.TestLoader()
+    result = runner.run(unittest.TestSuite([loader.loadTestsFromTestCase(TestLedgerIndex),
+                                            loader.loadTestsFromTestCase(TestLedgerIndexResume)]))
+
+    # Exit with non-zero exit code if any tests failed.
+    if not result.wasSuccessful():
+        sys.exit(1)